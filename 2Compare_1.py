@@ -4,6 +4,7 @@ from tkinter import messagebox
 from PIL import Image, ImageTk
 from send2trash import send2trash
 import datetime
+from imgcompare.frames import describe, frame_differences, frame_fingerprint
 
 class ImageComparerApp:
     def __init__(self, folder_base):
@@ -66,6 +67,7 @@ class ImageComparerApp:
         self.clear_images()
 
         infos = []
+        fingerprints = []
         sizes = []
         mod_times = []
         file_sizes = []
@@ -75,15 +77,19 @@ class ImageComparerApp:
             frame.pack(side=tk.LEFT, padx=10)
 
             img = Image.open(img_path)
-            img = img.resize((500, 750), Image.ANTIALIAS)
+            img = img.resize((500, 750), Image.Resampling.LANCZOS)
             photo = ImageTk.PhotoImage(img)
 
             img_label = tk.Label(frame, image=photo)
             img_label.image = photo  # Keep a reference to prevent garbage collection
             img_label.pack()
 
-            # Get image info
+            # Get image info; animations and multi-page files also get their frame fingerprint
             info = f"Dimensions: {img.width}x{img.height}"
+            fingerprint = frame_fingerprint(img_path)
+            fingerprints.append(fingerprint)
+            if describe(fingerprint):
+                info += f"\n{describe(fingerprint)}"
             infos.append(info)
 
             # Get modification date
@@ -108,8 +114,18 @@ class ImageComparerApp:
             select_button.pack(pady=5)
             self.select_buttons.append(select_button)
 
+        # Same first frame does not mean same animation: compare the sampled frames too
+        frames_match = True
+        labels = self.info_labels[-len(image_paths):]
+        for label, fingerprint in zip(labels[1:], fingerprints[1:]):
+            if fingerprints[0] and fingerprint:
+                differences = frame_differences(fingerprints[0], fingerprint)
+                if differences:
+                    label.config(text=label.cget("text") + "\n" + ", ".join(differences))
+                    frames_match = False
+
         # Compare infos and color text accordingly
-        if all(inf == infos[0] for inf in infos):
+        if all(inf == infos[0] for inf in infos) and frames_match:
             for label in self.info_labels:
                 label.config(fg="green")
         else:
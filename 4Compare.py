@@ -1,17 +1,44 @@
 import os
-import glob
+from concurrent.futures import ProcessPoolExecutor
 import tkinter as tk
 from tkinter import messagebox, Scrollbar, Canvas
-from PIL import Image, ImageTk, ExifTags
+from PIL import ImageTk
 from send2trash import send2trash
-from datetime import datetime
+from imgcompare.core import IMAGE_EXTENSIONS, filename_sets, image_files, image_info, numbered_folders, policy_record
+from imgcompare.decode import QuarantineReport, load_preview
+from imgcompare.bursts import BURST_WINDOW, find_bursts
+from imgcompare.policy import apply_decisions, build_table, decide, format_summary, reclaim_summary
+from imgcompare.pyramid import PyramidBuilder
+from imgcompare.thumbcache import ThumbnailCache
+from imgcompare.contactsheet import ContactSheet
+from imgcompare.fsio import ConcurrentIO
+from imgcompare.frames import describe, frame_differences, frame_fingerprint
+from imgcompare.report import open_report, write_policy_decisions
+from imgcompare.cache import MetadataCache
+from imgcompare.quality import POLICY_FIELDS, QUALITY_CRITERIA, PendingScores, add_quality, describe_score
 
 # Constants for image display size
 IMAGE_WIDTH = 500
 IMAGE_HEIGHT = 750
 
+# Values tracked per column for highlighting
+COMMON_INFO_KEYS = ("modification_time", "file_size", "resolution", "dpi", "sharpness")
+
+# Zoom factor per mouse wheel step, and how often to check for finished pyramids
+ZOOM_STEP = 1.25
+ZOOM_POLL_MS = 100
+
+# How often to check whether the quality scores of the shown set are ready
+QUALITY_POLL_MS = 200
+
+# Every column gets the same width, so the visible ones follow from the scroll position
+COLUMN_WIDTH = IMAGE_WIDTH + 10
+# Columns decoded on each side of the viewport ahead of scrolling
+COLUMN_MARGIN = 1
+
 class PictureComparatorApp:
-    def __init__(self, folder_base):
+    def __init__(self, folder_base, group_bursts=False, burst_window=BURST_WINDOW, report_path=None,
+                 throttle=None):
         self.root = tk.Tk()
         self.root.geometry(f"{3 * IMAGE_WIDTH}x{IMAGE_HEIGHT + 150}+0+0")  # Position window at (0,0)
         self.root.title("Picture Comparator")
@@ -19,7 +46,8 @@ class PictureComparatorApp:
         # Add canvas and horizontal scrollbar
         self.canvas = Canvas(self.root)
         self.scrollbar = Scrollbar(self.root, orient='horizontal', command=self.canvas.xview)
-        self.canvas.config(xscrollcommand=self.scrollbar.set)
+        self.canvas.config(xscrollcommand=self.on_scroll)
+        self.canvas.bind("<Configure>", lambda e: self.schedule_visible_update())
         self.scrollbar.pack(side='bottom', fill='x')
         self.canvas.pack(side="top", fill="both", expand=True)
 
@@ -29,30 +57,78 @@ class PictureComparatorApp:
 
         self.folder_base = os.path.normpath(folder_base)
         self.folders = self.get_input_folders(self.folder_base)
+        self.quarantine = QuarantineReport(os.path.join(os.path.dirname(self.folder_base), "quarantine.csv"))
         self.image_files = self.get_image_files(self.folder_base)
+        if group_bursts:
+            self.image_sets = self.get_burst_sets(burst_window)
+        else:
+            self.image_sets = self.get_filename_sets()
+        self.column_count = max((len(image_set) for image_set in self.image_sets), default=len(self.folders))
 
         self.current_image_index = 0
         self.image_labels = []
         self.info_labels = []
         self.select_buttons = []
 
+        # Synchronized zoom: magnification relative to fit-to-pane (None = fit), shared centre
+        self.pyramids = PyramidBuilder()
+        self.zoom = None
+        self.view_center = [0.5, 0.5]
+        self.pan_start = None
+        self.zoom_poll_pending = False
+        self.shown_paths = [None] * self.column_count
+        self.previews = [None] * self.column_count
+
+        # Only visible columns hold decoded previews; the rest show a shared blank image
+        self.placeholder = tk.PhotoImage(width=IMAGE_WIDTH, height=IMAGE_HEIGHT)
+        self.visible_update_pending = False
+
+        # Stats and header reads of a set run concurrently (network shares)
+        self.file_io = ConcurrentIO(throttle=throttle)
+
+        # Optional machine-readable log (.jsonl, .csv or .db) of every decision
+        self.report = open_report(report_path) if report_path else None
+
+        # Disk-backed thumbnails for the contact sheet, created when it is first opened
+        self.thumbnails = None
+
+        # Quality scores (JPEG quality, sharpness, noise) are measured in worker processes
+        # and cached next to the base folder; the keep policy weighs them in. A set is shown
+        # straight away and its quality lines and sharpness hint are filled in when ready
+        self.quality_pool = ProcessPoolExecutor()
+        self.quality_cache = MetadataCache(os.path.join(os.path.dirname(self.folder_base), "metadata_cache.db"))
+        self.quality = {}
+        self.quality_pending = None
+        self.policy_criteria = QUALITY_CRITERIA
+
         self.create_gui()
 
     def get_input_folders(self, folder_base):
         """Retrieve the list of folders with decreasing numbers."""
-        base_number = int(os.path.basename(folder_base))
-        base_dir = os.path.dirname(folder_base)
-        return [os.path.normpath(os.path.join(base_dir, str(i))) for i in range(base_number, 0, -1)]
+        return numbered_folders(folder_base)
 
     def get_image_files(self, folder_base):
         """Get all images from the base folder."""
-        return sorted(glob.glob(os.path.join(folder_base, "*.jpg")))
+        return image_files(folder_base, IMAGE_EXTENSIONS)
+
+    def get_filename_sets(self):
+        """One set per base image: the file with the same name in every folder."""
+        return filename_sets(self.folders, self.image_files)
+
+    def get_burst_sets(self, burst_window):
+        """One set per burst: frames from one camera taken within burst_window seconds."""
+        image_files = []
+        for folder in self.folders:
+            image_files.extend(self.get_image_files(folder))
+        return find_bursts(image_files, burst_window)
 
     def create_gui(self):
         """Create the GUI elements."""
-        for i in range(len(self.folders)):
-            image_label = tk.Label(self.frame)
+        for i in range(self.column_count):
+            self.frame.grid_columnconfigure(i, minsize=COLUMN_WIDTH)
+            image_label = tk.Label(self.frame, image=self.placeholder, compound="center")
             image_label.grid(row=0, column=i)
+            self.bind_zoom(image_label, i)
             self.image_labels.append(image_label)
 
             info_label = tk.Label(self.frame, text="", wraplength=IMAGE_WIDTH, justify="center")
@@ -63,120 +139,271 @@ class PictureComparatorApp:
             select_button.grid(row=2, column=i)
             self.select_buttons.append(select_button)
 
-        self.skip_button = tk.Button(self.frame, text="Skip", command=self.next_image)
+        self.skip_button = tk.Button(self.frame, text="Skip", command=self.skip_image)
         self.skip_button.grid(row=3, column=1)
 
+        self.dry_run_button = tk.Button(self.frame, text="Dry run keep policy", command=self.dry_run_policy)
+        self.dry_run_button.grid(row=3, column=0)
+
+        self.apply_button = tk.Button(self.frame, text="Apply keep policy", command=self.apply_policy, bg='red')
+        self.apply_button.grid(row=3, column=2)
+
+        self.sheet_button = tk.Button(self.frame, text="Contact sheet", command=self.open_contact_sheet)
+        self.sheet_button.grid(row=4, column=1)
+
         self.load_image(self.current_image_index)
 
     def load_image(self, image_index):
-        """Load the images from all folders for a specific image file."""
-        if image_index >= len(self.image_files):
+        """Load the images of one set (same filename, or one burst) into the columns."""
+        if image_index >= len(self.image_sets):
             messagebox.showinfo("Info", "No pictures left.")
             self.root.quit()
             return
 
-        image_name = os.path.basename(self.image_files[image_index])
-        self.common_info = {}
-
-        for i, folder in enumerate(self.folders):
-            image_path = os.path.normpath(os.path.join(folder, image_name))
-            if os.path.exists(image_path):
-                self.display_image(image_path, i)
+        image_set = self.image_sets[image_index]
+        self.common_info = {key: [None] * self.column_count for key in COMMON_INFO_KEYS}
+        self.zoom = None
+        self.view_center = [0.5, 0.5]
+        self.shown_paths = [None] * self.column_count
+        self.previews = [None] * self.column_count
+        self.frame_fingerprints = [None] * self.column_count
+
+        image_paths = [image_set[i] if i < len(image_set) else None for i in range(self.column_count)]
+        stats = self.file_io.stat_many(path for path in image_paths if path)
+        readable = [i for i, path in enumerate(image_paths)
+                    if path and stats[path] is not None and path not in self.quarantine]
+        if self.quality_pending is not None:
+            self.quality_pending.cancel()  # Still scoring the previous set
+        pending = PendingScores([image_paths[i] for i in readable], self.quality_pool, self.quality_cache,
+                                self.quarantine)
+        self.quality, self.quality_pending = ({}, pending) if pending.futures else (pending.result(), None)
+        # Header info for every column, read concurrently; pixels only for the visible ones
+        infos = dict(zip(readable, self.file_io.map(lambda i: self.get_image_info(image_paths[i], i), readable)))
+
+        for i, image_path in enumerate(image_paths):
+            self.image_labels[i].config(image=self.placeholder, text="")
+            self.image_labels[i].image = None
+            if i in infos:
+                self.shown_paths[i] = image_path
+                self.info_labels[i].config(text=infos[i])
+            elif image_path:
+                self.image_labels[i].config(text=f"Image not found\n{os.path.dirname(image_path)}")
+                self.info_labels[i].config(text="")
             else:
-                self.image_labels[i].config(image='', text=f"Image not found\n{folder}")
                 self.info_labels[i].config(text="")
 
         # Highlight according to the rules
+        self.mark_frame_differences()
         self.highlight_image_info()
+        self.update_visible_columns()
+
+        if self.quality_pending is not None:
+            self.root.after(QUALITY_POLL_MS, self.poll_quality, self.quality_pending)
+
+        # Warm up the stats of the next set while this one is reviewed
+        if image_index + 1 < len(self.image_sets):
+            for path in self.image_sets[image_index + 1]:
+                if path:
+                    self.file_io.submit_stat(path)
+
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.schedule_visible_update()
+
+    def schedule_visible_update(self):
+        """Update the decoded columns once the current burst of scroll events is handled."""
+        if not self.visible_update_pending:
+            self.visible_update_pending = True
+            self.root.after_idle(self.update_visible_columns)
+
+    def visible_columns(self):
+        """Columns inside the viewport, plus COLUMN_MARGIN on each side."""
+        view_width = self.canvas.winfo_width()
+        if view_width <= 1:
+            view_width = 3 * IMAGE_WIDTH  # Not mapped yet, assume the initial window size
+        left = self.canvas.canvasx(0)
+        first = int(left // COLUMN_WIDTH) - COLUMN_MARGIN
+        last = int((left + view_width) // COLUMN_WIDTH) + COLUMN_MARGIN
+        return range(max(0, first), min(self.column_count, last + 1))
+
+    def update_visible_columns(self):
+        """Decode previews that scrolled into view and release those far outside it."""
+        self.visible_update_pending = False
+        visible = self.visible_columns()
+        # Zoom tiles of the panes on screen keep their share of the tile cache
+        self.pyramids.pin(self.shown_paths[i] for i in visible if self.shown_paths[i])
+        for i in range(self.column_count):
+            if i not in visible and self.previews[i] is not None:
+                self.image_labels[i].config(image=self.placeholder)
+                self.image_labels[i].image = None
+                self.previews[i] = None
+            elif (i in visible and self.previews[i] is None and self.shown_paths[i]
+                  and self.shown_paths[i] not in self.quarantine):
+                self.display_image(self.shown_paths[i], i)
+        if self.zoom is not None:
+            self.refresh_zoom()
 
     def display_image(self, image_path, index):
-        """Display the image and its info on the GUI."""
-        img = Image.open(image_path)
-        img.thumbnail((IMAGE_WIDTH, IMAGE_HEIGHT))
+        """Decode the preview of one column and display it."""
+        img = load_preview(image_path, (IMAGE_WIDTH, IMAGE_HEIGHT), report=self.quarantine)
+        if img is None:
+            self.image_labels[index].config(image=self.placeholder, text=f"Unreadable image\n{image_path}")
+            return
         img_tk = ImageTk.PhotoImage(img)
 
         self.image_labels[index].config(image=img_tk)
         self.image_labels[index].image = img_tk
+        self.previews[index] = img_tk
+
+    def bind_zoom(self, image_label, index):
+        """Mouse wheel zooms, dragging pans and double-click fits all panes together."""
+        image_label.bind("<MouseWheel>", lambda e: self.zoom_view(1 if e.delta > 0 else -1))
+        image_label.bind("<Button-4>", lambda e: self.zoom_view(1))
+        image_label.bind("<Button-5>", lambda e: self.zoom_view(-1))
+        image_label.bind("<ButtonPress-1>", self.start_pan)
+        image_label.bind("<B1-Motion>", lambda e: self.pan_view(e, index))
+        image_label.bind("<Double-Button-1>", lambda e: self.reset_zoom())
+
+    def fit_scale(self, size):
+        """Scale at which an image of the given size fits its pane."""
+        return min(IMAGE_WIDTH / size[0], IMAGE_HEIGHT / size[1])
+
+    def zoom_view(self, direction):
+        """Zoom all panes in or out by one step around the shared centre."""
+        self.zoom = (self.zoom or 1.0) * (ZOOM_STEP if direction > 0 else 1 / ZOOM_STEP)
+        if self.zoom <= 1.0:
+            self.reset_zoom()
+            return
+        self.refresh_zoom()
 
-        file_info = self.get_image_info(image_path)
-        self.info_labels[index].config(text=file_info)
+    def start_pan(self, event):
+        self.pan_start = (event.x, event.y, *self.view_center)
 
-    def get_image_info(self, image_path):
+    def pan_view(self, event, index):
+        """Move the shared centre by the distance dragged in one pane."""
+        size = self.pyramids.original_size(self.shown_paths[index]) if self.shown_paths[index] else None
+        if self.zoom is None or size is None or self.pan_start is None:
+            return
+        start_x, start_y, center_x, center_y = self.pan_start
+        scale = self.fit_scale(size) * self.zoom
+        self.view_center = [min(1.0, max(0.0, center_x - (event.x - start_x) / (size[0] * scale))),
+                            min(1.0, max(0.0, center_y - (event.y - start_y) / (size[1] * scale)))]
+        self.refresh_zoom()
+
+    def reset_zoom(self):
+        """Go back to the fitted previews."""
+        self.zoom = None
+        self.view_center = [0.5, 0.5]
+        for i, preview in enumerate(self.previews):
+            if preview is not None:
+                self.image_labels[i].config(image=preview)
+                self.image_labels[i].image = preview
+
+    def refresh_zoom(self):
+        """Render every pane at the shared zoom from the tiles already decoded.
+
+        Pyramids are built in a background worker; until they are ready the
+        fitted preview stays up and the panes are refreshed once they are.
+        """
+        if self.zoom is None:
+            return
+        waiting = False
+        for i, image_path in enumerate(self.shown_paths):
+            if image_path is None or self.previews[i] is None:
+                continue  # Not decoded, i.e. scrolled out of view
+            size = self.pyramids.original_size(image_path)
+            if size is not None:
+                img, _ = self.pyramids.render(image_path, self.fit_scale(size) * self.zoom,
+                                              self.view_center, (IMAGE_WIDTH, IMAGE_HEIGHT))
+                img_tk = ImageTk.PhotoImage(img)
+                self.image_labels[i].config(image=img_tk)
+                self.image_labels[i].image = img_tk
+            else:
+                self.pyramids.request(image_path)
+            waiting = waiting or self.pyramids.is_building(image_path)
+        if waiting and not self.zoom_poll_pending:
+            self.zoom_poll_pending = True
+            self.root.after(ZOOM_POLL_MS, self.poll_zoom)
+
+    def poll_zoom(self):
+        self.zoom_poll_pending = False
+        self.refresh_zoom()
+
+    def poll_quality(self, pending):
+        """Show the quality scores of the current set once all of them are measured."""
+        if pending is not self.quality_pending:
+            return  # Another set is shown by now
+        if not pending.done():
+            self.root.after(QUALITY_POLL_MS, self.poll_quality, pending)
+            return
+        self.quality, self.quality_pending = pending.result(), None
+        for i, image_path in enumerate(self.shown_paths):
+            if image_path is None:
+                continue
+            quality = self.quality.get(image_path)
+            self.common_info["sharpness"][i] = quality["sharpness"] if quality else 0
+            lines = [describe_score(quality) if line.startswith("Quality:") else line
+                     for line in self.info_labels[i].cget("text").split("\n")]
+            self.info_labels[i].config(text="\n".join(lines))
+        self.highlight_image_info()
+
+    def get_image_info(self, image_path, index):
         """Retrieve the image information to display below the picture."""
-        file_stats = os.stat(image_path)
-        modification_time = datetime.fromtimestamp(file_stats.st_mtime)
-        file_size = file_stats.st_size / (1024 * 1024)  # Size in MB
-
-        img = Image.open(image_path)
-        width, height = img.size
-
-        exif = img._getexif()
-        dpi = img.info.get('dpi', (0, 0))
-        bit_depth = img.mode
-        camera_maker = geo_location = "Unknown"
-
-        if exif:
-            for tag, value in exif.items():
-                decoded = ExifTags.TAGS.get(tag, tag)
-                if decoded == "Make":
-                    camera_maker = value
-                if decoded == "GPSInfo":
-                    geo_location = str(value)
+        info = image_info(image_path, self.quarantine, self.file_io)
+        dpi = info["dpi"]
+        quality = self.quality.get(image_path)
 
         # Add common info for comparison
-        file_info_dict = {
-            "filename": os.path.basename(image_path),
-            "modification_time": modification_time,
-            "file_size": file_size,
-            "resolution": width * height,  # Total pixel count for comparison
-            "dpi": dpi[0],
-            "bit_depth": bit_depth,
-            "camera_maker": camera_maker,
-            "geo_location": geo_location
-        }
-
-        self.update_common_info(file_info_dict)
-
-        return (f"Filename: {file_info_dict['filename']}\n"
-                f"Modified: {modification_time.strftime('%Y-%m-%d %H:%M:%S')}\n"
-                f"Size: {file_size:.2f} MB\n"
-                f"Resolution: {width}x{height}\n"
+        self.update_common_info(dict(info, dpi=dpi[0], sharpness=quality["sharpness"] if quality else 0), index)
+
+        frames = ""
+        if info["n_frames"] > 1:
+            # Animations and multi-page files: sampled frames, compared in mark_frame_differences
+            self.frame_fingerprints[index] = frame_fingerprint(image_path, report=self.quarantine)
+            frames = f"\n{describe(self.frame_fingerprints[index])}"
+
+        return (f"Filename: {info['filename']}{frames}\n"
+                f"Modified: {info['modification_time'].strftime('%Y-%m-%d %H:%M:%S')}\n"
+                f"Size: {info['file_size']:.2f} MB\n"
+                f"Resolution: {info['width']}x{info['height']}\n"
                 f"DPI: {dpi[0]}x{dpi[1]}\n"
-                f"Bit Depth: {bit_depth}\n"
-                f"Camera: {camera_maker}\n"
-                f"Geo Location: {geo_location}")
-
-    def update_common_info(self, info_dict):
-        """Track common info for highlighting."""
-        if "modification_time" not in self.common_info:
-            self.common_info["modification_time"] = []
-        if "file_size" not in self.common_info:
-            self.common_info["file_size"] = []
-        if "resolution" not in self.common_info:
-            self.common_info["resolution"] = []
-        if "dpi" not in self.common_info:
-            self.common_info["dpi"] = []
-
-        # Track values for comparison
-        self.common_info["modification_time"].append(info_dict["modification_time"])
-        self.common_info["file_size"].append(info_dict["file_size"])
-        self.common_info["resolution"].append(info_dict["resolution"])
-        self.common_info["dpi"].append(info_dict["dpi"])
+                f"Bit Depth: {info['bit_depth']}\n"
+                f"{'Quality: measuring...' if self.quality_pending else describe_score(quality)}\n"
+                f"Camera: {info['camera_maker']}\n"
+                f"Geo Location: {info['geo_location']}")
+
+    def mark_frame_differences(self):
+        """Note on each multi-frame column how its frames differ from the first one shown."""
+        shown = [(i, fingerprint) for i, fingerprint in enumerate(self.frame_fingerprints) if fingerprint]
+        for i, fingerprint in shown[1:]:
+            differences = frame_differences(shown[0][1], fingerprint)
+            if differences:
+                self.info_labels[i].config(text=self.info_labels[i].cget("text") + "\n" + ", ".join(differences))
+
+    def update_common_info(self, info_dict, index):
+        """Track common info of one column for highlighting."""
+        for key in COMMON_INFO_KEYS:
+            self.common_info[key][index] = info_dict[key]
 
     def highlight_image_info(self):
-        """Highlight the oldest, biggest, and highest values in green."""
+        """Highlight the oldest, biggest, highest and sharpest values in green."""
+        # Columns without an image are left out of the comparison
+        shown = {key: [value for value in values if value is not None] for key, values in self.common_info.items()}
+        if not shown["modification_time"]:
+            return
+
         # Determine the oldest modification date, largest file size, largest resolution, and largest DPI
-        oldest_time = min(self.common_info["modification_time"])
-        largest_file_size = max(self.common_info["file_size"])
-        largest_resolution = max(self.common_info["resolution"])
-        largest_dpi = max(self.common_info["dpi"])
+        oldest_time = min(shown["modification_time"])
+        largest_file_size = max(shown["file_size"])
+        largest_resolution = max(shown["resolution"])
+        largest_dpi = max(shown["dpi"])
+        sharpest = max(shown["sharpness"])
 
-        for i in range(len(self.folders)):
+        for i in range(self.column_count):
             info_text = self.info_labels[i].cget("text")
             updated_text = []
             for line in info_text.split("\n"):
                 key = line.split(":")[0].strip().lower()
-                value = line.split(":")[1].strip()
 
                 if key == "modified" and self.common_info["modification_time"][i] == oldest_time:
                     updated_text.append(f"\033[32m{line}\033[0m")
@@ -186,6 +413,8 @@ class PictureComparatorApp:
                     updated_text.append(f"\033[32m{line}\033[0m")
                 elif key == "dpi" and self.common_info["dpi"][i] == largest_dpi:
                     updated_text.append(f"\033[32m{line}\033[0m")
+                elif key == "quality" and sharpest and self.common_info["sharpness"][i] == sharpest:
+                    updated_text.append(f"\033[32m{line}\033[0m")
                 else:
                     updated_text.append(line)
 
@@ -193,12 +422,86 @@ class PictureComparatorApp:
 
     def select_image(self, selected_index):
         """Move non-selected images to the recycle bin."""
-        image_name = os.path.basename(self.image_files[self.current_image_index])
-        for i, folder in enumerate(self.folders):
-            image_path = os.path.normpath(os.path.join(folder, image_name))
-            if os.path.exists(image_path):
+        image_set = self.image_sets[self.current_image_index]
+        self.report_set(image_set, ["keep" if i == selected_index else "delete" for i in range(len(image_set))])
+        for i, image_path in enumerate(image_set):
+            if image_path and os.path.exists(image_path):
                 if i != selected_index:  # Keep the selected image, delete the others
                     send2trash(image_path)
+                    self.file_io.forget(image_path)
+        self.next_image()
+
+    def get_policy_table(self, image_sets=None):
+        """Collect size, age, resolution, DPI and quality of every remaining set (or of image_sets) for the keep policy."""
+        if image_sets is None:
+            image_sets = self.image_sets[self.current_image_index:]
+        paths = [image_path for image_set in image_sets for image_path in image_set if image_path]
+        records = dict(zip(paths, self.file_io.map(self.get_policy_record, paths)))
+        add_quality(records.values(), self.quality_cache, self.quarantine, executor=self.quality_pool)
+        groups = []
+        for image_set in image_sets:
+            group = [records[image_path] for image_path in image_set if image_path and records[image_path]]
+            if len(group) > 1:
+                groups.append(group)
+        return build_table(groups, POLICY_FIELDS)
+
+    def get_policy_record(self, image_path):
+        """Keep-policy fields of one file, or None if it is missing or unreadable."""
+        return policy_record(image_path, self.quarantine, self.file_io)
+
+    def dry_run_policy(self):
+        """Show how much the keep policy would reclaim per folder, without touching anything."""
+        table = self.get_policy_table()
+        keep = decide(table, self.policy_criteria)
+        messagebox.showinfo("Keep policy dry run", format_summary(reclaim_summary(table, keep)))
+
+    def apply_policy(self):
+        """Keep the best-scoring file of every remaining set and move the others to the recycle bin."""
+        table = self.get_policy_table()
+        keep = decide(table, self.policy_criteria)
+        summary = format_summary(reclaim_summary(table, keep))
+        if messagebox.askyesno("Apply keep policy", f"{summary}\n\nMove these files to the recycle bin?"):
+            if self.report is not None:
+                write_policy_decisions(self.report, table, keep)
+            apply_decisions(table, keep, send2trash)
+            self.file_io.forget()
+            self.load_image(self.current_image_index)
+
+    def open_contact_sheet(self):
+        """Show all remaining sets as rows of thumbnails for bulk review."""
+        if self.thumbnails is None:
+            # Next to the base folder, so the cache is not mistaken for an input folder
+            thumbnail_dir = os.path.join(os.path.dirname(self.folder_base), ".thumbnails")
+            self.thumbnails = ThumbnailCache(thumbnail_dir, report=self.quarantine)
+        image_sets = [[path for path in image_set if path] for image_set in self.image_sets[self.current_image_index:]]
+        ContactSheet(self.root, image_sets, self.thumbnails, self.resolve_sets)
+
+    def resolve_sets(self, image_sets):
+        """Apply the keep policy to the sets selected on the contact sheet; returns the sets resolved."""
+        table = self.get_policy_table(image_sets)
+        keep = decide(table, self.policy_criteria)
+        summary = format_summary(reclaim_summary(table, keep))
+        if not messagebox.askyesno("Resolve selected sets", f"{summary}\n\nMove these files to the recycle bin?"):
+            return []
+        if self.report is not None:
+            write_policy_decisions(self.report, table, keep)
+        apply_decisions(table, keep, send2trash)
+        self.file_io.forget()
+        self.load_image(self.current_image_index)
+        return image_sets
+
+    def report_set(self, image_set, decisions):
+        """Record a reviewed set in the report, before any file is touched."""
+        if self.report is None:
+            return
+        shown = [(path, decision) for path, decision in zip(image_set, decisions) if path and os.path.exists(path)]
+        if shown:
+            self.report.write_group([path for path, _ in shown], [decision for _, decision in shown])
+
+    def skip_image(self):
+        """Leave the current set as it is and move on."""
+        image_set = self.image_sets[self.current_image_index]
+        self.report_set(image_set, ["skip"] * len(image_set))
         self.next_image()
 
     def next_image(self):
@@ -208,9 +511,14 @@ class PictureComparatorApp:
 
     def run(self):
         self.root.mainloop()
+        if self.report is not None:
+            self.report.close()
+        self.quality_pool.shutdown(cancel_futures=True)
+        self.quality_cache.close()
 
 # Entry point
 if __name__ == "__main__":
     folder_base = input("Enter the path of the base folder: ")
-    app = PictureComparatorApp(folder_base)
+    group_bursts = input("Group burst shots by capture time instead of filename? [y/N]: ").strip().lower() == "y"
+    app = PictureComparatorApp(folder_base, group_bursts)
     app.run()
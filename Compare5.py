@@ -1,29 +1,84 @@
 import os
-import shutil
-import send2trash
 import tkinter as tk
-from PIL import Image, ImageTk
+from tkinter import messagebox
+from PIL import ImageTk
 from datetime import datetime
+from imgcompare.core import compare_folders, file_info, move_to_same_folder, properties_match, trash
+from imgcompare.decode import QuarantineReport, read_header, load_preview
+from imgcompare.cache import MetadataCache
+from imgcompare.index import FolderIndex
+from imgcompare.watch import WatchThread
+from imgcompare.dedupe import DedupeError, Journal, link_duplicate
+from imgcompare.policy import apply_decisions, build_table, decide, format_summary, reclaim_summary
+from imgcompare.thumbcache import ThumbnailCache
+from imgcompare.contactsheet import ContactSheet
+from imgcompare.fsio import ConcurrentIO
+from imgcompare.report import open_report, write_policy_decisions
+from imgcompare.signature import prefilter_pairs
+from imgcompare.jpeghash import same_jpeg_content
+from imgcompare.pixelhash import identical_pixel_pairs
+from imgcompare.fsid import same_storage, storage_fields
+from imgcompare.query import Query, QueryError, filter_pairs
+
+# Display size of each image in the comparison window
+PREVIEW_SIZE = (600, 900)
+
+# Unreadable and over-budget files are recorded here instead of crashing the run
+quarantine = QuarantineReport()
+
+# Background watcher that appends new duplicate pairs while reviewing (watch mode)
+watch_thread = None
+
+# Stats and header reads run concurrently, which matters on SMB/NFS shares
+file_io = ConcurrentIO()
+
+# Optional machine-readable report (.jsonl, .csv or .db) of every reviewed pair and its outcome
+report = None
+
+# Lossless pairs (PNG recompressed, BMP exported to PNG...) whose decoded pixels are identical
+pixel_identical = set()
+
+# Replace identical copies with links instead of moving them to "same":
+# None, "hardlink", "reflink" or "auto" (reflink where supported, else hardlink)
+DEDUPE_MODE = None
 
 # Helper function to get file information
 def get_file_info(filepath):
-    file_size = os.path.getsize(filepath) / (1024 * 1024)  # Convert bytes to MB
-    img = Image.open(filepath)
-    img_size = img.size
-    mod_time = os.path.getmtime(filepath)
-    mod_date = datetime.fromtimestamp(mod_time).strftime('%Y-%m-%d %H:%M:%S')
-    return file_size, img_size, mod_date
-
-# Function to move the image to the "same" folder
-def move_to_same_folder(filepath, same_folder):
-    # Ensure the "same" folder exists
-    if not os.path.exists(same_folder):
-        os.makedirs(same_folder)
-    # Move the file to the "same" folder
-    shutil.move(filepath, os.path.join(same_folder, os.path.basename(filepath)))
+    return file_info(filepath, quarantine, file_io)
+
+# Function to let the right image share the left image's data, keeping both paths
+def link_identical_pair(filepath1, filepath2, same_folder):
+    journal = Journal(os.path.join(os.path.dirname(same_folder), "dedupe_journal.jsonl"))
+    try:
+        link_duplicate(filepath1, filepath2, DEDUPE_MODE, journal)
+    except DedupeError:
+        return False  # Not byte-identical after all, review by hand
+    return True
+
+# Function to record a reviewed pair in the report, before any file is touched
+def report_pair(filepath1, filepath2, img_size1, img_size2, decision1, decision2):
+    if report is None:
+        return
+    report.write_group([{"path": filepath1, "img_size": img_size1}, {"path": filepath2, "img_size": img_size2}],
+                       [decision1, decision2], key=os.path.basename(filepath1))
+
+# Function to tell whether both sides of a pair are hardlinks or reflink clones of one file
+def shares_storage(entry):
+    filepath1, filepath2 = entry[0], entry[1]
+    return same_storage(filepath1, filepath2, (file_io.stat(filepath1), file_io.stat(filepath2))) is not None
 
 # Function to display images and their comparisons
 def display_images(file_list, idx, same_folder, window_position=None):
+    # Pairs that already share their data on disk need no review, and deleting
+    # either side would reclaim nothing; they are reported as linked
+    while idx < len(file_list) and shares_storage(file_list[idx]):
+        filepath1, filepath2, _, _, img_size1, img_size2 = file_list[idx][:6]
+        report_pair(filepath1, filepath2, img_size1, img_size2, "keep", "link")
+        idx += 1
+    if idx >= len(file_list) and watch_thread is not None:
+        # Wait for the watcher to find more duplicates
+        wait_for_more(file_list, idx, same_folder, window_position)
+        return
     if idx >= len(file_list):
         # No more images to compare
         root = tk.Tk()
@@ -42,12 +97,17 @@ def display_images(file_list, idx, same_folder, window_position=None):
     if window_position:
         root.geometry(f"+{window_position[0]}+{window_position[1]}")
 
-    # Load and resize images
-    img1 = Image.open(filepath1).resize((600, 900))
-    img2 = Image.open(filepath2).resize((600, 900))
-    
-    img1 = ImageTk.PhotoImage(img1)
-    img2 = ImageTk.PhotoImage(img2)
+    # Load and resize images (decoded at reduced size to keep memory bounded)
+    img1 = load_preview(filepath1, PREVIEW_SIZE, report=quarantine)
+    img2 = load_preview(filepath2, PREVIEW_SIZE, report=quarantine)
+    if img1 is None or img2 is None:
+        # Quarantined while decoding, nothing to compare
+        root.destroy()
+        display_images(file_list, idx + 1, same_folder, window_position)
+        return
+
+    img1 = ImageTk.PhotoImage(img1.resize(PREVIEW_SIZE))
+    img2 = ImageTk.PhotoImage(img2.resize(PREVIEW_SIZE))
     
     # Create a frame for the images
     frame = tk.Frame(root)
@@ -119,11 +179,13 @@ def display_images(file_list, idx, same_folder, window_position=None):
     button_frame.pack(side=tk.BOTTOM, padx=10, pady=10)
 
     def delete_file1():
-        send2trash.send2trash(filepath1)
+        report_pair(filepath1, filepath2, img_size1, img_size2, "delete", "keep")
+        trash(filepath1)
         save_position_and_continue()
 
     def delete_file2():
-        send2trash.send2trash(filepath2)
+        report_pair(filepath1, filepath2, img_size1, img_size2, "keep", "delete")
+        trash(filepath2)
         save_position_and_continue()
 
     delete_button1 = tk.Button(button_frame, text="Delete Left Image", command=delete_file1, bg='red')
@@ -138,6 +200,7 @@ def display_images(file_list, idx, same_folder, window_position=None):
 
     # Skip button to skip the current image pair
     def skip_image():
+        report_pair(filepath1, filepath2, img_size1, img_size2, "skip", "skip")
         save_position_and_continue()
 
     skip_button = tk.Button(button_frame, text="Skip", command=skip_image, bg='yellow')
@@ -150,37 +213,174 @@ def display_images(file_list, idx, same_folder, window_position=None):
         root.destroy()
         display_images(file_list, idx + 1, same_folder, window_position)
 
-    # Move to "same" folder if all properties match
-    if file_name1 == file_name2 and size1 == size2 and img_size1 == img_size2 and mod_date1 == mod_date2:
-        move_to_same_folder(filepath1, same_folder)
+    # Move to "same" folder (or link, in dedupe mode) if all properties match
+    identical = properties_match(file_list[idx])
+    # JPEGs with the same image data whose metadata was rewritten (EXIF, XMP, ICC) and
+    # lossless files with identical pixels are moved as well; they cannot be linked
+    # since their bytes differ
+    same_content = not identical and ((filepath1, filepath2) in pixel_identical
+                                      or same_jpeg_content(filepath1, filepath2))
+    if identical and DEDUPE_MODE and not link_identical_pair(filepath1, filepath2, same_folder):
+        root.mainloop()
+    elif identical or same_content:
+        if identical and DEDUPE_MODE:
+            report_pair(filepath1, filepath2, img_size1, img_size2, "keep", "link")
+        else:
+            report_pair(filepath1, filepath2, img_size1, img_size2, "move", "keep")
+            move_to_same_folder(filepath1, same_folder)
 
         # Move on to next pair after auto-move
         save_position_and_continue()
     else:
         root.mainloop()
 
+# Function to keep a waiting window open until the watcher queues another pair
+def wait_for_more(file_list, idx, same_folder, window_position=None):
+    root = tk.Toplevel()
+    root.title("Watching for new duplicates")
+    if window_position:
+        root.geometry(f"+{window_position[0]}+{window_position[1]}")
+    label = tk.Label(root, text="No more pictures to compare\nWatching the folders for new duplicates...")
+    label.pack(padx=20, pady=20)
+
+    def check_for_more():
+        if idx < len(file_list):
+            root.destroy()
+            display_images(file_list, idx, same_folder, window_position)
+        else:
+            root.after(1000, check_for_more)
+
+    root.after(1000, check_for_more)
+    root.mainloop()
+
+# Function to resolve pairs picked on the contact sheet with the keep policy
+def resolve_pairs(pairs):
+    groups = []
+    for pair in pairs:
+        records = []
+        for filepath in pair:
+            img_size = read_header(filepath, report=quarantine)
+            if img_size is None:
+                continue
+            file_stats = os.stat(filepath)
+            records.append({"path": filepath, "size": file_stats.st_size, "mtime": file_stats.st_mtime,
+                            "resolution": img_size[0] * img_size[1], **storage_fields(filepath, file_stats)})
+        if len(records) > 1:
+            groups.append(records)
+    table = build_table(groups)
+    keep = decide(table)
+    summary = format_summary(reclaim_summary(table, keep))
+    if not messagebox.askyesno("Resolve selected pairs", f"{summary}\n\nMove these files to the recycle bin?"):
+        return []
+    if report is not None:
+        write_policy_decisions(report, table, keep)
+    apply_decisions(table, keep, trash)
+    return pairs
+
+# Function to show every pair at once as a scrolling grid of thumbnails
+def show_contact_sheet(folder1, file_list):
+    root = tk.Tk()
+    root.withdraw()
+    thumbnails = ThumbnailCache(os.path.join(os.path.dirname(folder1), ".thumbnails"), report=quarantine)
+    pairs = [(entry[0], entry[1]) for entry in file_list]
+    sheet = ContactSheet(root, pairs, thumbnails, resolve_pairs, title="Compare: contact sheet")
+    sheet.window.bind("<Destroy>", lambda e: root.destroy() if e.widget is sheet.window else None)
+    root.mainloop()
+
+# Function to watch both folders and append new duplicate pairs to file_list
+# (filtered by the same prefilter and where expression as the initial scan)
+def start_watching(folder1, folder2, file_list, prefilter=False, where=None):
+    global watch_thread
+    cache = MetadataCache(os.path.join(os.path.dirname(folder1), "metadata_cache.db"))
+    index = FolderIndex([folder1, folder2], cache=cache, report=quarantine)
+    index.scan()
+    # Pairs found by the initial scan are already in file_list
+    index.review_queue.clear()
+
+    def queue_new_pairs(events):
+        pairs = []
+        while index.review_queue:
+            filepath1, filepath2 = index.review_queue.popleft()
+            file_io.forget(filepath1)
+            file_io.forget(filepath2)
+            pairs.append((filepath1, filepath2))
+        if pairs and prefilter:
+            pairs = [pair for pair, candidate in zip(pairs, prefilter_pairs(pairs, cache, quarantine, file_io))
+                     if candidate]
+        if pairs and where:
+            try:
+                matches = filter_pairs(pairs, where, quarantine, file_io, cache)
+            except QueryError as e:
+                print(f"Filter expression: {e}")
+                return
+            pairs = [pair for pair, match in zip(pairs, matches) if match]
+        for filepath1, filepath2 in pairs:
+            info1 = get_file_info(filepath1)
+            info2 = get_file_info(filepath2)
+            if info1 is None or info2 is None:
+                continue
+            size1, img_size1, mod_date1 = info1
+            size2, img_size2, mod_date2 = info2
+            file_name = os.path.basename(filepath1)
+            file_list.append((filepath1, filepath2, size1, size2, img_size1, img_size2, mod_date1, mod_date2, file_name))
+
+    watch_thread = WatchThread(index, on_change=queue_new_pairs)
+    watch_thread.start()
+
 # Main function to start comparing images
-def start_comparing(folder1, folder2):
-    files1 = os.listdir(folder1)
-    files2 = os.listdir(folder2)
-
-    smaller_folder = files1 if len(files1) < len(files2) else files2
-    larger_folder = files2 if len(files1) < len(files2) else files1
-
-    file_list = []
-    for file in smaller_folder:
-        if file in larger_folder:
-            filepath1 = os.path.normpath(os.path.join(folder1, file))
-            filepath2 = os.path.normpath(os.path.join(folder2, file))
-            size1, img_size1, mod_date1 = get_file_info(filepath1)
-            size2, img_size2, mod_date2 = get_file_info(filepath2)
-
-            file_list.append((filepath1, filepath2, size1, size2, img_size1, img_size2, mod_date1, mod_date2, file))
-    
-    if file_list:
+def start_comparing(folder1, folder2, watch=False, grid=False, report_path=None, prefilter=False, throttle=None,
+                    where=None):
+    global report
+    if where:
+        # Check the filter expression before scanning anything
+        try:
+            where = where if isinstance(where, Query) else Query(where)
+        except QueryError as e:
+            messagebox.showerror("Filter expression", str(e))
+            return
+    # Pace stats and header reads (throttle.Throttle) when scanning shared storage
+    file_io.throttle = throttle
+    quarantine.report_path = os.path.join(os.path.dirname(folder1), "quarantine.csv")
+    if report_path:
+        report = open_report(report_path)
+
+    file_list = compare_folders(folder1, folder2, quarantine, file_io)
+    if prefilter:
+        # Drop same-name pairs whose colours clearly differ before decoding any preview
+        cache = MetadataCache(os.path.join(os.path.dirname(folder1), "metadata_cache.db"))
+        candidates = prefilter_pairs([(entry[0], entry[1]) for entry in file_list], cache, quarantine, file_io)
+        file_list = [entry for entry, candidate in zip(file_list, candidates) if candidate]
+
+    if where:
+        # Review only the slice matching a filter expression (see query.Query)
+        try:
+            matches = filter_pairs([(entry[0], entry[1]) for entry in file_list], where, quarantine, file_io)
+        except QueryError as e:
+            messagebox.showerror("Filter expression", str(e))
+            if report is not None:
+                report.close()
+            return
+        file_list = [entry for entry, match in zip(file_list, matches) if match]
+
+    # Decode lossless pairs in worker processes up front, so review never waits on it
+    pixel_identical.update(identical_pixel_pairs([(entry[0], entry[1]) for entry in file_list
+                                                  if not properties_match(entry)], report=quarantine))
+
+    if grid and file_list:
+        show_contact_sheet(folder1, file_list)
+        if report is not None:
+            report.close()
+        return
+
+    if watch:
+        start_watching(folder1, folder2, file_list, prefilter, where)
+
+    if file_list or watch:
         # Create the "same" folder path
         same_folder = os.path.join(os.path.dirname(folder1), "same")
         display_images(file_list, 0, same_folder)
+        if report is not None:
+            report.close()
     else:
         root = tk.Tk()
         root.title("No more pictures")
@@ -188,7 +388,12 @@ def start_comparing(folder1, folder2):
         label.pack(padx=20, pady=20)
         root.mainloop()
 
-# Example usage
-folder1 = "path_to_folder1"
-folder2 = "path_to_folder2"
-start_comparing(folder1, folder2)
+if __name__ == "__main__":
+    # Example usage (pass watch=True to keep reviewing new duplicates as they appear,
+    # grid=True to review all pairs on one contact sheet, report_path="report.jsonl" to log every decision,
+    # prefilter=True to skip same-name pairs that are clearly different pictures,
+    # throttle=Throttle(ops_per_second=200, adaptive=True) to limit the load on a shared NAS,
+    # where="left.mtime < right.mtime and left.size < right.size" to review only matching pairs)
+    folder1 = "path_to_folder1"
+    folder2 = "path_to_folder2"
+    start_comparing(folder1, folder2)
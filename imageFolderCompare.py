@@ -1,23 +1,28 @@
 import os
 import tkinter as tk
 from tkinter import filedialog
-from PIL import Image, ImageTk
+from PIL import ImageTk
 import send2trash
 from datetime import datetime
+from imgcompare.decode import QuarantineReport, read_header, load_preview
+
+# Display size of each image in the comparison window
+PREVIEW_SIZE = (600, 900)
+
+# Unreadable and over-budget files are recorded here instead of crashing the run
+quarantine = QuarantineReport()
 
 def get_file_info(filepath):
     """Return file size, image size (if image), and last modification date."""
     file_size = os.path.getsize(filepath)
     mod_time = os.path.getmtime(filepath)
     mod_date = datetime.fromtimestamp(mod_time).strftime('%Y-%m-%d %H:%M:%S')
-    try:
-        with Image.open(filepath) as img:
-            img_size = img.size
-    except:
-        img_size = (0, 0)
+    img_size = read_header(filepath, report=quarantine) or (0, 0)
     return file_size, img_size, mod_date
 
 def compare_images(folder1, folder2):
+    quarantine.report_path = os.path.join(os.path.dirname(os.path.normpath(folder1)), "quarantine.csv")
+
     files1 = os.listdir(folder1)
     files2 = os.listdir(folder2)
 
@@ -32,6 +37,8 @@ def compare_images(folder1, folder2):
             # Get file information
             size1, img_size1, mod_date1 = get_file_info(filepath1)
             size2, img_size2, mod_date2 = get_file_info(filepath2)
+            if filepath1 in quarantine or filepath2 in quarantine:
+                continue
 
             display_images(filepath1, filepath2, size1, size2, img_size1, img_size2, mod_date1, mod_date2, file)
 
@@ -39,12 +46,15 @@ def display_images(filepath1, filepath2, size1, size2, img_size1, img_size2, mod
     root = tk.Toplevel()
     root.title(f"Comparing: {filename}")
     
-    # Load and resize images
-    img1 = Image.open(filepath1).resize((600, 900))
-    img2 = Image.open(filepath2).resize((600, 900))
-    
-    img1 = ImageTk.PhotoImage(img1)
-    img2 = ImageTk.PhotoImage(img2)
+    # Load and resize images (decoded at reduced size to keep memory bounded)
+    img1 = load_preview(filepath1, PREVIEW_SIZE, report=quarantine)
+    img2 = load_preview(filepath2, PREVIEW_SIZE, report=quarantine)
+    if img1 is None or img2 is None:
+        root.destroy()
+        return
+
+    img1 = ImageTk.PhotoImage(img1.resize(PREVIEW_SIZE))
+    img2 = ImageTk.PhotoImage(img2.resize(PREVIEW_SIZE))
     
     # Create a frame for the images
     frame = tk.Frame(root)
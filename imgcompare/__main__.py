@@ -0,0 +1,378 @@
+import argparse
+import os
+import sys
+from imgcompare.throttle import add_throttle_arguments, throttle_from_args
+
+# Headless entry point: python -m imgcompare <command>. Only argparse, os and the
+# small throttle module are imported up front; scanning modules are imported by
+# the command that needs them, and Tk only by the "gui" command, so cron jobs and
+# workers start fast.
+
+# GUI frontends (scripts next to the package), loaded only on request
+FRONTENDS = {"pair": "Compare5.py", "multi": "4Compare.py"}
+
+
+def load_frontend(name):
+    """Import a GUI frontend script as a module."""
+    import importlib.util
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), FRONTENDS[name])
+    spec = importlib.util.spec_from_file_location(f"imgcompare_frontend_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def quarantine_for(folder):
+    from imgcompare.decode import QuarantineReport
+    return QuarantineReport(os.path.join(os.path.dirname(os.path.normpath(folder)), "quarantine.csv"))
+
+
+def parse_where(args):
+    """Compile the --where expression up front, so typos and non-conditions fail before any scanning."""
+    if not args.where:
+        return None
+    from imgcompare.query import Query, QueryError
+    try:
+        return Query(args.where)
+    except QueryError as e:
+        raise SystemExit(str(e)) from None
+
+
+def command_pairs(args):
+    """List same-name pairs with their info, marking those whose properties all match.
+
+    Pairs that are hardlinks or reflink clones of one file are marked
+    "hardlink" or "reflink": deleting either side would free nothing.
+    """
+    from imgcompare.core import compare_folders, properties_match
+    from imgcompare.fsid import same_storage
+    from imgcompare.fsio import ConcurrentIO
+    where = parse_where(args)
+    quarantine, file_io = quarantine_for(args.folder1), ConcurrentIO(throttle=throttle_from_args(args))
+    file_list = compare_folders(args.folder1, args.folder2, quarantine, file_io)
+    candidates = [True] * len(file_list)
+    if where is not None:
+        from imgcompare.query import QueryError, filter_pairs
+        try:
+            candidates = filter_pairs([(entry[0], entry[1]) for entry in file_list], where, quarantine, file_io)
+        except QueryError as e:
+            raise SystemExit(str(e)) from None
+    if args.prefilter:
+        from imgcompare.cache import MetadataCache
+        from imgcompare.signature import prefilter_pairs
+        cache = MetadataCache(os.path.join(os.path.dirname(os.path.normpath(args.folder1)), "metadata_cache.db"))
+        candidates = candidates & prefilter_pairs([(entry[0], entry[1]) for entry in file_list], cache, quarantine,
+                                                  file_io)
+    report = None
+    if args.report:
+        from imgcompare.report import open_report
+        report = open_report(args.report)
+    for entry, candidate in zip(file_list, candidates):
+        filepath1, filepath2, size1, size2, img_size1, img_size2, mod_date1, mod_date2, file = entry
+        identical = properties_match(entry)
+        if (args.identical and not identical) or not candidate:
+            continue
+        # Hardlinks and reflink clones are told apart from stat and block maps, without reading data
+        storage = same_storage(filepath1, filepath2, (file_io.stat(filepath1), file_io.stat(filepath2)))
+        if report is not None:
+            decisions = ["keep", "link"] if storage else None
+            report.write_group([{"path": filepath1, "img_size": img_size1}, {"path": filepath2, "img_size": img_size2}],
+                               decisions, key=file)
+        else:
+            print(f"{storage or ('same' if identical else 'differs')}\t{filepath1}\t{filepath2}")
+    if report is not None:
+        report.close()
+    return 0
+
+
+def command_same(args):
+    """Move (or link) the left file of every pair whose properties all match, as the pair GUI does.
+
+    With --ignore-metadata, JPEG pairs whose image data matches are moved
+    too, and with --pixels lossless pairs whose decoded pixels match, the
+    way the pair GUI treats such copies. Pairs that are already hardlinks
+    or reflink clones of one file are left alone and counted.
+    """
+    from imgcompare.core import compare_folders, move_to_same_folder, properties_match
+    from imgcompare.fsid import same_storage
+    from imgcompare.fsio import ConcurrentIO
+    file_io = ConcurrentIO(throttle=throttle_from_args(args))
+    quarantine = quarantine_for(args.folder1)
+    file_list = compare_folders(args.folder1, args.folder2, quarantine, file_io)
+    same_folder = os.path.join(os.path.dirname(os.path.normpath(args.folder1)), "same")
+    journal = None
+    if args.dedupe:
+        from imgcompare.dedupe import DedupeError, Journal, link_duplicate
+        journal = Journal(os.path.join(os.path.dirname(same_folder), "dedupe_journal.jsonl"))
+    same_content = lambda entry: False
+    if args.ignore_metadata:
+        from imgcompare.jpeghash import same_jpeg_content
+        same_content = lambda entry: same_jpeg_content(entry[0], entry[1], throttle=file_io.throttle)
+    if args.pixels:
+        from imgcompare.pixelhash import identical_pixel_pairs
+        pixel_identical = identical_pixel_pairs([(entry[0], entry[1]) for entry in file_list
+                                                 if not properties_match(entry)], report=quarantine)
+        jpeg_content = same_content
+        same_content = lambda entry: (entry[0], entry[1]) in pixel_identical or jpeg_content(entry)
+    done = linked = 0
+    for entry in file_list:
+        filepath1, filepath2 = entry[0], entry[1]
+        if same_storage(filepath1, filepath2, (file_io.stat(filepath1), file_io.stat(filepath2))):
+            # Already one file on disk: moving or linking it would reclaim nothing
+            linked += 1
+            continue
+        identical = properties_match(entry)
+        if not identical and not same_content(entry):
+            continue
+        # Only byte-identical pairs can be linked; copies with the same content are moved
+        link = args.dedupe and identical
+        if args.dry_run:
+            print(f"{'link' if link else 'move'}\t{filepath2 if link else filepath1}")
+        elif link:
+            try:
+                link_duplicate(filepath1, filepath2, args.dedupe, journal)
+            except DedupeError as e:
+                print(f"skipped\t{filepath2}\t{e}", file=sys.stderr)
+                continue
+        else:
+            move_to_same_folder(filepath1, same_folder)
+        done += 1
+    print(f"{done} identical pairs{' (dry run)' if args.dry_run else ''}, {linked} already sharing storage")
+    return 0
+
+
+def command_policy(args):
+    """Show (or apply) what the keep policy would delete across numbered folders."""
+    from imgcompare.core import filename_sets, image_files, numbered_folders, policy_record, trash
+    from imgcompare.fsio import ConcurrentIO
+    from imgcompare.policy import (DEFAULT_CRITERIA, TABLE_FIELDS, apply_decisions, build_table, decide,
+                                   format_summary, reclaim_summary)
+    folder_base = os.path.normpath(args.folder_base)
+    quarantine = quarantine_for(folder_base)
+    file_io = ConcurrentIO(throttle=throttle_from_args(args))
+    if args.bursts:
+        from imgcompare.bursts import find_bursts
+        folders = numbered_folders(folder_base)
+        image_sets = find_bursts([path for folder in folders for path in image_files(folder)])
+    else:
+        image_sets = filename_sets(numbered_folders(folder_base), image_files(folder_base))
+    paths = [path for image_set in image_sets for path in image_set]
+    records = dict(zip(paths, file_io.map(lambda path: policy_record(path, quarantine, file_io), paths)))
+    fields, criteria = TABLE_FIELDS, DEFAULT_CRITERIA
+    if args.quality:
+        from imgcompare.cache import MetadataCache
+        from imgcompare.quality import POLICY_FIELDS, QUALITY_CRITERIA, add_quality
+        cache = MetadataCache(os.path.join(os.path.dirname(folder_base), "metadata_cache.db"))
+        add_quality(records.values(), cache, quarantine)
+        fields, criteria = POLICY_FIELDS, QUALITY_CRITERIA
+    groups = [[records[path] for path in image_set if records[path]] for image_set in image_sets]
+    table = build_table((group for group in groups if len(group) > 1), fields)
+    keep = decide(table, criteria)
+    print(format_summary(reclaim_summary(table, keep)))
+    if args.report:
+        from imgcompare.report import open_report, write_policy_decisions
+        with open_report(args.report) as report:
+            write_policy_decisions(report, table, keep)
+    if args.apply:
+        apply_decisions(table, keep, trash)
+    return 0
+
+
+def command_library(args):
+    """Check an incoming folder against the archive library, or add files to it."""
+    from imgcompare.cache import MetadataCache
+    from imgcompare.core import image_files
+    from imgcompare.fsio import ConcurrentIO
+    from imgcompare.library import LibraryIndex, add_paths, check_paths
+    library = LibraryIndex(args.library)
+    if args.action == "compact":
+        library.compact()
+        print(f"{len(library)} files in the library")
+        return 0
+    paths = [path for folder in args.folders for path in image_files(folder)]
+    cache = MetadataCache(os.path.join(args.library, "metadata_cache.db"))
+    quarantine, file_io = quarantine_for(args.library), ConcurrentIO(throttle=throttle_from_args(args))
+    if args.action == "add":
+        added = add_paths(library, paths, cache, quarantine, file_io)
+        cache.commit()
+        print(f"{added} files added or updated, {len(library)} in the library")
+        return 0
+    counts = {"archived": 0, "similar": 0, "new": 0, "unreadable": 0}
+    for path, status, matches in check_paths(library, paths, cache, quarantine, file_io):
+        counts[status] += 1
+        if status != "archived" or args.verbose:
+            print(f"{status}\t{path}\t{' '.join(matches)}".rstrip("\t"))
+    cache.commit()
+    print(", ".join(f"{count} {status}" for status, count in counts.items()))
+    return 0
+
+
+def command_discover(args):
+    """List folder pairs below the roots that probably overlap, worth feeding to "pairs"."""
+    from imgcompare.fsio import ConcurrentIO
+    from imgcompare.overlap import find_overlaps, sketch_folders
+    file_io = ConcurrentIO(throttle=throttle_from_args(args)) if args.contents else None
+    sketches = sketch_folders(args.roots, contents=args.contents, file_io=file_io)
+    overlaps = find_overlaps(sketches, args.min_similarity)
+    for overlap in overlaps[:args.top]:
+        print(f"{overlap.reclaimable / 1024 ** 2:.1f} MB\t{overlap.shared_files} files\t"
+              f"names {overlap.name_similarity:.2f}\tcontents {overlap.content_similarity:.2f}\t"
+              f"{overlap.folder1}\t{overlap.folder2}")
+    print(f"{len(overlaps)} overlapping pairs among {len(sketches)} folders")
+    return 0
+
+
+def command_pixels(args):
+    """Group lossless images (PNG, BMP, TIFF...) below the folders by identical decoded pixels."""
+    from imgcompare.cache import MetadataCache
+    from imgcompare.pixelhash import LOSSLESS_EXTENSIONS, pixel_groups
+    from imgcompare.shards import walk_files
+    paths = [path for folder in args.folders for path, _ in walk_files(folder, LOSSLESS_EXTENSIONS)]
+    cache = MetadataCache(args.cache) if args.cache else None
+    groups = pixel_groups(paths, cache, quarantine_for(args.folders[0]), args.workers)
+    if args.report:
+        from imgcompare.report import open_report
+        with open_report(args.report) as report:
+            for group in groups:
+                report.write_group(group)
+    else:
+        for group in groups:
+            print("\t".join(group))
+    print(f"{len(groups)} groups of identical pixels among {len(paths)} files", file=sys.stderr)
+    return 0
+
+
+def command_merge(args):
+    """Plan merging one folder tree into another, and carry the plan out with --apply."""
+    from imgcompare.merge import execute_plan, open_journal, plan_merge, plan_summary
+    groups = None
+    if args.shard:
+        from imgcompare.shards import duplicate_groups
+        groups = duplicate_groups(args.shard)
+    throttle = throttle_from_args(args)
+    plan = plan_merge(args.source, args.target, groups, throttle)
+    for step in plan:
+        if step.action != "skip" or args.verbose:
+            print(f"{step.action}\t{step.source}\t{step.target}\t{step.reason}".rstrip("\t"))
+    print(plan_summary(plan))
+    if args.report:
+        from imgcompare.report import open_report
+        with open_report(args.report) as report:
+            for step in plan:
+                report.write_group([step.source], [step.action], key=step.target)
+    if not args.apply:
+        return 0
+    copied, copied_bytes, failed = execute_plan(plan, open_journal(args.target), args.workers,
+                                                verify=not args.no_verify, throttle=throttle)
+    for step, error in failed:
+        print(f"failed\t{step.source}\t{error}", file=sys.stderr)
+    print(f"{copied} files copied ({copied_bytes / 1024 ** 2:.1f} MB), {len(failed)} failed")
+    return 1 if failed else 0
+
+
+def command_gui(args):
+    """Start one of the Tk frontends."""
+    if args.frontend == "pair":
+        if len(args.folders) != 2:
+            raise SystemExit("gui pair needs two folders")
+        module = load_frontend("pair")
+        module.start_comparing(*args.folders, watch=args.watch, grid=args.grid, report_path=args.report,
+                               prefilter=args.prefilter, throttle=throttle_from_args(args), where=parse_where(args))
+    else:
+        if len(args.folders) != 1:
+            raise SystemExit("gui multi needs the base folder")
+        module = load_frontend("multi")
+        module.PictureComparatorApp(args.folders[0], args.bursts, report_path=args.report,
+                                  throttle=throttle_from_args(args)).run()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m imgcompare", description="Compare image folders.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    pairs = commands.add_parser("pairs", help="list same-name pairs of two folders")
+    pairs.add_argument("folder1")
+    pairs.add_argument("folder2")
+    pairs.add_argument("--identical", action="store_true", help="only pairs whose properties all match")
+    pairs.add_argument("--prefilter", action="store_true", help="drop pairs whose colour signatures clearly differ")
+    pairs.add_argument("--report", help="write to a .jsonl, .csv or .db report instead of printing")
+    pairs.add_argument("--where", help="only pairs matching a filter expression, e.g. \"left.size < right.size\"")
+    add_throttle_arguments(pairs)
+    pairs.set_defaults(run=command_pairs)
+
+    same = commands.add_parser("same", help="move or link identical pairs without review")
+    same.add_argument("folder1")
+    same.add_argument("folder2")
+    same.add_argument("--dedupe", choices=("hardlink", "reflink", "auto"), help="link instead of moving to 'same'")
+    same.add_argument("--ignore-metadata", action="store_true",
+                      help="also take JPEG pairs whose image data matches but EXIF/XMP/ICC differ")
+    same.add_argument("--pixels", action="store_true",
+                      help="also take lossless pairs (PNG, BMP, TIFF...) whose decoded pixels are identical")
+    same.add_argument("--dry-run", action="store_true")
+    add_throttle_arguments(same)
+    same.set_defaults(run=command_same)
+
+    policy = commands.add_parser("policy", help="keep-policy summary over numbered folders")
+    policy.add_argument("folder_base")
+    policy.add_argument("--bursts", action="store_true", help="group burst shots instead of file names")
+    policy.add_argument("--report", help="log the decisions to a .jsonl, .csv or .db report")
+    policy.add_argument("--apply", action="store_true", help="move the non-kept files to the recycle bin")
+    policy.add_argument("--quality", action="store_true",
+                        help="also weigh JPEG quality, sharpness and noise (measured in worker processes)")
+    add_throttle_arguments(policy)
+    policy.set_defaults(run=command_policy)
+
+    library = commands.add_parser("library", help="check or grow the archive library index")
+    library.add_argument("action", choices=("check", "add", "compact"))
+    library.add_argument("library", help="library directory")
+    library.add_argument("folders", nargs="*")
+    library.add_argument("--verbose", action="store_true", help="also list files that are already archived")
+    add_throttle_arguments(library)
+    library.set_defaults(run=command_library)
+
+    discover = commands.add_parser("discover", help="find overlapping folder pairs below the roots")
+    discover.add_argument("roots", nargs="+")
+    discover.add_argument("--contents", action="store_true", help="also sketch file contents, to catch renamed copies")
+    discover.add_argument("--top", type=int, default=20)
+    discover.add_argument("--min-similarity", type=float, default=0.3)
+    add_throttle_arguments(discover)
+    discover.set_defaults(run=command_discover)
+
+    pixels = commands.add_parser("pixels", help="group lossless images with identical decoded pixels")
+    pixels.add_argument("folders", nargs="+")
+    pixels.add_argument("--workers", type=int, help="decoding processes (default: one per CPU)")
+    pixels.add_argument("--cache", help="metadata cache database to reuse hashes across runs")
+    pixels.add_argument("--report", help="write the groups to a .jsonl, .csv or .db report instead of printing")
+    pixels.set_defaults(run=command_pixels)
+
+    merge = commands.add_parser("merge", help="plan (and run) merging a folder tree into another")
+    merge.add_argument("source")
+    merge.add_argument("target")
+    merge.add_argument("--shard", help="also skip files sharing a duplicate group of this shard with the target")
+    merge.add_argument("--apply", action="store_true", help="carry out the plan")
+    merge.add_argument("--workers", type=int, default=8, help="parallel copies")
+    merge.add_argument("--no-verify", action="store_true", help="do not re-hash copies before renaming them in")
+    merge.add_argument("--verbose", action="store_true", help="also list skipped files")
+    merge.add_argument("--report", help="log the plan to a .jsonl, .csv or .db report")
+    add_throttle_arguments(merge)
+    merge.set_defaults(run=command_merge)
+
+    gui = commands.add_parser("gui", help="start a Tk frontend")
+    gui.add_argument("frontend", choices=sorted(FRONTENDS))
+    gui.add_argument("folders", nargs="+")
+    gui.add_argument("--watch", action="store_true")
+    gui.add_argument("--grid", action="store_true")
+    gui.add_argument("--bursts", action="store_true")
+    gui.add_argument("--prefilter", action="store_true")
+    gui.add_argument("--report")
+    gui.add_argument("--where", help="pair frontend: review only pairs matching a filter expression")
+    add_throttle_arguments(gui)
+    gui.set_defaults(run=command_gui)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
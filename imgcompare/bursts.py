@@ -0,0 +1,120 @@
+import os
+from datetime import datetime
+from imgcompare.decode import DECODE_ERRORS, open_image
+
+# EXIF tags used to order captures
+TAG_MAKE = 0x010F
+TAG_MODEL = 0x0110
+TAG_DATETIME = 0x0132
+TAG_EXIF_IFD = 0x8769
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_SUBSEC_TIME_ORIGINAL = 0x9291
+
+# Captures closer than this (in seconds) belong to the same burst
+BURST_WINDOW = 1.0
+
+
+class Capture:
+    """Capture time and camera of one image."""
+
+    __slots__ = ("path", "time", "make", "model")
+
+    def __init__(self, path, time, make="", model=""):
+        self.path = path
+        self.time = time
+        self.make = make
+        self.model = model
+
+    @property
+    def camera(self):
+        return (self.make, self.model)
+
+    def __repr__(self):
+        return f"Capture({self.path!r}, {self.time:.3f}, {self.make} {self.model})"
+
+
+def parse_capture_time(date_str, subsec=None):
+    """Convert an EXIF 'YYYY:MM:DD HH:MM:SS' string plus SubSec digits to seconds."""
+    date_str = str(date_str).strip("\x00 ")
+    seconds = datetime.strptime(date_str[:19], '%Y:%m:%d %H:%M:%S').timestamp()
+    digits = "".join(ch for ch in str(subsec or "") if ch.isdigit())
+    if digits:
+        seconds += int(digits) / 10 ** len(digits)
+    return seconds
+
+
+def read_capture(path, cache=None):
+    """Return the Capture of an image, or None if it has no usable capture time."""
+    st = os.stat(path)
+    data = cache.get(path, st.st_size, st.st_mtime_ns) if cache is not None else None
+    if data is None or "capture_time" not in data:
+        fields = _read_capture_fields(path)
+        if cache is not None:
+            data = cache.update(path, st.st_size, st.st_mtime_ns, **fields)
+        else:
+            data = fields
+    if data["capture_time"] is None:
+        return None
+    return Capture(path, data["capture_time"], data["make"], data["model"])
+
+
+def _read_capture_fields(path):
+    """Read capture time and camera from the EXIF block, without decoding pixels."""
+    fields = {"capture_time": None, "make": "", "model": ""}
+    try:
+        with open_image(path) as img:
+            exif = img.getexif()
+            exif_ifd = exif.get_ifd(TAG_EXIF_IFD)
+    except DECODE_ERRORS:
+        return fields
+    fields["make"] = str(exif.get(TAG_MAKE, "")).strip("\x00 ")
+    fields["model"] = str(exif.get(TAG_MODEL, "")).strip("\x00 ")
+    date_str = exif_ifd.get(TAG_DATETIME_ORIGINAL) or exif.get(TAG_DATETIME)
+    if date_str:
+        try:
+            fields["capture_time"] = parse_capture_time(date_str, exif_ifd.get(TAG_SUBSEC_TIME_ORIGINAL))
+        except ValueError:
+            pass  # Unset dates are often written as "0000:00:00 00:00:00"
+    return fields
+
+
+def collect_captures(paths, cache=None):
+    """Read the capture info of many images, skipping those without a capture time."""
+    captures = []
+    for path in paths:
+        try:
+            capture = read_capture(path, cache)
+        except FileNotFoundError:
+            continue
+        if capture is not None:
+            captures.append(capture)
+    if cache is not None:
+        cache.commit()
+    return captures
+
+
+def cluster_bursts(captures, window=BURST_WINDOW, min_size=2):
+    """Group captures from the same camera taken within window seconds of each other.
+
+    Captures are sorted once by camera and time, then split wherever the gap
+    to the previous frame exceeds the window, so a long burst chains together.
+    Returns lists of paths in capture order, largest clusters first.
+    """
+    ordered = sorted(captures, key=lambda c: (c.camera, c.time, c.path))
+    clusters = []
+    current = []
+    for capture in ordered:
+        if current and (capture.camera != current[-1].camera or capture.time - current[-1].time > window):
+            clusters.append(current)
+            current = []
+        current.append(capture)
+    if current:
+        clusters.append(current)
+    clusters = [[c.path for c in cluster] for cluster in clusters if len(cluster) >= min_size]
+    clusters.sort(key=lambda cluster: -len(cluster))
+    return clusters
+
+
+def find_bursts(paths, window=BURST_WINDOW, cache=None):
+    """Return the burst clusters among the given image files."""
+    return cluster_bursts(collect_captures(paths, cache), window)
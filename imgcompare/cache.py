@@ -0,0 +1,59 @@
+import json
+import sqlite3
+import threading
+
+
+class MetadataCache:
+    """Persistent per-file metadata, keyed by path and invalidated by size and mtime.
+
+    Each entry holds a small JSON dict (image size, signatures, hashes...)
+    so later stages can add fields without changing the schema.
+    """
+
+    def __init__(self, cache_path=":memory:"):
+        self.cache_path = cache_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS files ("
+                          "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, data TEXT)")
+
+    def get(self, path, size, mtime_ns):
+        """Return the cached dict for path, or None if missing or stale."""
+        with self.lock:
+            row = self.conn.execute("SELECT size, mtime_ns, data FROM files WHERE path = ?",
+                                    (path,)).fetchone()
+        if row is None or row[0] != size or row[1] != mtime_ns:
+            return None
+        return json.loads(row[2])
+
+    def put(self, path, size, mtime_ns, data):
+        """Store the dict for path, replacing anything cached before."""
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                              (path, size, mtime_ns, json.dumps(data)))
+
+    def update(self, path, size, mtime_ns, **fields):
+        """Merge fields into the cached dict for path, dropping it first if stale."""
+        data = self.get(path, size, mtime_ns) or {}
+        data.update(fields)
+        self.put(path, size, mtime_ns, data)
+        return data
+
+    def remove(self, path):
+        with self.lock:
+            self.conn.execute("DELETE FROM files WHERE path = ?", (path,))
+
+    def rename(self, old_path, new_path):
+        """Move an entry to its new path; size and mtime survive a rename."""
+        with self.lock:
+            self.conn.execute("DELETE FROM files WHERE path = ?", (new_path,))
+            self.conn.execute("UPDATE files SET path = ? WHERE path = ?", (new_path, old_path))
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+
+    def close(self):
+        self.commit()
+        self.conn.close()
@@ -0,0 +1,221 @@
+import os
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import Canvas, Scrollbar
+from PIL import ImageTk
+from imgcompare.thumbcache import THUMBNAIL_SIZE
+
+# Layout of one row (one duplicate group) of the sheet
+CELL_PAD = 6
+CELL_WIDTH = THUMBNAIL_SIZE[0] + 2 * CELL_PAD
+ROW_HEIGHT = THUMBNAIL_SIZE[1] + 2 * CELL_PAD + 18
+MAX_CELLS = 8
+
+# Rows drawn above and below the viewport ahead of scrolling
+ROW_MARGIN = 2
+# How often finished thumbnail loads are put on the canvas
+POLL_MS = 30
+
+SELECTED_COLOR = "#cde4ff"
+ROW_COLOR = "#f4f4f4"
+
+
+class ContactSheet:
+    """Scrolling grid of duplicate groups, one group per row, with bulk select and resolve.
+
+    Only the rows in view are drawn, and only their thumbnails are read from
+    the thumbnail cache (in background threads), so the sheet stays smooth
+    with any number of groups. Click a row to select it, Shift-click to
+    select a range, Ctrl+A to select everything.
+
+    on_resolve(groups) is called with the selected groups (lists of paths)
+    and returns the groups it resolved, which are then taken off the sheet.
+    """
+
+    def __init__(self, master, groups, thumbnails, on_resolve, title="Contact sheet", workers=4):
+        self.groups = [list(group) for group in groups]
+        self.thumbnails = thumbnails
+        self.on_resolve = on_resolve
+        self.selected = set()  # Row indices
+        self.last_clicked = None
+        self.drawn = {}  # row -> canvas item ids
+        self.photos = {}  # (row, cell) -> PhotoImage
+        self.loading = {}  # row -> [(cell, Future)] of thumbnails still being read, for drawn rows only
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnails")
+        self.redraw_pending = False
+
+        self.window = tk.Toplevel(master)
+        self.window.title(title)
+        self.window.geometry(f"{MAX_CELLS * CELL_WIDTH + 40}x{6 * ROW_HEIGHT + 60}")
+
+        toolbar = tk.Frame(self.window)
+        toolbar.pack(side="top", fill="x")
+        tk.Button(toolbar, text="Select all", command=self.select_all).pack(side="left")
+        tk.Button(toolbar, text="Clear selection", command=self.clear_selection).pack(side="left")
+        tk.Button(toolbar, text="Resolve selected", command=self.resolve_selected, bg='red').pack(side="left")
+        self.status = tk.Label(toolbar, text="")
+        self.status.pack(side="left", padx=10)
+
+        self.canvas = Canvas(self.window, bg="white")
+        self.scrollbar = Scrollbar(self.window, orient="vertical", command=self.canvas.yview)
+        self.canvas.config(yscrollcommand=self.on_scroll)
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
+
+        self.canvas.bind("<Configure>", lambda e: self.schedule_redraw())
+        self.canvas.bind("<Button-1>", self.on_click)
+        self.canvas.bind("<Shift-Button-1>", self.on_shift_click)
+        self.canvas.bind("<MouseWheel>", lambda e: self.canvas.yview_scroll(-1 if e.delta > 0 else 1, "units"))
+        self.canvas.bind("<Button-4>", lambda e: self.canvas.yview_scroll(-1, "units"))
+        self.canvas.bind("<Button-5>", lambda e: self.canvas.yview_scroll(1, "units"))
+        self.window.bind("<Control-a>", lambda e: self.select_all())
+        self.window.bind("<Escape>", lambda e: self.clear_selection())
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        self.reset_rows()
+        self.window.after(POLL_MS, self.poll_loaded)
+
+    def reset_rows(self):
+        """Forget everything drawn and lay the sheet out for the current groups."""
+        for row in list(self.loading):
+            self.cancel_loading(row)
+        self.canvas.delete("all")
+        self.drawn.clear()
+        self.photos.clear()
+        self.canvas.config(scrollregion=(0, 0, MAX_CELLS * CELL_WIDTH, len(self.groups) * ROW_HEIGHT),
+                           yscrollincrement=ROW_HEIGHT // 4)
+        self.update_status()
+        self.schedule_redraw()
+
+    def update_status(self):
+        self.status.config(text=f"{len(self.groups)} groups, {len(self.selected)} selected")
+
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.schedule_redraw()
+
+    def schedule_redraw(self):
+        if not self.redraw_pending:
+            self.redraw_pending = True
+            self.window.after_idle(self.redraw)
+
+    def visible_rows(self):
+        top = self.canvas.canvasy(0)
+        height = max(self.canvas.winfo_height(), ROW_HEIGHT)
+        first = int(top // ROW_HEIGHT) - ROW_MARGIN
+        last = int((top + height) // ROW_HEIGHT) + ROW_MARGIN
+        return range(max(0, first), min(len(self.groups), last + 1))
+
+    def redraw(self):
+        """Draw rows that scrolled into view and drop the ones that left it."""
+        self.redraw_pending = False
+        visible = self.visible_rows()
+        for row in [row for row in self.drawn if row not in visible]:
+            for item in self.drawn.pop(row):
+                self.canvas.delete(item)
+            for cell in range(MAX_CELLS):
+                self.photos.pop((row, cell), None)
+            self.cancel_loading(row)
+        for row in visible:
+            if row not in self.drawn:
+                self.draw_row(row)
+
+    def draw_row(self, row):
+        top = row * ROW_HEIGHT
+        group = self.groups[row]
+        color = SELECTED_COLOR if row in self.selected else ROW_COLOR
+        items = [self.canvas.create_rectangle(0, top + 1, MAX_CELLS * CELL_WIDTH, top + ROW_HEIGHT - 1,
+                                              fill=color, outline="", tags=(f"row{row}", "background"))]
+        for cell, path in enumerate(group[:MAX_CELLS]):
+            left = cell * CELL_WIDTH
+            name = os.path.basename(os.path.dirname(path)) or path
+            items.append(self.canvas.create_text(left + CELL_WIDTH // 2, top + ROW_HEIGHT - 9, text=name[:20],
+                                                 font=("TkDefaultFont", 8)))
+            self.loading.setdefault(row, []).append((cell, self.executor.submit(self.thumbnails.get, path)))
+        if len(group) > MAX_CELLS:
+            items.append(self.canvas.create_text(MAX_CELLS * CELL_WIDTH - 20, top + 10,
+                                                 text=f"+{len(group) - MAX_CELLS}", fill="red"))
+        self.drawn[row] = items
+
+    def cancel_loading(self, row):
+        """Stop reading the thumbnails of a row that is no longer drawn."""
+        for _, future in self.loading.pop(row, ()):
+            future.cancel()
+
+    def poll_loaded(self):
+        """Put thumbnails that finished loading onto the rows they were read for."""
+        for row in list(self.loading):
+            pending = []
+            for cell, future in self.loading[row]:
+                if not future.done():
+                    pending.append((cell, future))
+                    continue
+                thumbnail = future.result() if not future.exception() else None
+                if thumbnail is None:
+                    continue
+                photo = ImageTk.PhotoImage(thumbnail)
+                self.photos[(row, cell)] = photo
+                x = cell * CELL_WIDTH + CELL_WIDTH // 2
+                y = row * ROW_HEIGHT + CELL_PAD + THUMBNAIL_SIZE[1] // 2
+                self.drawn[row].append(self.canvas.create_image(x, y, image=photo))
+            if pending:
+                self.loading[row] = pending
+            else:
+                del self.loading[row]
+        self.window.after(POLL_MS, self.poll_loaded)
+
+    def row_at(self, event):
+        row = int(self.canvas.canvasy(event.y) // ROW_HEIGHT)
+        return row if 0 <= row < len(self.groups) else None
+
+    def on_click(self, event):
+        row = self.row_at(event)
+        if row is None:
+            return
+        self.selected ^= {row}
+        self.last_clicked = row
+        self.refresh_row_color(row)
+        self.update_status()
+
+    def on_shift_click(self, event):
+        row = self.row_at(event)
+        if row is None:
+            return
+        start = self.last_clicked if self.last_clicked is not None else row
+        for r in range(min(start, row), max(start, row) + 1):
+            self.selected.add(r)
+            self.refresh_row_color(r)
+        self.last_clicked = row
+        self.update_status()
+
+    def refresh_row_color(self, row):
+        color = SELECTED_COLOR if row in self.selected else ROW_COLOR
+        self.canvas.itemconfig(f"row{row}", fill=color)
+
+    def select_all(self):
+        self.selected = set(range(len(self.groups)))
+        self.canvas.itemconfig("background", fill=SELECTED_COLOR)
+        self.update_status()
+
+    def clear_selection(self):
+        self.selected.clear()
+        self.canvas.itemconfig("background", fill=ROW_COLOR)
+        self.update_status()
+
+    def resolve_selected(self):
+        """Hand the selected groups to on_resolve and drop the ones it resolved."""
+        if not self.selected:
+            return
+        rows = sorted(self.selected)
+        resolved = self.on_resolve([self.groups[row] for row in rows])
+        if not resolved:
+            return
+        resolved_ids = {id(group) for group in resolved}
+        self.groups = [group for group in self.groups if id(group) not in resolved_ids]
+        self.selected.clear()
+        self.last_clicked = None
+        self.reset_rows()
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.window.destroy()
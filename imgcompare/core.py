@@ -0,0 +1,174 @@
+import glob
+import os
+import shutil
+from datetime import datetime
+from PIL import ExifTags
+from imgcompare.decode import DECODE_ERRORS, exif_orientation, open_image, oriented_size, read_header
+from imgcompare.fsid import storage_fields
+from imgcompare.rawpreview import RAW_EXTENSIONS, TIFF_EXTENSIONS
+
+# Scanning, metadata, matching and file actions shared by the frontends. Nothing
+# here may import tkinter or PIL.ImageTk: this module has to work headless.
+
+IMAGE_EXTENSIONS = ('.jpg',) + TIFF_EXTENSIONS + RAW_EXTENSIONS
+
+
+def _stat(filepath, file_io=None):
+    if file_io is not None:
+        return file_io.stat(filepath)
+    try:
+        return os.stat(filepath)
+    except FileNotFoundError:
+        return None
+
+
+def file_info(filepath, report=None, file_io=None):
+    """Return (size in MB, image size, modification date), or None if missing or unreadable."""
+    file_stats = _stat(filepath, file_io)
+    if file_stats is None:
+        return None
+    img_size = read_header(filepath, report=report)
+    if img_size is None:
+        return None
+    mod_date = datetime.fromtimestamp(file_stats.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
+    return file_stats.st_size / (1024 * 1024), img_size, mod_date
+
+
+def same_name_pairs(folder1, folder2):
+    """Return (name, path1, path2) for every file name present in both folders."""
+    files1 = os.listdir(folder1)
+    files2 = os.listdir(folder2)
+    smaller_folder = files1 if len(files1) < len(files2) else files2
+    larger_names = set(files2 if len(files1) < len(files2) else files1)
+    return [(file, os.path.normpath(os.path.join(folder1, file)), os.path.normpath(os.path.join(folder2, file)))
+            for file in smaller_folder if file in larger_names]
+
+
+def compare_folders(folder1, folder2, report=None, file_io=None):
+    """Collect same-name pairs of two folders with their file info.
+
+    Returns a list of (filepath1, filepath2, size1, size2, img_size1,
+    img_size2, mod_date1, mod_date2, filename) entries; pairs with a missing
+    or unreadable side are left out. Infos are read through file_io
+    (fsio.ConcurrentIO) concurrently when given.
+    """
+    pairs = same_name_pairs(folder1, folder2)
+    paths = [path for _, path1, path2 in pairs for path in (path1, path2)]
+    read = lambda path: file_info(path, report, file_io)
+    infos = file_io.map(read, paths) if file_io is not None else [read(path) for path in paths]
+
+    file_list = []
+    for n, (file, filepath1, filepath2) in enumerate(pairs):
+        info1, info2 = infos[2 * n], infos[2 * n + 1]
+        if info1 is None or info2 is None:
+            continue
+        size1, img_size1, mod_date1 = info1
+        size2, img_size2, mod_date2 = info2
+        file_list.append((filepath1, filepath2, size1, size2, img_size1, img_size2, mod_date1, mod_date2, file))
+    return file_list
+
+
+def properties_match(entry):
+    """True if both sides of a compare_folders entry have the same name, sizes and date."""
+    filepath1, filepath2, size1, size2, img_size1, img_size2, mod_date1, mod_date2, _ = entry
+    return (os.path.basename(filepath1) == os.path.basename(filepath2) and size1 == size2
+            and img_size1 == img_size2 and mod_date1 == mod_date2)
+
+
+def move_to_same_folder(filepath, same_folder):
+    """Move filepath into same_folder, creating it if needed."""
+    os.makedirs(same_folder, exist_ok=True)
+    shutil.move(filepath, os.path.join(same_folder, os.path.basename(filepath)))
+
+
+def trash(filepath):
+    """Move filepath to the recycle bin."""
+    from send2trash import send2trash
+    send2trash(filepath)
+
+
+def numbered_folders(folder_base):
+    """The base folder and its siblings with decreasing numbers (e.g. 3, 2, 1)."""
+    base_number = int(os.path.basename(folder_base))
+    base_dir = os.path.dirname(folder_base)
+    return [os.path.normpath(os.path.join(base_dir, str(i))) for i in range(base_number, 0, -1)]
+
+
+def image_files(folder, extensions=IMAGE_EXTENSIONS):
+    """Sorted image paths directly inside folder."""
+    return sorted(f for f in glob.glob(os.path.join(folder, "*")) if f.lower().endswith(extensions))
+
+
+def filename_sets(folders, files):
+    """One set per file: the path of the same file name in every folder."""
+    return [[os.path.normpath(os.path.join(folder, os.path.basename(file))) for folder in folders]
+            for file in files]
+
+
+def image_info(image_path, report=None, file_io=None):
+    """Metadata shown and compared for one image: stat, size, DPI, mode, camera and GPS.
+
+    Returns None if the file does not exist.
+    """
+    file_stats = _stat(image_path, file_io)
+    if file_stats is None:
+        return None
+    try:
+        with open_image(image_path) as img:
+            width, height = oriented_size(img.size, exif_orientation(img))
+            exif = img._getexif() if hasattr(img, "_getexif") else None
+            dpi = img.info.get('dpi', (0, 0))
+            bit_depth = img.mode
+            n_frames = getattr(img, "n_frames", 1)
+    except DECODE_ERRORS:
+        n_frames = 1
+        width = height = 0
+        exif = None
+        dpi = (0, 0)
+        bit_depth = "Unknown"
+    if image_path.lower().endswith(RAW_EXTENSIONS):
+        # The first IFD of a RAW file is usually a thumbnail, not the sensor image
+        width, height = read_header(image_path, report=report) or (width, height)
+    camera_maker = geo_location = "Unknown"
+
+    if exif:
+        for tag, value in exif.items():
+            decoded = ExifTags.TAGS.get(tag, tag)
+            if decoded == "Make":
+                camera_maker = value
+            if decoded == "GPSInfo":
+                geo_location = str(value)
+
+    return {
+        "path": image_path,
+        "filename": os.path.basename(image_path),
+        "modification_time": datetime.fromtimestamp(file_stats.st_mtime),
+        "mtime": file_stats.st_mtime,
+        "size": file_stats.st_size,
+        "file_size": file_stats.st_size / (1024 * 1024),  # MB
+        "width": width,
+        "height": height,
+        "resolution": width * height,  # Total pixel count for comparison
+        "dpi": dpi,
+        "bit_depth": bit_depth,
+        "n_frames": n_frames,
+        "camera_maker": camera_maker,
+        "geo_location": geo_location,
+    }
+
+
+def policy_record(image_path, report=None, file_io=None):
+    """Keep-policy fields (policy.build_table) of one file, or None if missing or unreadable."""
+    file_stats = _stat(image_path, file_io)
+    if file_stats is None or (report is not None and image_path in report):
+        return None
+    img_size = read_header(image_path, report=report)
+    if img_size is None:
+        return None
+    try:
+        with open_image(image_path) as img:
+            dpi = float(img.info.get('dpi', (0, 0))[0])
+    except DECODE_ERRORS:
+        dpi = 0
+    return {"path": image_path, "size": file_stats.st_size, "mtime": file_stats.st_mtime,
+            "resolution": img_size[0] * img_size[1], "dpi": dpi, **storage_fields(image_path, file_stats)}
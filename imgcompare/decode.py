@@ -0,0 +1,287 @@
+import csv
+import os
+import threading
+import warnings
+from datetime import datetime
+from PIL import Image, ImageFile
+from imgcompare import rawpreview
+
+# Default limits for a single full decode
+MAX_PIXELS = 50_000_000
+MAX_DECODE_BYTES = 256 * 1024 * 1024
+
+# Images bigger than this are refused even for header reads (decompression bombs)
+HARD_PIXEL_LIMIT = 1_000_000_000
+
+# Rows decoded at once when a raw strip is split into bands
+BAND_ROWS = 256
+
+# Packed size of the raw modes that can be split into row bands
+RAW_BYTES_PER_PIXEL = {"L": 1, "P": 1, "LA": 2, "I;16": 2, "I;16B": 2, "RGB": 3, "BGR": 3,
+                       "RGBA": 4, "RGBX": 4, "BGRA": 4, "BGRX": 4, "CMYK": 4}
+
+# EXIF Orientation tag and the transpose that turns each value upright
+ORIENTATION_TAG = 0x0112
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+# Pillow's own bomb check fires far below what we can handle with reduced or
+# tiled decoding, so raise it to the hard limit and let DecodeBudget decide.
+if Image.MAX_IMAGE_PIXELS is not None and Image.MAX_IMAGE_PIXELS < HARD_PIXEL_LIMIT // 2:
+    Image.MAX_IMAGE_PIXELS = HARD_PIXEL_LIMIT // 2
+
+# Errors Pillow raises for truncated, corrupt or hostile files
+DECODE_ERRORS = (OSError, SyntaxError, ValueError, EOFError, MemoryError,
+                 IndexError, TypeError, Image.DecompressionBombError)
+
+
+class ImageRejected(Exception):
+    """Raised when an image cannot be decoded within the budget."""
+
+
+class DecodeBudget:
+    """Pixel and memory limits for decoding one image."""
+
+    def __init__(self, max_pixels=MAX_PIXELS, max_bytes=MAX_DECODE_BYTES, hard_pixels=HARD_PIXEL_LIMIT):
+        self.max_pixels = max_pixels
+        self.max_bytes = max_bytes
+        self.hard_pixels = hard_pixels
+
+    def decoded_bytes(self, size, mode):
+        """Estimate the memory needed to hold a decoded image."""
+        width, height = size
+        return width * height * bytes_per_pixel(mode)
+
+    def fits(self, size, mode):
+        """Return True if the image can be fully decoded within the budget."""
+        return (size[0] * size[1] <= self.max_pixels
+                and self.decoded_bytes(size, mode) <= self.max_bytes)
+
+
+DEFAULT_BUDGET = DecodeBudget()
+
+
+class QuarantineReport:
+    """Collect unreadable or over-budget files instead of crashing on them.
+
+    Entries are appended to the CSV file as they arrive, so the report
+    survives even if the session is killed halfway through.
+    """
+
+    def __init__(self, report_path=None):
+        self.report_path = report_path
+        self.entries = []
+        self.paths = set()  # For constant-time "path in report" checks
+        self.lock = threading.Lock()  # Files may be read from several threads
+
+    def add(self, filepath, reason):
+        entry = (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), filepath, reason)
+        with self.lock:
+            self.entries.append(entry)
+            self.paths.add(filepath)
+            if self.report_path:
+                new_file = not os.path.exists(self.report_path)
+                with open(self.report_path, 'a', newline='', encoding='utf-8') as f:
+                    writer = csv.writer(f)
+                    if new_file:
+                        writer.writerow(["time", "path", "reason"])
+                    writer.writerow(entry)
+
+    def __contains__(self, filepath):
+        return filepath in self.paths
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def bytes_per_pixel(mode):
+    """Return the memory Pillow uses for one decoded pixel of the given mode."""
+    if mode in ("1", "L", "P"):
+        return 1
+    if mode.startswith("I;16"):
+        return 2
+    # Everything else is stored in 32 bits per pixel
+    return 4
+
+
+def raw_stride(rawmode, width):
+    """Return the byte length of one row for a raw decoder mode, or None if unknown."""
+    if rawmode == "1":
+        return (width + 7) // 8
+    if rawmode in RAW_BYTES_PER_PIXEL:
+        return width * RAW_BYTES_PER_PIXEL[rawmode]
+    return None
+
+
+def exif_orientation(img):
+    """EXIF Orientation of an opened image (1 = upright, 2..8 = flipped and/or rotated)."""
+    try:
+        orientation = img.getexif().get(ORIENTATION_TAG, 1)
+    except DECODE_ERRORS:
+        return 1
+    return orientation if orientation in ORIENTATION_TRANSPOSE else 1
+
+
+def oriented_size(size, orientation):
+    """Size of an image as displayed, after applying its EXIF orientation."""
+    return (size[1], size[0]) if orientation in (5, 6, 7, 8) else size
+
+
+def apply_orientation(img, orientation):
+    """Return img turned upright according to an EXIF orientation."""
+    method = ORIENTATION_TRANSPOSE.get(orientation)
+    return img.transpose(method) if method is not None else img
+
+
+def open_image(filepath, budget=DEFAULT_BUDGET):
+    """Open an image and read its header only, refusing decompression bombs."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+        img = Image.open(filepath)
+    # Multi-page files are always judged on their first frame
+    if getattr(img, "n_frames", 1) > 1:
+        img.seek(0)
+    width, height = img.size
+    if width * height > budget.hard_pixels:
+        img.close()
+        raise ImageRejected(f"{width}x{height} exceeds the hard pixel limit")
+    return img
+
+
+def read_header(filepath, budget=DEFAULT_BUDGET, report=None):
+    """Return the image size without decoding, or None if the file is unreadable."""
+    try:
+        if filepath.lower().endswith(rawpreview.RAW_EXTENSIONS):
+            size = rawpreview.raw_dimensions(filepath)
+            if size == (0, 0):
+                raise ImageRejected("not a TIFF-based RAW file")
+            return size
+        with open_image(filepath, budget) as img:
+            return oriented_size(img.size, exif_orientation(img))
+    except ImageRejected as e:
+        reason = str(e)
+    except DECODE_ERRORS as e:
+        reason = f"{type(e).__name__}: {e}"
+    if report is not None:
+        report.add(filepath, reason)
+    return None
+
+
+def load_preview(filepath, size, budget=DEFAULT_BUDGET, report=None):
+    """Decode a downscaled copy of the image that fits inside size.
+
+    RAW and TIFF files use their embedded preview when one is big enough,
+    JPEGs are decoded at a reduced DCT scale, oversized uncompressed images
+    are decoded tile by tile, and anything that still does not fit the
+    budget is quarantined. The preview is turned upright according to its
+    EXIF orientation. Returns None for quarantined files.
+    """
+    try:
+        img = open_embedded_preview(filepath, size) or open_image(filepath, budget)
+        with img:
+            orientation = exif_orientation(img)
+            return apply_orientation(_decode_reduced(img, oriented_size(size, orientation), budget), orientation)
+    except ImageRejected as e:
+        reason = str(e)
+    except DECODE_ERRORS as e:
+        reason = f"{type(e).__name__}: {e}"
+    if report is not None:
+        report.add(filepath, reason)
+    return None
+
+
+def open_embedded_preview(filepath, size):
+    """Open the embedded preview of a RAW or TIFF file if it covers size, else None.
+
+    RAW files without any usable preview are rejected, since their sensor
+    data is never demosaiced here.
+    """
+    if not rawpreview.is_tiff_container(filepath):
+        return None
+    is_raw = filepath.lower().endswith(rawpreview.RAW_EXTENSIONS)
+    previews = rawpreview.find_previews(filepath)
+    preview = rawpreview.choose_preview(previews, size)
+    if preview is None or (not is_raw and preview.width < size[0] and preview.height < size[1]):
+        if is_raw:
+            raise ImageRejected("RAW file has no embedded preview")
+        return None
+    return rawpreview.open_preview(filepath, preview=preview)
+
+
+def _decode_reduced(img, size, budget):
+    """Decode img into a thumbnail no larger than size, within budget."""
+    if img.format == "JPEG":
+        # Let libjpeg scale by 1/2, 1/4 or 1/8 while decoding
+        img.draft("RGB", size)
+
+    if budget.fits(img.size, img.mode):
+        img.load()
+        preview = img.copy()
+        preview.thumbnail(size)
+        return preview
+
+    tiles = _split_tiles(img)
+    if tiles is None:
+        raise ImageRejected(f"{img.size[0]}x{img.size[1]} {img.mode} exceeds the decode budget "
+                            "and cannot be decoded in tiles")
+    return _decode_tiles(img, tiles, size, budget)
+
+
+def _split_tiles(img):
+    """Return decoder tiles small enough to decode one at a time, or None."""
+    if len(img.tile) > 1:
+        # Tiled or stripped files: each tile can be decoded on its own
+        return [_band_tile(tile) for tile in img.tile]
+    tile = img.tile[0] if img.tile else None
+    if tile is None or tile.codec_name != "raw":
+        # A single compressed stream cannot be entered at an arbitrary row
+        return None
+    return [_band_tile(tile)]
+
+
+def _band_tile(tile):
+    """Split an uncompressed tile into bands of BAND_ROWS rows."""
+    codec, (x0, y0, x1, y1), offset, args = tile
+    if codec != "raw":
+        return [tile]
+    rawmode, stride, ystep = (args, 0, 1) if isinstance(args, str) else (tuple(args) + (0, 1))[:3]
+    stride = stride or raw_stride(rawmode, x1 - x0)
+    if not stride or ystep not in (1, -1):
+        return [tile]
+    bands = []
+    for top in range(y0, y1, BAND_ROWS):
+        bottom = min(top + BAND_ROWS, y1)
+        # Bottom-up files (BMP) store the last row first
+        first_row = top - y0 if ystep == 1 else y1 - bottom
+        bands.append(ImageFile._Tile(codec, (x0, top, x1, bottom), offset + first_row * stride,
+                                     (rawmode, stride, ystep)))
+    return bands
+
+
+def _decode_tiles(img, tiles, size, budget):
+    """Decode tiles one by one and paste their downscaled copies into a preview."""
+    scale = min(size[0] / img.size[0], size[1] / img.size[1], 1.0)
+    preview_size = (max(1, round(img.size[0] * scale)), max(1, round(img.size[1] * scale)))
+    preview = Image.new(img.mode, preview_size)
+
+    for codec, (x0, y0, x1, y1), offset, args in [band for bands in tiles for band in bands]:
+        tile_size = (x1 - x0, y1 - y0)
+        if not budget.fits(tile_size, img.mode):
+            raise ImageRejected(f"tile {tile_size[0]}x{tile_size[1]} exceeds the decode budget")
+        with Image.open(img.filename) as part:
+            if img.tell():
+                part.seek(img.tell())
+            part._size = tile_size
+            part.tile = [ImageFile._Tile(codec, (0, 0) + tile_size, offset, args)]
+            part.load()
+            left, top = int(x0 * scale), int(y0 * scale)
+            right, bottom = max(left + 1, int(x1 * scale)), max(top + 1, int(y1 * scale))
+            preview.paste(part.resize((right - left, bottom - top), Image.Resampling.BOX), (left, top))
+    return preview
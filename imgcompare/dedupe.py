@@ -0,0 +1,188 @@
+import errno
+import filecmp
+import json
+import os
+import shutil
+import threading
+from datetime import datetime
+try:
+    import fcntl
+except ImportError:  # Windows: no FICLONE, "auto" falls back to hardlinks
+    fcntl = None
+
+# ioctl number of FICLONE (_IOW(0x94, 9, int)) from <linux/fs.h>
+FICLONE = 0x40049409
+
+# Dedupe modes: "hardlink", "reflink", or "auto" (reflink when supported, else hardlink)
+DEDUPE_MODES = ("hardlink", "reflink", "auto")
+
+TEMP_SUFFIX = ".dedupe-tmp"
+
+
+class DedupeError(Exception):
+    """Raised when a file cannot be replaced by a link to its duplicate."""
+
+
+class Journal:
+    """Append-only JSONL log of dedupe operations.
+
+    Each replacement writes a "start" entry before touching the file and a
+    "done" or "failed" entry afterwards, so an interrupted run can be
+    cleaned up with recover().
+    """
+
+    def __init__(self, journal_path):
+        self.journal_path = journal_path
+        self.lock = threading.Lock()  # Merges write from several threads
+
+    def write(self, **entry):
+        entry = {"time": datetime.now().strftime('%Y-%m-%d %H:%M:%S'), **entry}
+        with self.lock, open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def entries(self):
+        if not os.path.exists(self.journal_path):
+            return []
+        with open(self.journal_path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+
+def temp_path(path):
+    """Hidden sibling used to build the link before it replaces path."""
+    folder, name = os.path.split(path)
+    return os.path.join(folder, f".{name}{TEMP_SUFFIX}")
+
+
+def verify_identical(path1, path2):
+    """Return True if both files have exactly the same bytes."""
+    st1, st2 = os.stat(path1), os.stat(path2)
+    if st1.st_size != st2.st_size:
+        return False
+    if (st1.st_dev, st1.st_ino) == (st2.st_dev, st2.st_ino):
+        return True
+    return filecmp.cmp(path1, path2, shallow=False)
+
+
+def reflink(src, dst):
+    """Create dst as a copy-on-write clone of src (Btrfs, XFS, bcachefs...)."""
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "reflinks are not supported on this platform")
+    with open(src, 'rb') as fsrc:
+        fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            fcntl.ioctl(fd, FICLONE, fsrc.fileno())
+        except OSError:
+            os.close(fd)
+            os.remove(dst)
+            raise
+        os.close(fd)
+
+
+def link_duplicate(keep_path, dup_path, mode="auto", journal=None):
+    """Replace dup_path with a hardlink or reflink of keep_path.
+
+    The link is created next to dup_path and then renamed over it, so
+    dup_path always exists and is never half written. Returns the mode
+    used and the bytes reclaimed.
+    """
+    if mode not in DEDUPE_MODES:
+        raise ValueError(f"mode must be one of {DEDUPE_MODES}, not {mode!r}")
+    keep_stat, dup_stat = os.stat(keep_path), os.stat(dup_path)
+    if (keep_stat.st_dev, keep_stat.st_ino) == (dup_stat.st_dev, dup_stat.st_ino):
+        return None, 0  # Already the same file
+    if not verify_identical(keep_path, dup_path):
+        raise DedupeError(f"{dup_path} differs from {keep_path}")
+
+    tmp = temp_path(dup_path)
+    if journal is not None:
+        journal.write(action="start", mode=mode, keep=keep_path, replace=dup_path, temp=tmp)
+    try:
+        used = _make_link(keep_path, tmp, mode, keep_stat, dup_stat)
+        if used == "reflink":
+            # A clone is a new inode, so carry over the duplicate's own metadata
+            shutil.copystat(dup_path, tmp)
+        os.replace(tmp, dup_path)
+    except OSError as e:
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        if journal is not None:
+            journal.write(action="failed", replace=dup_path, error=str(e))
+        raise DedupeError(f"Cannot link {dup_path}: {e}") from e
+
+    # Hardlinks free the whole file; reflinks free its data blocks
+    reclaimed = dup_stat.st_size if dup_stat.st_nlink == 1 else 0
+    if journal is not None:
+        journal.write(action="done", mode=used, keep=keep_path, replace=dup_path, reclaimed=reclaimed)
+    return used, reclaimed
+
+
+def _make_link(keep_path, tmp, mode, keep_stat, dup_stat):
+    """Create tmp as a link to keep_path, returning the mode actually used."""
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+    if mode in ("reflink", "auto"):
+        try:
+            reflink(keep_path, tmp)
+            return "reflink"
+        except OSError:
+            if mode == "reflink":
+                raise
+    if keep_stat.st_dev != dup_stat.st_dev:
+        raise OSError(f"{keep_path} and the duplicate are on different filesystems")
+    os.link(keep_path, tmp)
+    return "hardlink"
+
+
+def dedupe_groups(groups, mode="auto", journal=None):
+    """Link every file of each group to the group's first file.
+
+    Files that are not byte-identical to the kept file, or cannot be
+    linked, are skipped and returned. Returns (linked, reclaimed_bytes, skipped).
+    """
+    linked, reclaimed, skipped = 0, 0, []
+    for group in groups:
+        keep_path = group[0]
+        for dup_path in group[1:]:
+            try:
+                used, freed = link_duplicate(keep_path, dup_path, mode, journal)
+            except (DedupeError, OSError) as e:
+                skipped.append((dup_path, str(e)))
+                continue
+            if used:
+                linked += 1
+                reclaimed += freed
+    return linked, reclaimed, skipped
+
+
+def dedupe_folders(folder1, folder2, mode="auto", journal=None):
+    """Link same-name, byte-identical files of folder2 to their copies in folder1."""
+    names2 = set(os.listdir(folder2))
+    groups = []
+    for name in sorted(os.listdir(folder1)):
+        path1, path2 = os.path.join(folder1, name), os.path.join(folder2, name)
+        if name in names2 and os.path.isfile(path1) and os.path.isfile(path2):
+            groups.append([path1, path2])
+    return dedupe_groups(groups, mode, journal)
+
+
+def recover(journal):
+    """Remove temporary links left behind by an interrupted run.
+
+    The duplicate itself is always intact: it is only ever replaced by an
+    atomic rename. Returns the temporary paths removed.
+    """
+    open_entries = {}
+    for entry in journal.entries():
+        if entry["action"] == "start":
+            open_entries[entry["replace"]] = entry["temp"]
+        else:
+            open_entries.pop(entry["replace"], None)
+    removed = []
+    for dup_path, tmp in open_entries.items():
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+            removed.append(tmp)
+        journal.write(action="recovered", replace=dup_path)
+    return removed
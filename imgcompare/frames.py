@@ -0,0 +1,120 @@
+import os
+from PIL import Image
+from imgcompare.decode import DECODE_ERRORS, DEFAULT_BUDGET, ImageRejected, open_image
+from imgcompare.phash import NEAR_DISTANCE, hashes_of
+
+# Frames hashed per file; long animations are sampled evenly, always including first and last
+MAX_SAMPLED_FRAMES = 8
+
+# Frames are reduced to this size before hashing
+FRAME_HASH_SIZE = (64, 64)
+
+CACHE_FIELD = "frames"
+
+
+class FrameFingerprint:
+    """Frame count, sampled frame durations and dHashes of a multi-frame image (GIF, APNG, TIFF)."""
+
+    __slots__ = ("n_frames", "frames", "durations", "hashes")
+
+    def __init__(self, n_frames, frames, durations, hashes):
+        self.n_frames = n_frames
+        self.frames = frames  # Indices of the sampled frames
+        self.durations = durations  # Display time in ms of each sampled frame (0 for pages)
+        self.hashes = hashes  # dHash of each sampled frame, None where it could not be decoded
+
+    @property
+    def is_animated(self):
+        return self.n_frames > 1
+
+    def to_dict(self):
+        return {"n_frames": self.n_frames, "frames": self.frames, "durations": self.durations,
+                "hashes": [None if value is None else f"{value:016x}" for value in self.hashes]}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["n_frames"], data["frames"], data["durations"],
+                   [None if value is None else int(value, 16) for value in data["hashes"]])
+
+    def __repr__(self):
+        return f"FrameFingerprint({self.n_frames} frames, sampled {self.frames})"
+
+
+def sample_frames(n_frames, count=MAX_SAMPLED_FRAMES):
+    """Evenly spaced frame indices, first and last included."""
+    if n_frames <= count:
+        return list(range(n_frames))
+    return sorted({round(i * (n_frames - 1) / (count - 1)) for i in range(count)})
+
+
+def frame_fingerprint(filepath, budget=DEFAULT_BUDGET, report=None):
+    """Fingerprint the frames of filepath, seeking only to the sampled ones; None if unreadable.
+
+    Single-frame images get a fingerprint with n_frames 1 and no hashes,
+    since their content is covered by the regular hashes.
+    """
+    try:
+        with open_image(filepath, budget) as img:
+            n_frames = getattr(img, "n_frames", 1)
+            if n_frames <= 1:
+                return FrameFingerprint(1, [], [], [])
+            frames = sample_frames(n_frames)
+            durations, hashes = [], []
+            for index in frames:
+                img.seek(index)
+                durations.append(int(img.info.get("duration", 0) or 0))
+                if not budget.fits(img.size, img.mode):
+                    hashes.append(None)
+                    continue
+                frame = img.convert("RGB")
+                frame.thumbnail(FRAME_HASH_SIZE, Image.Resampling.BOX)
+                hashes.append(hashes_of(frame)[0])
+            return FrameFingerprint(n_frames, frames, durations, hashes)
+    except ImageRejected as e:
+        reason = str(e)
+    except DECODE_ERRORS as e:
+        reason = f"{type(e).__name__}: {e}"
+    if report is not None:
+        report.add(filepath, reason)
+    return None
+
+
+def cached_fingerprint(filepath, cache=None, report=None):
+    """Frame fingerprint of filepath from the metadata cache, computing and storing it when stale."""
+    try:
+        st = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    if cache is not None:
+        data = cache.get(filepath, st.st_size, st.st_mtime_ns)
+        if data and data.get(CACHE_FIELD):
+            return FrameFingerprint.from_dict(data[CACHE_FIELD])
+    fingerprint = frame_fingerprint(filepath, report=report)
+    if fingerprint is not None and cache is not None:
+        cache.update(filepath, st.st_size, st.st_mtime_ns, **{CACHE_FIELD: fingerprint.to_dict()})
+    return fingerprint
+
+
+def frame_differences(fp1, fp2, max_distance=NEAR_DISTANCE):
+    """List how two fingerprints differ; an empty list means the frames match."""
+    if fp1.n_frames != fp2.n_frames:
+        return [f"{fp1.n_frames} vs {fp2.n_frames} frames"]
+    differences = []
+    if fp1.durations != fp2.durations:
+        differences.append("frame timing differs")
+    for index, hash1, hash2 in zip(fp1.frames, fp1.hashes, fp2.hashes):
+        if hash1 is None or hash2 is None:
+            continue
+        if bin(hash1 ^ hash2).count("1") > max_distance:
+            differences.append(f"frame {index + 1} differs")
+    return differences
+
+
+def describe(fingerprint):
+    """One-line summary for info panels, or an empty string for still images."""
+    if fingerprint is None or not fingerprint.is_animated:
+        return ""
+    total = sum(fingerprint.durations)
+    if total and len(fingerprint.frames) == fingerprint.n_frames:
+        return f"Frames: {fingerprint.n_frames} ({total / 1000:.1f} s)"
+    return f"Frames: {fingerprint.n_frames}"
@@ -0,0 +1,109 @@
+import os
+import struct
+try:
+    import fcntl
+except ImportError:  # Windows: no FIEMAP, inode identity only
+    fcntl = None
+
+# FS_IOC_FIEMAP (_IOWR('f', 11, struct fiemap)) and flags from <linux/fiemap.h>
+FS_IOC_FIEMAP = 0xC020660B
+FIEMAP_FLAG_SYNC = 0x1
+FIEMAP_EXTENT_LAST = 0x1
+FIEMAP_EXTENT_UNKNOWN = 0x2
+FIEMAP_EXTENT_DELALLOC = 0x4
+FIEMAP_EXTENT_DATA_INLINE = 0x200
+FIEMAP_EXTENT_SHARED = 0x2000
+
+# Extents whose physical location is not a stable identity
+UNPLACED_EXTENT = FIEMAP_EXTENT_UNKNOWN | FIEMAP_EXTENT_DELALLOC | FIEMAP_EXTENT_DATA_INLINE
+
+# struct fiemap header and struct fiemap_extent
+FIEMAP_HEADER = struct.Struct("=QQLLLL")
+FIEMAP_EXTENT = struct.Struct("=QQQ2QL3L")
+
+# Extents fetched per ioctl call
+EXTENTS_PER_CALL = 256
+
+
+def storage_id(st):
+    """(st_dev, st_ino): equal for two paths that are hardlinks of one file."""
+    return st.st_dev, st.st_ino
+
+
+def extents(path):
+    """List of (logical, physical, length, flags) extents of a file, or None if FIEMAP is unavailable.
+
+    Only the block map is read, never the data.
+    """
+    if fcntl is None:
+        return None
+    result = []
+    start = 0
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                request = bytearray(FIEMAP_HEADER.size + EXTENTS_PER_CALL * FIEMAP_EXTENT.size)
+                FIEMAP_HEADER.pack_into(request, 0, start, 0xFFFFFFFFFFFFFFFF - start, FIEMAP_FLAG_SYNC,
+                                        0, EXTENTS_PER_CALL, 0)
+                fcntl.ioctl(f.fileno(), FS_IOC_FIEMAP, request)
+                mapped = FIEMAP_HEADER.unpack_from(request, 0)[3]
+                if not mapped:
+                    break
+                for n in range(mapped):
+                    fields = FIEMAP_EXTENT.unpack_from(request, FIEMAP_HEADER.size + n * FIEMAP_EXTENT.size)
+                    logical, physical, length, flags = fields[0], fields[1], fields[2], fields[5]
+                    result.append((logical, physical, length, flags))
+                if result[-1][3] & FIEMAP_EXTENT_LAST:
+                    break
+                start = result[-1][0] + result[-1][2]
+    except OSError:
+        return None
+    return result
+
+
+def shared_bytes(path):
+    """Bytes of path stored in extents shared with other files (reflinks, snapshots); 0 if unknown."""
+    mapped = extents(path)
+    if not mapped:
+        return 0
+    return sum(length for _, _, length, flags in mapped if flags & FIEMAP_EXTENT_SHARED)
+
+
+def extent_key(path):
+    """Physical layout of path as a hashable key, or None when it cannot identify the data.
+
+    Two files with the same key are reflink clones sharing every block.
+    """
+    mapped = extents(path)
+    if not mapped or any(flags & UNPLACED_EXTENT or not flags & FIEMAP_EXTENT_SHARED
+                         for _, _, _, flags in mapped):
+        return None
+    return tuple((logical, physical, length) for logical, physical, length, _ in mapped)
+
+
+def same_storage(path1, path2, stats=None):
+    """Return "hardlink" or "reflink" if the two paths share all their data on disk, else None.
+
+    Decided from stat and the block maps alone, without reading the files.
+    Pass stats as (stat1, stat2) when they are already known; a None stat
+    (a missing file) gives None.
+    """
+    try:
+        st1, st2 = stats or (os.stat(path1), os.stat(path2))
+    except FileNotFoundError:
+        return None
+    if st1 is None or st2 is None:
+        return None
+    if storage_id(st1) == storage_id(st2):
+        return "hardlink"
+    if st1.st_dev != st2.st_dev or st1.st_size != st2.st_size or not st1.st_size:
+        return None
+    key = extent_key(path1)
+    if key is not None and key == extent_key(path2):
+        return "reflink"
+    return None
+
+
+def storage_fields(path, st):
+    """Fields for the keep policy: device, inode, link count and shared bytes of a file."""
+    return {"dev": st.st_dev, "ino": st.st_ino, "nlink": st.st_nlink, "shared": shared_bytes(path)}
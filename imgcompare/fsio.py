@@ -0,0 +1,163 @@
+import builtins
+import functools
+import io
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# Requests kept in flight at once; network filesystems serve many in parallel
+DEFAULT_WORKERS = 32
+
+# Stats remembered at most, and for how long, before they are issued again
+MAX_CACHED_STATS = 65536
+STAT_TTL = 60.0
+
+# Set on the threads of a map() call, so nested calls run inline instead of
+# waiting on a pool their own task occupies
+_in_map = threading.local()
+
+
+class ConcurrentIO:
+    """Run metadata and header reads concurrently, and stat each path only once.
+
+    On SMB/NFS every stat or open is a network round trip, so issuing them
+    one after another leaves the link idle. Calls are spread over a thread
+    pool instead (the GIL is released while waiting on the filesystem).
+    Stats are coalesced: concurrent and repeated requests for the same path
+    share a single os.stat until forget() is called for it or STAT_TTL
+    passes, and at most MAX_CACHED_STATS are kept. An optional
+    throttle.Throttle paces the stats and mapped calls on shared storage.
+
+    Stats run on their own pool, so a mapped function can call stat()
+    without waiting on a pool its own task is holding.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, throttle=None):
+        self.workers = workers
+        self.throttle = throttle
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fsio")
+        self.stat_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fsio-stat")
+        self.stats = OrderedDict()  # path -> (time requested, Future of os.stat_result or None)
+        self.lock = threading.Lock()
+
+    def submit_stat(self, path):
+        """Return a future of the stat of path (None if it does not exist), sharing any recent request."""
+        now = time.monotonic()
+        with self.lock:
+            requested, future = self.stats.get(path, (0.0, None))
+            if future is None or now - requested > STAT_TTL:
+                future = self.stat_executor.submit(self._paced, _stat_or_none, path)
+                self.stats[path] = (now, future)
+                if len(self.stats) > MAX_CACHED_STATS:
+                    self.stats.popitem(last=False)
+            self.stats.move_to_end(path)
+            return future
+
+    def stat(self, path):
+        return self.submit_stat(path).result()
+
+    def exists(self, path):
+        return self.stat(path) is not None
+
+    def stat_many(self, paths):
+        """Return {path: stat or None} for all paths, issued concurrently."""
+        futures = {path: self.submit_stat(path) for path in paths}
+        return {path: future.result() for path, future in futures.items()}
+
+    def map(self, fn, items):
+        """Return [fn(item) for item in items], evaluated concurrently, in order.
+
+        Exceptions raised by fn are re-raised here, as with a plain loop.
+        Called from inside a mapped function, it runs serially on that thread.
+        """
+        items = list(items)
+        if self.throttle is not None:
+            fn = functools.partial(self._paced, fn)
+        if len(items) <= 1 or getattr(_in_map, "active", False):
+            return [fn(item) for item in items]
+        return list(self.executor.map(functools.partial(_mapped, fn), items))
+
+    def _paced(self, fn, item):
+        if self.throttle is None:
+            return fn(item)
+        with self.throttle.operation():
+            return fn(item)
+
+    def forget(self, path=None):
+        """Drop the remembered stat of path (or of every path) after it may have changed."""
+        with self.lock:
+            if path is None:
+                self.stats.clear()
+            else:
+                self.stats.pop(path, None)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.stat_executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _mapped(fn, item):
+    _in_map.active = True
+    try:
+        return fn(item)
+    finally:
+        _in_map.active = False
+
+
+def _stat_or_none(path):
+    try:
+        return os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+@contextmanager
+def inject_latency(latency=0.02, jitter=0.0):
+    """Make local file access behave like a high-latency network filesystem.
+
+    Every os.stat, os.lstat, os.listdir, os.scandir and open in the process
+    sleeps for latency (+ up to jitter) seconds first, like a round trip
+    to a NAS. Use it to measure and regression-test concurrency gains
+    without real network storage.
+    """
+    targets = [(os, "stat"), (os, "lstat"), (os, "listdir"), (os, "scandir"), (builtins, "open"), (io, "open")]
+    originals = [(module, name, getattr(module, name)) for module, name in targets]
+
+    def delayed(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            time.sleep(latency + random.uniform(0, jitter))
+            return fn(*args, **kwargs)
+        return wrapper
+
+    for module, name, fn in originals:
+        setattr(module, name, delayed(fn))
+    try:
+        yield
+    finally:
+        for module, name, fn in originals:
+            setattr(module, name, fn)
+
+
+def benchmark(fn, items, latency=0.02, workers=DEFAULT_WORKERS):
+    """Time fn over items serially and through ConcurrentIO under injected latency.
+
+    Returns (serial_seconds, concurrent_seconds).
+    """
+    items = list(items)
+    with inject_latency(latency):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        serial = time.perf_counter() - start
+
+        file_io = ConcurrentIO(workers)
+        start = time.perf_counter()
+        file_io.map(fn, items)
+        concurrent = time.perf_counter() - start
+        file_io.shutdown()
+    return serial, concurrent
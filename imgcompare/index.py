@@ -0,0 +1,162 @@
+import os
+import threading
+from collections import deque
+from imgcompare.decode import read_header
+
+
+class FileRecord:
+    """Stat and header information of one image in a compared folder."""
+
+    __slots__ = ("path", "folder", "name", "size", "mtime_ns", "width", "height")
+
+    def __init__(self, path, size, mtime_ns, width=0, height=0):
+        self.path = path
+        self.folder, self.name = os.path.split(path)
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.width = width
+        self.height = height
+
+    @property
+    def mtime(self):
+        return self.mtime_ns / 1e9
+
+    @property
+    def img_size(self):
+        return (self.width, self.height)
+
+    def __repr__(self):
+        return f"FileRecord({self.path!r}, {self.size} bytes, {self.width}x{self.height})"
+
+
+class FolderIndex:
+    """Filename index of the compared folders that can be updated incrementally.
+
+    Files with the same name in two or more folders are duplicate candidates,
+    the same rule start_comparing uses. Every pair that becomes a candidate
+    is appended to review_queue as (path1, path2).
+    """
+
+    def __init__(self, folders, cache=None, extensions=None, report=None):
+        self.folders = [os.path.normpath(folder) for folder in folders]
+        self.files = {folder: {} for folder in self.folders}  # folder -> {name: FileRecord}
+        self.cache = cache
+        self.extensions = tuple(ext.lower() for ext in extensions) if extensions else None
+        self.report = report
+        self.review_queue = deque()
+        self.lock = threading.RLock()
+
+    def wants(self, path):
+        """Return True if path is a file inside one of the indexed folders."""
+        folder, name = os.path.split(os.path.normpath(path))
+        if folder not in self.files or name.startswith('.'):
+            return False
+        return self.extensions is None or name.lower().endswith(self.extensions)
+
+    def scan(self):
+        """Index every folder, or bring the index back in sync after lost events.
+
+        Files already known keep their place, so no pair is queued twice.
+        """
+        for folder in self.folders:
+            try:
+                with os.scandir(folder) as entries:
+                    current = {os.path.normpath(entry.path): entry.stat() for entry in entries
+                               if entry.is_file() and self.wants(entry.path)}
+            except FileNotFoundError:
+                current = {}
+            for name in list(self.files[folder]):
+                if os.path.join(folder, name) not in current:
+                    self.remove(os.path.join(folder, name))
+            for path, st in current.items():
+                self.add(path, st)
+        if self.cache is not None:
+            self.cache.commit()
+
+    def load_record(self, path, st=None):
+        """Build a FileRecord, reading the image header only if the cache is stale."""
+        st = st or os.stat(path)
+        data = self.cache.get(path, st.st_size, st.st_mtime_ns) if self.cache is not None else None
+        if data is None:
+            width, height = read_header(path, report=self.report) or (0, 0)
+            data = {"width": width, "height": height}
+            if self.cache is not None:
+                self.cache.put(path, st.st_size, st.st_mtime_ns, data)
+        return FileRecord(path, st.st_size, st.st_mtime_ns, data.get("width", 0), data.get("height", 0))
+
+    def add(self, path, st=None):
+        """Add or refresh a file and queue any new duplicate pairs it forms."""
+        path = os.path.normpath(path)
+        try:
+            record = self.load_record(path, st)
+        except FileNotFoundError:
+            return None  # Already gone again
+        with self.lock:
+            known = record.name in self.files[record.folder]
+            self.files[record.folder][record.name] = record
+            if not known:
+                for other in self.matches(record.name):
+                    if other.path != path:
+                        self.review_queue.append(self._pair(other.path, path))
+        return record
+
+    def remove(self, path):
+        """Drop a file that was deleted or moved out of the folders."""
+        path = os.path.normpath(path)
+        folder, name = os.path.split(path)
+        with self.lock:
+            record = self.files.get(folder, {}).pop(name, None)
+            if record is not None:
+                self._forget(path)
+        if self.cache is not None:
+            self.cache.remove(path)
+        return record
+
+    def rename(self, old_path, new_path):
+        """Apply a rename without re-reading the file."""
+        old_path, new_path = os.path.normpath(old_path), os.path.normpath(new_path)
+        if self.cache is not None:
+            self.cache.rename(old_path, new_path)
+        if not self.wants(new_path):
+            return self.remove(old_path)
+        if not self.wants(old_path):
+            return self.add(new_path)
+        self.remove(old_path)
+        return self.add(new_path)
+
+    def matches(self, name):
+        """Return the records named name across all folders, in folder order."""
+        with self.lock:
+            return [self.files[folder][name] for folder in self.folders if name in self.files[folder]]
+
+    def pairs(self):
+        """Return every current duplicate candidate pair."""
+        with self.lock:
+            names = set()
+            for folder in self.folders:
+                names.update(self.files[folder])
+            result = []
+            for name in sorted(names):
+                records = self.matches(name)
+                for i in range(len(records)):
+                    for j in range(i + 1, len(records)):
+                        result.append((records[i].path, records[j].path))
+            return result
+
+    def record(self, path):
+        folder, name = os.path.split(os.path.normpath(path))
+        return self.files.get(folder, {}).get(name)
+
+    def __len__(self):
+        return sum(len(names) for names in self.files.values())
+
+    def _pair(self, path1, path2):
+        """Order a pair by folder position, so the left path is always the earlier folder."""
+        if self.folders.index(os.path.dirname(path1)) > self.folders.index(os.path.dirname(path2)):
+            return path2, path1
+        return path1, path2
+
+    def _forget(self, path):
+        """Drop queued pairs that reference a removed file."""
+        if any(path in pair for pair in self.review_queue):
+            self.review_queue = deque(pair for pair in self.review_queue if path not in pair)
@@ -0,0 +1,104 @@
+import hashlib
+import os
+import re
+
+# Segments that only carry metadata: APP0-APP15 (JFIF, EXIF, XMP, ICC, Photoshop...) and COM
+METADATA_MARKERS = frozenset(range(0xE0, 0xF0)) | {0xFE}
+
+SOI, EOI, SOS = 0xD8, 0xD9, 0xDA
+
+# Markers without a length field: TEM and RST0-RST7 (SOI and EOI are handled separately)
+STANDALONE_MARKERS = frozenset(range(0xD0, 0xD8)) | {0x01}
+
+# End of entropy-coded data: 0xFF followed by anything but a stuffed zero or a restart marker
+ENTROPY_END = re.compile(rb"\xff[^\x00\xd0-\xd7]")
+
+CACHE_FIELD = "jpeg_hash"
+
+
+class JPEGFormatError(ValueError):
+    pass
+
+
+def jpeg_content_hash(filepath, throttle=None):
+    """Hex BLAKE2b digest of the image data of a JPEG, ignoring metadata segments.
+
+    The marker stream is parsed without decoding pixels: quantization and
+    Huffman tables, frame and scan headers and the entropy-coded data are
+    hashed, APPn and COM segments are skipped, and so is anything after
+    EOI. Copies that differ only in EXIF (orientation included), XMP, ICC
+    profile or comments get the same digest. Returns None for files that
+    are not well-formed JPEGs.
+    """
+    try:
+        with open(filepath, 'rb') as f:
+            if f.read(2) != b"\xff\xd8":
+                return None
+            f.seek(0)
+            data = f.read()
+    except OSError:
+        return None
+    if throttle is not None:
+        throttle.read(len(data))
+    try:
+        return _hash_segments(memoryview(data))
+    except JPEGFormatError:
+        return None
+
+
+def _hash_segments(data):
+    if bytes(data[:2]) != b"\xff\xd8":
+        raise JPEGFormatError("missing SOI")
+    digest = hashlib.blake2b(digest_size=16)
+    pos, end = 2, len(data)
+    while pos < end:
+        if data[pos] != 0xFF:
+            raise JPEGFormatError(f"expected a marker at offset {pos}")
+        while pos < end and data[pos] == 0xFF:  # Fill bytes
+            pos += 1
+        if pos >= end:
+            break
+        marker = data[pos]
+        pos += 1
+        if marker == EOI:
+            return digest.hexdigest()
+        if marker in STANDALONE_MARKERS or marker == SOI:
+            continue
+        if pos + 2 > end:
+            raise JPEGFormatError("truncated segment")
+        length = (data[pos] << 8) | data[pos + 1]
+        if length < 2 or pos + length > end:
+            raise JPEGFormatError(f"bad segment length at offset {pos}")
+        if marker not in METADATA_MARKERS:
+            digest.update(bytes((marker,)))
+            digest.update(data[pos:pos + length])
+        pos += length
+        if marker == SOS:
+            match = ENTROPY_END.search(data, pos)
+            scan_end = match.start() if match else end
+            digest.update(data[pos:scan_end])
+            pos = scan_end
+    # Truncated file without EOI: the data read so far still identifies it
+    return digest.hexdigest()
+
+
+def cached_content_hash(filepath, cache=None, throttle=None):
+    """JPEG content hash of filepath from the metadata cache, computing and storing it when stale."""
+    try:
+        st = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    if cache is not None:
+        data = cache.get(filepath, st.st_size, st.st_mtime_ns)
+        if data and CACHE_FIELD in data:
+            return data[CACHE_FIELD]
+    digest = jpeg_content_hash(filepath, throttle)
+    if cache is not None:
+        cache.update(filepath, st.st_size, st.st_mtime_ns, **{CACHE_FIELD: digest})
+    return digest
+
+
+def same_jpeg_content(filepath1, filepath2, cache=None, throttle=None):
+    """True if two JPEGs carry the same image data, however their metadata differs."""
+    hash1 = cached_content_hash(filepath1, cache, throttle)
+    return hash1 is not None and hash1 == cached_content_hash(filepath2, cache, throttle)
@@ -0,0 +1,302 @@
+import json
+import os
+import shutil
+import numpy as np
+from imgcompare.phash import NEAR_DISTANCE, cached_hashes, popcount64
+from imgcompare.shards import file_hash
+
+LIBRARY_VERSION = 1
+
+# The 64-bit perceptual hash is split into CHUNKS sorted 16-bit keys. Probing every
+# key and its 16 one-bit neighbours finds every hash up to 2 * CHUNKS - 1 bits away.
+CHUNKS = 4
+CHUNK_BITS = 16
+PROBE_MASKS = np.array([0] + [1 << bit for bit in range(CHUNK_BITS)], dtype=np.uint32)
+MAX_NEAR_DISTANCE = 2 * CHUNKS - 1
+
+# Pending additions merged into the memory-mapped arrays by compact()
+COMPACT_PENDING = 10_000
+
+PENDING_FILE = "pending.jsonl"
+META_FILE = "library.json"
+
+
+def exact_key(filepath, cache=None, throttle=None):
+    """64-bit content key of a file (prefix of its BLAKE2b hash), cached as "hash"."""
+    st = os.stat(filepath)
+    data = cache.get(filepath, st.st_size, st.st_mtime_ns) if cache is not None else None
+    digest = data.get("hash") if data else None
+    if not digest:
+        digest = file_hash(filepath, throttle)
+        if cache is not None:
+            cache.update(filepath, st.st_size, st.st_mtime_ns, hash=digest)
+    return int(digest[:16], 16)
+
+
+def fingerprint(filepath, cache=None, report=None, throttle=None):
+    """(exact key, 8 dihedral dHashes) of filepath; the hashes are None for unreadable images."""
+    return exact_key(filepath, cache, throttle), cached_hashes(filepath, cache, report)
+
+
+class LibraryIndex:
+    """Persistent index of an archive for "is this already archived?" checks.
+
+    Exact keys and perceptual hashes live in .npy files that are opened
+    memory-mapped, so opening a million-file library costs nothing until it
+    is queried. Exact lookups are a binary search; near-match lookups use
+    multi-index hashing (sorted 16-bit chunks of the hash) and only compare
+    the few candidates sharing a chunk. New files are appended to a pending
+    journal right away and folded into the arrays by compact(). Adding a
+    path again replaces its entry; the journal notes which array row it
+    supersedes, so opening still reads no arrays.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.meta = self._read_meta()
+        self._open_generation()
+        self._read_pending()
+
+    def _read_meta(self):
+        meta_path = os.path.join(self.directory, META_FILE)
+        if not os.path.exists(meta_path):
+            return {"version": LIBRARY_VERSION, "generation": None, "count": 0}
+        with open(meta_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _open_generation(self):
+        generation = self.meta["generation"]
+        if generation is None:
+            self.exact = np.zeros(0, dtype=np.uint64)
+            self.exact_rows = np.zeros(0, dtype=np.int64)
+            self.phash = np.zeros(0, dtype=np.uint64)
+            self.phash_valid = np.zeros(0, dtype=bool)
+            self.chunks = [np.zeros(0, dtype=np.uint16) for _ in range(CHUNKS)]
+            self.chunk_rows = [np.zeros(0, dtype=np.int64) for _ in range(CHUNKS)]
+            self.path_bytes = np.zeros(0, dtype=np.uint8)
+            self.path_offsets = np.zeros(1, dtype=np.int64)
+            return
+        folder = os.path.join(self.directory, generation)
+        load = lambda name: np.load(os.path.join(folder, name + ".npy"), mmap_mode='r')
+        self.exact = load("exact")
+        self.exact_rows = load("exact_rows")
+        self.phash = load("phash")
+        self.phash_valid = load("phash_valid")
+        self.chunks = [load(f"chunk{c}") for c in range(CHUNKS)]
+        self.chunk_rows = [load(f"chunk{c}_rows") for c in range(CHUNKS)]
+        self.path_bytes = load("paths")
+        self.path_offsets = load("path_offsets")
+
+    def _read_pending(self):
+        self.pending = []  # (path, exact, phash or None)
+        self.pending_index = {}  # path -> position in pending
+        self.replaced = set()  # Array rows superseded by a pending entry for the same path
+        self._main_index = None  # path -> array row, built on the first add()
+        pending_path = os.path.join(self.directory, PENDING_FILE)
+        if os.path.exists(pending_path):
+            with open(pending_path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._record(entry["path"], int(entry["exact"], 16),
+                                     int(entry["phash"], 16) if entry["phash"] else None, entry.get("replaces"))
+
+    def _record(self, path, exact, phash, replaces=None):
+        if replaces is not None:
+            self.replaced.add(replaces)
+        if path in self.pending_index:
+            self.pending[self.pending_index[path]] = (path, exact, phash)
+        else:
+            self.pending_index[path] = len(self.pending)
+            self.pending.append((path, exact, phash))
+
+    def _main_row(self, path):
+        if self._main_index is None:
+            self._main_index = {self.path(row): row for row in range(self.main_count)}
+        row = self._main_index.get(path)
+        return None if row is None or row in self.replaced else row
+
+    @property
+    def main_count(self):
+        return len(self.phash)
+
+    def __len__(self):
+        return self.main_count - len(self.replaced) + len(self.pending)
+
+    def path(self, row):
+        if row >= self.main_count:
+            return self.pending[row - self.main_count][0]
+        start, end = self.path_offsets[row], self.path_offsets[row + 1]
+        return bytes(self.path_bytes[start:end]).decode('utf-8', 'surrogateescape')
+
+    def find_exact(self, key):
+        """Paths of archived files with the same content key."""
+        key = np.uint64(key)
+        lo, hi = np.searchsorted(self.exact, key, 'left'), np.searchsorted(self.exact, key, 'right')
+        paths = [self.path(int(row)) for row in self.exact_rows[lo:hi] if int(row) not in self.replaced]
+        return paths + [path for path, exact, _ in self.pending if exact == key]
+
+    def find_near(self, hashes, max_distance=NEAR_DISTANCE):
+        """(path, distance) of archived files within max_distance bits of any variant in hashes.
+
+        Pass all eight dihedral hashes to find rotated and mirrored copies.
+        Results are complete up to MAX_NEAR_DISTANCE bits.
+        """
+        queries = np.array(hashes, dtype=np.uint64)
+        found = {}
+        rows = self._chunk_candidates(queries)
+        if len(rows):
+            distances = popcount64(self.phash[rows][:, None] ^ queries[None, :]).min(axis=1)
+            for row, distance in zip(rows, distances):
+                if distance <= max_distance and int(row) not in self.replaced:
+                    found[int(row)] = int(distance)
+        for offset, (_, _, phash) in enumerate(self.pending):
+            if phash is not None:
+                distance = int(popcount64(np.uint64(phash) ^ queries).min())
+                if distance <= max_distance:
+                    found[self.main_count + offset] = distance
+        return sorted(((self.path(row), distance) for row, distance in found.items()), key=lambda item: item[1])
+
+    def _chunk_candidates(self, queries):
+        parts = []
+        for c in range(CHUNKS):
+            keys = ((queries >> np.uint64(c * CHUNK_BITS)) & np.uint64(0xFFFF)).astype(np.uint32)
+            probes = np.unique((keys[:, None] ^ PROBE_MASKS[None, :]).ravel()).astype(np.uint16)
+            lo = np.searchsorted(self.chunks[c], probes, 'left')
+            hi = np.searchsorted(self.chunks[c], probes, 'right')
+            parts.extend(self.chunk_rows[c][start:end] for start, end in zip(lo, hi) if end > start)
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(parts))
+
+    def add(self, path, exact, hashes):
+        """Record an accepted file, replacing any entry for the same path.
+
+        It is searchable at once and persisted in the pending journal.
+        Returns False when the path is already recorded with the same keys.
+        """
+        phash = hashes[0] if hashes else None
+        entry = {"path": path, "exact": f"{exact:016x}", "phash": f"{phash:016x}" if phash is not None else None}
+        if path in self.pending_index:
+            if self.pending[self.pending_index[path]] == (path, exact, phash):
+                return False
+        else:
+            row = self._main_row(path)
+            if row is not None:
+                if (self._exact_by_row()[row] == np.uint64(exact)
+                        and (self.phash[row] if self.phash_valid[row] else None) == phash):
+                    return False
+                entry["replaces"] = row
+        with open(os.path.join(self.directory, PENDING_FILE), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + "\n")
+        self._record(path, exact, phash, entry.get("replaces"))
+        if len(self.pending) >= COMPACT_PENDING:
+            self.compact()
+        return True
+
+    def compact(self):
+        """Merge pending additions into a new generation of memory-mapped arrays."""
+        if not self.pending:
+            return
+        count = len(self)
+        # Array rows replaced by a later add() of the same path are dropped
+        kept = np.ones(self.main_count, dtype=bool)
+        kept[list(self.replaced)] = False
+        kept_rows = np.flatnonzero(kept)
+        paths = [self.path(int(row)) for row in kept_rows] + [path for path, _, _ in self.pending]
+        # Keys use all 64 bits, so build uint64 arrays directly (never via int64 or float)
+        exact = np.concatenate([self._exact_by_row()[kept_rows],
+                                np.array([e for _, e, _ in self.pending], dtype=np.uint64)])
+        phash = np.concatenate([np.asarray(self.phash)[kept_rows],
+                                np.array([p or 0 for _, _, p in self.pending], dtype=np.uint64)])
+        # Files that could not be hashed (unreadable images) are left out of near-match lookups
+        hashed = np.concatenate([np.asarray(self.phash_valid)[kept_rows],
+                                 np.array([p is not None for _, _, p in self.pending], dtype=bool)])
+
+        generation = f"gen-{(int(self.meta['generation'][4:]) + 1) if self.meta['generation'] else 1}"
+        folder = os.path.join(self.directory, generation)
+        os.makedirs(folder, exist_ok=True)
+        save = lambda name, array: np.save(os.path.join(folder, name + ".npy"), array)
+        order = np.argsort(exact, kind='stable')
+        save("exact", exact[order])
+        save("exact_rows", order.astype(np.int64))
+        save("phash", phash)
+        save("phash_valid", hashed)
+        hashed_rows = np.flatnonzero(hashed)
+        for c in range(CHUNKS):
+            keys = ((phash[hashed_rows] >> np.uint64(c * CHUNK_BITS)) & np.uint64(0xFFFF)).astype(np.uint16)
+            order = np.argsort(keys, kind='stable')
+            save(f"chunk{c}", keys[order])
+            save(f"chunk{c}_rows", hashed_rows[order].astype(np.int64))
+        encoded = [path.encode('utf-8', 'surrogateescape') for path in paths]
+        save("paths", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+        save("path_offsets", np.concatenate([[0], np.cumsum([len(p) for p in encoded])]).astype(np.int64))
+
+        # Switch generations atomically, then drop the journal and the old arrays
+        old_generation = self.meta["generation"]
+        self.meta = {"version": LIBRARY_VERSION, "generation": generation, "count": count}
+        meta_path = os.path.join(self.directory, META_FILE)
+        with open(meta_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+        if os.path.exists(os.path.join(self.directory, PENDING_FILE)):
+            os.remove(os.path.join(self.directory, PENDING_FILE))
+        self._open_generation()
+        self.pending, self.pending_index, self.replaced, self._main_index = [], {}, set(), None
+        if old_generation:
+            shutil.rmtree(os.path.join(self.directory, old_generation), ignore_errors=True)
+
+    def _exact_by_row(self):
+        by_row = np.empty(self.main_count, dtype=np.uint64)
+        by_row[np.asarray(self.exact_rows)] = self.exact
+        return by_row
+
+
+def _fingerprints(paths, cache, report, file_io):
+    """fingerprint() of every path, or None for files that cannot be read (added to report)."""
+    throttle = file_io.throttle if file_io is not None else None
+
+    def read(path):
+        try:
+            return fingerprint(path, cache, report, throttle)
+        except OSError as e:
+            if report is not None:
+                report.add(path, f"cannot be read: {e}")
+            return None
+    return file_io.map(read, paths) if file_io is not None else map(read, paths)
+
+
+def check_paths(library, paths, cache=None, report=None, file_io=None, max_distance=NEAR_DISTANCE):
+    """Yield (path, status, matches) for incoming files.
+
+    status is "archived" (same bytes in the library), "similar" (a
+    perceptual match, possibly rotated or re-encoded), "new", or
+    "unreadable" for files that could not be read (also added to report).
+    """
+    for path, found in zip(paths, _fingerprints(paths, cache, report, file_io)):
+        if found is None:
+            yield path, "unreadable", []
+            continue
+        exact, hashes = found
+        matches = library.find_exact(exact)
+        if matches:
+            yield path, "archived", matches
+            continue
+        near = library.find_near(hashes, max_distance) if hashes else []
+        if near:
+            yield path, "similar", [match for match, _ in near]
+        else:
+            yield path, "new", []
+
+
+def add_paths(library, paths, cache=None, report=None, file_io=None):
+    """Add or update files in the library; returns how many entries changed.
+
+    Unreadable files are added to report and skipped.
+    """
+    added = 0
+    for path, found in zip(paths, _fingerprints(paths, cache, report, file_io)):
+        if found is not None and library.add(os.path.abspath(path), *found):
+            added += 1
+    return added
@@ -0,0 +1,235 @@
+import os
+import shutil
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from imgcompare.dedupe import Journal
+from imgcompare.shards import file_hash, walk_files
+
+# Plan actions: copy a unique file, skip one the target already holds, or copy
+# it under a new name because a different file already uses its name
+ACTIONS = ("copy", "skip", "rename")
+
+# Parallel copies; each one is a kernel-side transfer, so threads are enough
+DEFAULT_WORKERS = 8
+
+# Largest request per copy_file_range/sendfile call
+COPY_CHUNK = 64 * 1024 * 1024
+
+TEMP_SUFFIX = ".merge-tmp"
+
+
+class MergeError(Exception):
+    """Raised when a planned copy cannot be carried out or verified."""
+
+
+class MergeStep:
+    """One entry of a merge plan."""
+
+    __slots__ = ("action", "source", "target", "size", "reason")
+
+    def __init__(self, action, source, target, size, reason=""):
+        self.action = action
+        self.source = source
+        self.target = target
+        self.size = size
+        self.reason = reason
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"MergeStep({self.action!r}, {self.source!r}, {self.target!r})"
+
+
+class ContentIndex:
+    """Files of a folder tree by size, hashed only when another file has the same size."""
+
+    def __init__(self, root, throttle=None):
+        self.by_size = defaultdict(list)
+        for path, st in walk_files(root):
+            self.by_size[st.st_size].append(path)
+        self.hashes = {}
+        self.throttle = throttle
+
+    def hash(self, path):
+        if path not in self.hashes:
+            self.hashes[path] = file_hash(path, self.throttle)
+        return self.hashes[path]
+
+    def find(self, path, size):
+        """A file of the tree with the same bytes as path, or None."""
+        for candidate in self.by_size.get(size, ()):
+            if self.hash(candidate) == self.hash(path):
+                return candidate
+        return None
+
+
+def conflict_name(target, taken):
+    """First free "name (n).ext" next to target, avoiding paths in taken."""
+    stem, ext = os.path.splitext(target)
+    n = 1
+    while os.path.lexists(f"{stem} ({n}){ext}") or f"{stem} ({n}){ext}" in taken:
+        n += 1
+    return f"{stem} ({n}){ext}"
+
+
+def plan_merge(source_root, target_root, groups=None, throttle=None):
+    """Plan merging source_root into target_root, keeping its folder layout.
+
+    Files whose bytes already exist anywhere in the target are skipped,
+    and so are files that share a duplicate group (e.g. from
+    shards.duplicate_groups or a review report) with a target file. Files
+    whose name is taken by a different file are copied under a new name.
+    Nothing is changed on disk.
+    """
+    source_root, target_root = os.path.abspath(source_root), os.path.abspath(target_root)
+    index = ContentIndex(target_root, throttle)
+    target_prefix = target_root + os.sep
+    known_duplicate = {}
+    for group in groups or ():
+        in_target = [os.path.abspath(path) for path in group if os.path.abspath(path).startswith(target_prefix)]
+        if in_target:
+            for path in group:
+                known_duplicate[os.path.abspath(path)] = in_target[0]
+
+    plan, taken = [], set()
+    planned = {}  # Source files already planned for copying -> their target
+    for source, st in sorted(walk_files(source_root)):
+        target = os.path.join(target_root, os.path.relpath(source, source_root))
+        if source in known_duplicate:
+            plan.append(MergeStep("skip", source, known_duplicate[source], st.st_size, "duplicate group"))
+            continue
+        existing = index.find(source, st.st_size)
+        if existing in planned:
+            plan.append(MergeStep("skip", source, planned[existing], st.st_size, "duplicate in source"))
+        elif existing is not None:
+            reason = "identical" if existing == target else "same content"
+            plan.append(MergeStep("skip", source, existing, st.st_size, reason))
+        else:
+            if os.path.lexists(target) or target in taken:
+                step = MergeStep("rename", source, conflict_name(target, taken), st.st_size,
+                                 f"{os.path.basename(target)} differs")
+            else:
+                step = MergeStep("copy", source, target, st.st_size)
+            plan.append(step)
+            taken.add(step.target)
+            planned[source] = step.target
+            index.by_size[st.st_size].append(source)
+    return plan
+
+
+def plan_summary(plan):
+    counts = {action: 0 for action in ACTIONS}
+    sizes = {action: 0 for action in ACTIONS}
+    for step in plan:
+        counts[step.action] += 1
+        sizes[step.action] += step.size
+    return ", ".join(f"{counts[action]} to {action} ({sizes[action] / 1024 ** 2:.1f} MB)" for action in ACTIONS)
+
+
+def _copy_range(fd_in, fd_out, offset, size):
+    while offset < size:
+        copied = os.copy_file_range(fd_in, fd_out, min(size - offset, COPY_CHUNK), offset, offset)
+        if copied == 0:
+            break
+        offset += copied
+    return offset
+
+
+def _sendfile(fd_in, fd_out, offset, size):
+    os.lseek(fd_out, offset, os.SEEK_SET)
+    while offset < size:
+        sent = os.sendfile(fd_out, fd_in, offset, min(size - offset, COPY_CHUNK))
+        if sent == 0:
+            break
+        offset += sent
+    return offset
+
+
+def copy_file(src, dst):
+    """Copy src to a new file dst inside the kernel where possible.
+
+    Tries copy_file_range (which may share blocks on CoW filesystems or
+    copy server-side on NFS 4.2/SMB3), then sendfile, then a plain read and
+    write loop, each continuing where the previous one stopped.
+    """
+    with open(src, 'rb') as fsrc, open(dst, 'xb') as fdst:
+        fd_in, fd_out = fsrc.fileno(), fdst.fileno()
+        size = os.fstat(fd_in).st_size
+        offset = 0
+        for method in (_copy_range, _sendfile):
+            try:
+                offset = method(fd_in, fd_out, offset, size)
+                break
+            except (AttributeError, OSError):
+                # Not available on this platform or filesystem pair; go on after what was written
+                offset = os.fstat(fd_out).st_size
+        if offset < size:
+            fsrc.seek(offset)
+            fdst.seek(offset)
+            shutil.copyfileobj(fsrc, fdst)
+        fdst.flush()
+        os.fsync(fd_out)
+    shutil.copystat(src, dst)
+
+
+def temp_path(path):
+    folder, name = os.path.split(path)
+    return os.path.join(folder, f".{name}{TEMP_SUFFIX}")
+
+
+def run_step(step, journal=None, verify=True, throttle=None):
+    """Carry out one copy or rename step; returns the bytes copied.
+
+    The copy is written to a hidden temporary file, checked against the
+    source hash when verify is set, and only then renamed into place.
+    """
+    if step.action == "skip":
+        return 0
+    tmp = temp_path(step.target)
+    if journal is not None:
+        journal.write(action="start", mode=step.action, source=step.source, replace=step.target, temp=tmp)
+    try:
+        os.makedirs(os.path.dirname(step.target), exist_ok=True)
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        copy_file(step.source, tmp)
+        if verify and file_hash(step.source, throttle) != file_hash(tmp, throttle):
+            raise MergeError(f"copy of {step.source} does not match the source")
+        if os.path.lexists(step.target):
+            raise MergeError(f"{step.target} appeared while merging")
+        os.replace(tmp, step.target)
+    except (OSError, MergeError) as e:
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        if journal is not None:
+            journal.write(action="failed", replace=step.target, error=str(e))
+        raise MergeError(f"Cannot copy {step.source}: {e}") from e
+    if journal is not None:
+        journal.write(action="done", mode=step.action, source=step.source, replace=step.target)
+    return step.size
+
+
+def execute_plan(plan, journal=None, workers=DEFAULT_WORKERS, verify=True, throttle=None):
+    """Run the copy and rename steps of a plan in parallel.
+
+    An interrupted run leaves at most hidden temporary files, which
+    dedupe.recover(journal) removes. Returns (copied, copied_bytes,
+    failed) where failed lists (step, error).
+    """
+    steps = [step for step in plan if step.action != "skip"]
+
+    def run(step):
+        try:
+            return run_step(step, journal, verify, throttle), None
+        except MergeError as e:
+            return 0, str(e)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="merge") as executor:
+        results = list(executor.map(run, steps))
+    failed = [(step, error) for step, (_, error) in zip(steps, results) if error]
+    return len(steps) - len(failed), sum(size for size, _ in results), failed
+
+
+def open_journal(target_root):
+    return Journal(os.path.join(target_root, ".merge_journal.jsonl"))
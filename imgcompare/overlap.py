@@ -0,0 +1,184 @@
+import hashlib
+import os
+from collections import defaultdict
+import numpy as np
+from imgcompare.core import IMAGE_EXTENSIONS
+from imgcompare.shards import walk_files
+
+# MinHash sketch length. Sketches are split into LSH bands of rows values each; two
+# folders with Jaccard overlap s share a band with probability 1 - (1 - s ** rows) ** bands.
+# band_layout picks the most selective split that still finds pairs at the requested
+# similarity with probability CANDIDATE_RECALL.
+NUM_HASHES = 128
+CANDIDATE_RECALL = 0.95
+
+# Leading bytes read (with the size) to fingerprint file contents cheaply
+QUICK_BYTES = 64 * 1024
+
+# Buckets holding more folders than this are skipped (e.g. many folders of one stock file)
+MAX_BUCKET = 200
+
+# Tokens sketched per numpy batch
+SKETCH_BATCH = 4096
+
+_rng = np.random.default_rng(0x5EED)
+SEEDS = _rng.integers(0, 2 ** 63, NUM_HASHES, dtype=np.uint64) * np.uint64(2)
+MULTIPLIERS = _rng.integers(0, 2 ** 63, NUM_HASHES, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+
+
+def token_hash(token):
+    """64-bit hash of a str or bytes token."""
+    if isinstance(token, str):
+        token = token.encode('utf-8', 'surrogateescape')
+    return int.from_bytes(hashlib.blake2b(token, digest_size=8).digest(), 'big')
+
+
+def quick_key(path, size):
+    """Content token from the size and leading bytes of a file, or None if unreadable."""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(QUICK_BYTES)
+    except OSError:
+        return None
+    return token_hash(size.to_bytes(8, 'big') + head)
+
+
+def minhash(tokens):
+    """MinHash sketch (NUM_HASHES uint32 values) of a set of 64-bit token hashes."""
+    tokens = np.unique(np.asarray(tokens, dtype=np.uint64))
+    sketch = np.full(NUM_HASHES, np.iinfo(np.uint32).max, dtype=np.uint32)
+    for start in range(0, len(tokens), SKETCH_BATCH):
+        batch = tokens[start:start + SKETCH_BATCH, None]
+        # Multiply-shift hashing; uint64 products wrap around, which is intended
+        hashed = (((batch ^ SEEDS) * MULTIPLIERS) >> np.uint64(32)).astype(np.uint32)
+        sketch = np.minimum(sketch, hashed.min(axis=0))
+    return sketch
+
+
+class FolderSketch:
+    """File count, total bytes and MinHash sketches of the file names and contents of one folder."""
+
+    __slots__ = ("folder", "count", "total_bytes", "names", "contents")
+
+    def __init__(self, folder, count, total_bytes, names, contents=None):
+        self.folder = folder
+        self.count = count
+        self.total_bytes = total_bytes
+        self.names = names
+        self.contents = contents
+
+
+def folder_files(roots, extensions=IMAGE_EXTENSIONS):
+    """Map every folder below roots to the (path, size) of the images directly inside it."""
+    folders = defaultdict(list)
+    for root in roots:
+        for path, st in walk_files(root, extensions):
+            folders[os.path.dirname(path)].append((path, st.st_size))
+    return folders
+
+
+def sketch_folders(roots, contents=False, file_io=None, extensions=IMAGE_EXTENSIONS):
+    """FolderSketch of every folder below roots holding images.
+
+    Names are compared case-insensitively. With contents, every file's
+    quick_key is read too (concurrently through file_io when given), which
+    finds copies that were renamed.
+    """
+    folders = folder_files(roots, extensions)
+    keys = {}
+    if contents:
+        files = [item for items in folders.values() for item in items]
+        read = lambda item: quick_key(*item)
+        keys = dict(zip((path for path, _ in files), file_io.map(read, files) if file_io is not None
+                        else map(read, files)))
+    sketches = []
+    for folder, items in sorted(folders.items()):
+        names = minhash([token_hash(os.path.basename(path).lower()) for path, _ in items])
+        content = None
+        if contents:
+            content_keys = [keys[path] for path, _ in items if keys[path] is not None]
+            content = minhash(content_keys) if content_keys else None
+        sketches.append(FolderSketch(folder, len(items), sum(size for _, size in items), names, content))
+    return sketches
+
+
+def band_layout(min_similarity):
+    """(bands, rows per band) finding pairs of at least min_similarity with CANDIDATE_RECALL.
+
+    More rows per band mean fewer, more similar candidates; the largest
+    count that still reaches the recall is used.
+    """
+    for rows in range(NUM_HASHES, 0, -1):
+        bands = NUM_HASHES // rows
+        if 1 - (1 - min_similarity ** rows) ** bands >= CANDIDATE_RECALL:
+            return bands, rows
+    return NUM_HASHES, 1
+
+
+def candidate_pairs(sketches, field="names", min_similarity=0.3):
+    """Index pairs of sketches sharing at least one LSH band of the given field."""
+    bands, rows_per_band = band_layout(min_similarity)
+    buckets = defaultdict(list)
+    for row, sketch in enumerate(sketches):
+        values = getattr(sketch, field)
+        if values is None:
+            continue
+        for band in range(bands):
+            buckets[(band, values[band * rows_per_band:(band + 1) * rows_per_band].tobytes())].append(row)
+    pairs = set()
+    for rows in buckets.values():
+        if 1 < len(rows) <= MAX_BUCKET:
+            pairs.update((a, b) for i, a in enumerate(rows) for b in rows[i + 1:])
+    return pairs
+
+
+def similarity(sketch1, sketch2):
+    """Estimated Jaccard overlap of two sketches (0..1); 0 when either is missing."""
+    if sketch1 is None or sketch2 is None:
+        return 0.0
+    return float(np.mean(sketch1 == sketch2))
+
+
+class FolderOverlap:
+    """Estimated overlap of two folders, as found by find_overlaps."""
+
+    __slots__ = ("folder1", "folder2", "name_similarity", "content_similarity", "shared_files", "reclaimable")
+
+    def __init__(self, folder1, folder2, name_similarity, content_similarity, shared_files, reclaimable):
+        self.folder1 = folder1
+        self.folder2 = folder2
+        self.name_similarity = name_similarity
+        self.content_similarity = content_similarity
+        self.shared_files = shared_files
+        self.reclaimable = reclaimable
+
+    def __repr__(self):
+        return (f"FolderOverlap({self.folder1!r}, {self.folder2!r}, ~{self.shared_files} shared, "
+                f"~{self.reclaimable / 1024 ** 2:.1f} MB)")
+
+
+def estimate_overlap(sketch1, sketch2):
+    """FolderOverlap of two folder sketches, scored by contents when sketched, else by names."""
+    names = similarity(sketch1.names, sketch2.names)
+    contents = similarity(sketch1.contents, sketch2.contents)
+    jaccard = contents if sketch1.contents is not None and sketch2.contents is not None else names
+    # |A & B| = J * |A | B| and |A | B| = |A| + |B| - |A & B|
+    shared = min(round(jaccard * (sketch1.count + sketch2.count) / (1 + jaccard)), sketch1.count, sketch2.count)
+    average_size = (sketch1.total_bytes + sketch2.total_bytes) / max(sketch1.count + sketch2.count, 1)
+    return FolderOverlap(sketch1.folder, sketch2.folder, names, contents, shared, int(shared * average_size))
+
+
+def find_overlaps(sketches, min_similarity=0.3):
+    """Folder pairs likely to overlap, most reclaimable bytes first.
+
+    Only pairs sharing an LSH band of their name or content sketches are
+    scored, so the cost grows with the number of folders, not its square.
+    """
+    pairs = candidate_pairs(sketches, "names", min_similarity) | candidate_pairs(sketches, "contents", min_similarity)
+    overlaps = []
+    for a, b in pairs:
+        overlap = estimate_overlap(sketches[a], sketches[b])
+        if max(overlap.name_similarity, overlap.content_similarity) >= min_similarity and overlap.shared_files:
+            overlaps.append(overlap)
+    overlaps.sort(key=lambda overlap: (overlap.reclaimable, overlap.shared_files), reverse=True)
+    return overlaps
@@ -0,0 +1,91 @@
+import os
+import numpy as np
+from PIL import Image
+from imgcompare.decode import load_preview
+
+# Size decoded to compute hashes (JPEGs get there through DCT scaling)
+HASH_DECODE_SIZE = (64, 64)
+
+# The image is reduced to a square grid so all eight rotations/flips share one layout;
+# row-wise differences of the first 8 rows give a 64-bit difference hash (dHash)
+HASH_GRID = 9
+
+# Hashes at most this many bits apart are treated as the same picture
+NEAR_DISTANCE = 6
+
+CACHE_FIELD = "dhash8"
+
+# Names of the eight dihedral variants, in the order dihedral_hashes returns them
+VARIANTS = ("identity", "flip", "rot90", "rot90+flip", "rot180", "rot180+flip", "rot270", "rot270+flip")
+
+
+def _dhash(grid):
+    bits = grid[:-1, 1:] > grid[:-1, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def grid_variants(grid):
+    """The eight rotations and mirror images of a square grid."""
+    for k in range(4):
+        rotated = np.rot90(grid, k)
+        yield rotated
+        yield np.fliplr(rotated)
+
+
+def hashes_of(img):
+    """dHash of every rotation and flip of an (upright) image, from one reduction."""
+    gray = img.convert("L").resize((HASH_GRID, HASH_GRID), Image.Resampling.BOX)
+    grid = np.asarray(gray, dtype=np.int16)
+    return [_dhash(variant) for variant in grid_variants(grid)]
+
+
+def dihedral_hashes(filepath, report=None):
+    """Return the 8 dihedral dHashes of an image (EXIF orientation applied), or None if unreadable."""
+    img = load_preview(filepath, HASH_DECODE_SIZE, report=report)
+    if img is None:
+        return None
+    return hashes_of(img)
+
+
+def canonical_hash(hashes):
+    """Orientation-independent key: the same for every rotated or mirrored copy of a picture."""
+    return min(hashes)
+
+
+def cached_hashes(filepath, cache=None, report=None):
+    """Dihedral hashes of filepath from the metadata cache, computing and storing them when stale."""
+    try:
+        st = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    if cache is not None:
+        data = cache.get(filepath, st.st_size, st.st_mtime_ns)
+        if data and data.get(CACHE_FIELD):
+            return [int(value, 16) for value in data[CACHE_FIELD]]
+    hashes = dihedral_hashes(filepath, report)
+    if hashes is not None and cache is not None:
+        cache.update(filepath, st.st_size, st.st_mtime_ns, **{CACHE_FIELD: [f"{value:016x}" for value in hashes]})
+    return hashes
+
+
+def popcount64(values):
+    """Number of set bits of every element of a uint64 array."""
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    return np.unpackbits(values.view(np.uint8)).reshape(values.shape + (64,)).sum(axis=-1)
+
+
+def rotated_distance(hashes, other):
+    """Return (bits, variant): how far other is from the closest rotation/flip of hashes."""
+    distances = popcount64(np.array(hashes, dtype=np.uint64) ^ np.uint64(other))
+    variant = int(np.argmin(distances))
+    return int(distances[variant]), VARIANTS[variant]
+
+
+def match_rotated(filepath1, filepath2, cache=None, report=None, max_distance=NEAR_DISTANCE):
+    """Return the variant name that turns filepath1 into filepath2, or None if they differ."""
+    hashes1 = cached_hashes(filepath1, cache, report)
+    hashes2 = cached_hashes(filepath2, cache, report)
+    if hashes1 is None or hashes2 is None:
+        return None
+    distance, variant = rotated_distance(hashes1, hashes2[0])
+    return variant if distance <= max_distance else None
@@ -0,0 +1,115 @@
+import hashlib
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from PIL import ImageSequence
+from imgcompare.decode import DECODE_ERRORS, DEFAULT_BUDGET, ImageRejected, open_image
+
+# Formats whose decoded pixels survive conversion between them unchanged
+LOSSLESS_EXTENSIONS = ('.png', '.bmp', '.tif', '.tiff', '.gif', '.ppm', '.pgm', '.pbm', '.tga', '.qoi')
+
+# Rows converted to bytes and hashed at once, so no second full-size buffer is made
+HASH_BAND_ROWS = 256
+
+# Files handed to a worker process per task
+WORKER_CHUNK = 8
+
+# Renamed when frames were added to the digest, so first-frame-only digests are not reused
+CACHE_FIELD = "pixel_hash_frames"
+
+
+def is_lossless(filepath):
+    return filepath.lower().endswith(LOSSLESS_EXTENSIONS)
+
+
+def pixel_hash(filepath, budget=DEFAULT_BUDGET):
+    """Hex BLAKE2b digest of the decoded pixels of every frame of filepath.
+
+    The frame count, and each frame's mode, size and duration, are part
+    of the digest, so animated GIFs or multi-page TIFFs that only share
+    their first frame differ. Two files get the same digest exactly when
+    they decode to the same frames, whatever their container, compression
+    level or metadata. Palette images are hashed as the colours they
+    display, since converters often reorder palettes. Raises ImageRejected
+    or a decode error for unreadable files.
+    """
+    with open_image(filepath, budget) as img:
+        if not budget.fits(img.size, img.mode):
+            raise ImageRejected(f"{img.size[0]}x{img.size[1]} {img.mode} exceeds the decode budget")
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{getattr(img, 'n_frames', 1)} frames\n".encode('ascii'))
+        for frame in ImageSequence.Iterator(img):
+            frame.load()
+            duration = frame.info.get("duration", 0)
+            if frame.mode == "P":
+                frame = frame.convert("RGBA" if "transparency" in frame.info else "RGB")
+            width, height = frame.size
+            digest.update(f"{frame.mode} {width}x{height} {duration}\n".encode('ascii'))
+            # Pillow offers no buffer view of its pixel memory; hashing it band by band
+            # keeps the extra memory to one band instead of a full copy
+            for top in range(0, height, HASH_BAND_ROWS):
+                digest.update(frame.crop((0, top, width, min(top + HASH_BAND_ROWS, height))).tobytes())
+        return digest.hexdigest()
+
+
+def _hash_in_worker(filepath):
+    """Worker-process entry point: (digest, None) or (None, reason)."""
+    try:
+        return pixel_hash(filepath), None
+    except ImageRejected as e:
+        return None, str(e)
+    except DECODE_ERRORS as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def pixel_hashes(paths, cache=None, report=None, workers=None):
+    """Return {path: pixel hash or None}, decoding uncached files in worker processes.
+
+    Decoding is CPU-bound, so it is spread over processes rather than
+    threads. Unreadable files are added to report and map to None.
+    """
+    hashes, missing, stats = {}, [], {}
+    for path in paths:
+        try:
+            st = stats[path] = os.stat(path)
+        except FileNotFoundError:
+            hashes[path] = None
+            continue
+        data = cache.get(path, st.st_size, st.st_mtime_ns) if cache is not None else None
+        if data and data.get(CACHE_FIELD):
+            hashes[path] = data[CACHE_FIELD]
+        else:
+            missing.append(path)
+    if len(missing) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_hash_in_worker, missing, chunksize=WORKER_CHUNK))
+    else:
+        results = [_hash_in_worker(path) for path in missing]
+    for path, (digest, reason) in zip(missing, results):
+        hashes[path] = digest
+        if digest is None:
+            if report is not None:
+                report.add(path, reason)
+        elif cache is not None:
+            st = stats[path]
+            cache.update(path, st.st_size, st.st_mtime_ns, **{CACHE_FIELD: digest})
+    if cache is not None:
+        cache.commit()
+    return hashes
+
+
+def identical_pixel_pairs(pairs, cache=None, report=None, workers=None):
+    """The (path1, path2) pairs of lossless files whose decoded pixels are identical."""
+    pairs = [pair for pair in pairs if is_lossless(pair[0]) and is_lossless(pair[1])]
+    hashes = pixel_hashes(sorted({path for pair in pairs for path in pair}), cache, report, workers)
+    return {pair for pair in pairs if hashes[pair[0]] is not None and hashes[pair[0]] == hashes[pair[1]]}
+
+
+def pixel_groups(paths, cache=None, report=None, workers=None):
+    """Groups of lossless files (from paths) that decode to identical pixels."""
+    hashes = pixel_hashes([path for path in paths if is_lossless(path)], cache, report, workers)
+    groups = defaultdict(list)
+    for path, digest in hashes.items():
+        if digest is not None:
+            groups[digest].append(path)
+    return [sorted(group) for group in groups.values() if len(group) > 1]
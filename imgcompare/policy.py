@@ -0,0 +1,190 @@
+import os
+import numpy as np
+
+# Fields every group table has; missing values are treated as 0
+TABLE_FIELDS = ("size", "mtime", "resolution", "dpi", "nlink", "shared", "link_group")
+
+
+class Criterion:
+    """One weighted keep criterion: prefer the min or max of a table field."""
+
+    def __init__(self, field, prefer="max", weight=1.0):
+        if prefer not in ("min", "max"):
+            raise ValueError(f"prefer must be 'min' or 'max', not {prefer!r}")
+        self.field = field
+        self.prefer = prefer
+        self.weight = weight
+
+    def __repr__(self):
+        return f"Criterion({self.field!r}, {self.prefer!r}, {self.weight})"
+
+
+# The rules highlight_image_info colours green: oldest, biggest, highest resolution and DPI
+DEFAULT_CRITERIA = [
+    Criterion("mtime", "min", 1.0),
+    Criterion("size", "max", 1.0),
+    Criterion("resolution", "max", 1.0),
+    Criterion("dpi", "max", 0.5),
+]
+
+
+class GroupTable:
+    """Columnar metadata of all files in all duplicate groups.
+
+    Rows of one group are contiguous; group holds the group number of each row.
+    """
+
+    def __init__(self, paths, group, columns):
+        self.paths = np.asarray(paths, dtype=object)
+        self.group = np.asarray(group, dtype=np.int64)
+        self.columns = {name: np.asarray(values, dtype=np.float64) for name, values in columns.items()}
+        self.folders = np.array([os.path.dirname(path) for path in self.paths], dtype=object)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, field):
+        return self.columns[field]
+
+    @property
+    def group_starts(self):
+        """Row index where each group begins."""
+        if not len(self):
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(np.r_[True, self.group[1:] != self.group[:-1]])
+
+
+def _field(record, name):
+    if isinstance(record, dict):
+        return record.get(name) or 0
+    return getattr(record, name, 0) or 0
+
+
+def build_table(groups, fields=TABLE_FIELDS):
+    """Build a GroupTable from groups of records.
+
+    Records can be dicts or objects (such as index.FileRecord) with path,
+    size, mtime and either resolution or width/height. Pass extra numeric
+    fields (e.g. a quality score) in fields to make them available to criteria.
+    Records with dev and ino (fsid.storage_fields) get a link_group number,
+    the same for every hardlink of one file and 0 when unknown.
+    """
+    paths, group = [], []
+    columns = {name: [] for name in fields}
+    link_groups = {}
+    for number, records in enumerate(groups):
+        for record in records:
+            paths.append(_field(record, "path"))
+            group.append(number)
+            for name in columns:
+                value = _field(record, name)
+                if name == "resolution" and not value:
+                    value = _field(record, "width") * _field(record, "height")
+                elif name == "link_group" and _field(record, "ino"):
+                    storage = (_field(record, "dev"), _field(record, "ino"))
+                    value = link_groups.setdefault(storage, len(link_groups) + 1)
+                columns[name].append(value if isinstance(value, (int, float)) else 0)
+    return GroupTable(paths, group, columns)
+
+
+def score(table, criteria=DEFAULT_CRITERIA):
+    """Score every row against its own group in one pass; higher is better.
+
+    Each criterion is scaled to 0..1 within the group (1 for the preferred
+    extreme, and for every row when all values are equal), then weighted.
+    """
+    total = np.zeros(len(table))
+    if not len(table):
+        return total
+    starts = table.group_starts
+    counts = np.diff(np.r_[starts, len(table)])
+    for criterion in criteria:
+        if criterion.field not in table.columns:
+            continue
+        values = table[criterion.field]
+        low = np.repeat(np.minimum.reduceat(values, starts), counts)
+        high = np.repeat(np.maximum.reduceat(values, starts), counts)
+        spread = high - low
+        scaled = np.divide(values - low, spread, out=np.ones_like(values), where=spread > 0)
+        if criterion.prefer == "min":
+            scaled = np.where(spread > 0, 1.0 - scaled, 1.0)
+        total += criterion.weight * scaled
+    return total
+
+
+def decide(table, criteria=DEFAULT_CRITERIA):
+    """Return a boolean keep mask with exactly one kept file per group.
+
+    Ties go to the first file of the group, i.e. the earlier folder.
+    """
+    keep = np.zeros(len(table), dtype=bool)
+    if not len(table):
+        return keep
+    scores = score(table, criteria)
+    starts = table.group_starts
+    counts = np.diff(np.r_[starts, len(table)])
+    best = np.repeat(np.maximum.reduceat(scores, starts), counts)
+    candidates = np.flatnonzero(np.isclose(scores, best))
+    _, first = np.unique(table.group[candidates], return_index=True)
+    keep[candidates[first]] = True
+    return keep
+
+
+def freed_bytes(table, keep):
+    """Bytes that deleting each non-kept row would really free (0 for kept rows).
+
+    A hardlinked file frees its data only when all of its links are
+    deleted, and then only once; extents shared with other files
+    (reflink clones, snapshots) are never counted. Tables without the
+    storage fields count the full size.
+    """
+    delete = ~keep
+    freed = table["size"].copy()
+    if "shared" in table.columns:
+        freed -= np.minimum(table["shared"], freed)
+    freed[keep] = 0
+    if "link_group" in table.columns and "nlink" in table.columns:
+        links = table["link_group"].astype(np.int64)
+        deleted = np.flatnonzero(delete & (links > 0))
+        if deleted.size:
+            deleted_links = np.bincount(links[deleted], minlength=links.max() + 1)
+            # Other links (kept, or outside the table) still hold the data
+            freed[deleted[deleted_links[links[deleted]] < table["nlink"][deleted]]] = 0
+            _, first = np.unique(links[deleted], return_index=True)
+            repeated = np.ones(deleted.size, dtype=bool)
+            repeated[first] = False
+            freed[deleted[repeated]] = 0
+    return freed
+
+
+def reclaim_summary(table, keep):
+    """Return {folder: (files, bytes)} that deleting the non-kept files would free."""
+    delete = ~keep
+    if not delete.any():
+        return {}
+    folders, inverse = np.unique(table.folders[delete].astype(str), return_inverse=True)
+    sizes = np.bincount(inverse, weights=freed_bytes(table, keep)[delete])
+    files = np.bincount(inverse)
+    return {folder: (int(files[i]), int(sizes[i])) for i, folder in enumerate(folders)}
+
+
+def format_summary(summary):
+    """Render a reclaim summary as text, one folder per line."""
+    if not summary:
+        return "Nothing to reclaim."
+    lines = [f"{folder}: {files} files, {size / (1024 * 1024):.2f} MB"
+             for folder, (files, size) in sorted(summary.items())]
+    total_files = sum(files for files, _ in summary.values())
+    total_size = sum(size for _, size in summary.values())
+    lines.append(f"Total: {total_files} files, {total_size / (1024 * 1024):.2f} MB")
+    return "\n".join(lines)
+
+
+def apply_decisions(table, keep, action):
+    """Call action(path) for every file that is not kept; returns the paths acted on."""
+    done = []
+    for path in table.paths[~keep]:
+        if os.path.exists(path):
+            action(path)
+            done.append(path)
+    return done
@@ -0,0 +1,259 @@
+import math
+import threading
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from imgcompare.decode import (DECODE_ERRORS, DEFAULT_BUDGET, ImageRejected, apply_orientation, bytes_per_pixel,
+                               exif_orientation, open_embedded_preview, open_image, oriented_size)
+
+# Edge length of one pyramid tile in pixels
+TILE_SIZE = 256
+
+# Memory held by decoded tiles across all images
+TILE_CACHE_BYTES = 512 * 1024 * 1024
+
+# Colour shown where no tile is available (yet)
+BACKGROUND = (64, 64, 64)
+
+# Requested size that makes RAW files use their largest embedded preview
+LARGEST_PREVIEW = (1 << 30, 1 << 30)
+
+
+def _tile_bytes(tile):
+    return tile.size[0] * tile.size[1] * bytes_per_pixel(tile.mode)
+
+
+class TileCache:
+    """Thread-safe LRU cache of decoded tiles, bounded by their total size in bytes.
+
+    Tiles of pinned images (those open in a pane) are evicted only after
+    every other tile, and then from the pinned image holding the most
+    bytes, so open images split the cache evenly instead of evicting each
+    other's tiles in turn.
+    """
+
+    def __init__(self, max_bytes=TILE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self.tiles = OrderedDict()  # (path, level, tx, ty) -> Image
+        self.path_bytes = defaultdict(int)
+        self.pinned = frozenset()
+        self.lock = threading.Lock()
+
+    def pin(self, paths):
+        """Protect the tiles of paths (and no others) from eviction by other images."""
+        with self.lock:
+            self.pinned = frozenset(paths)
+
+    def get(self, key):
+        with self.lock:
+            tile = self.tiles.get(key)
+            if tile is not None:
+                self.tiles.move_to_end(key)
+            return tile
+
+    def put(self, key, tile):
+        with self.lock:
+            old = self.tiles.pop(key, None)
+            if old is not None:
+                self._forget(key, old)
+            self.tiles[key] = tile
+            self.used_bytes += _tile_bytes(tile)
+            self.path_bytes[key[0]] += _tile_bytes(tile)
+            while self.used_bytes > self.max_bytes and len(self.tiles) > 1:
+                victim = self._victim(key)
+                self._forget(victim, self.tiles.pop(victim))
+
+    def _victim(self, newest):
+        """Least recently used unpinned tile, else that of the pinned image over its share the most."""
+        for key in self.tiles:
+            if key[0] not in self.pinned and key != newest:
+                return key
+        largest = max(self.pinned & self.path_bytes.keys(), key=self.path_bytes.__getitem__)
+        oldest = next(key for key in self.tiles if key != newest)
+        return next((key for key in self.tiles if key[0] == largest and key != newest), oldest)
+
+    def _forget(self, key, tile):
+        self.used_bytes -= _tile_bytes(tile)
+        self.path_bytes[key[0]] -= _tile_bytes(tile)
+        if not self.path_bytes[key[0]]:
+            del self.path_bytes[key[0]]
+
+    def discard(self, path):
+        """Drop every tile of one image."""
+        with self.lock:
+            for key in [key for key in self.tiles if key[0] == path]:
+                self._forget(key, self.tiles.pop(key))
+
+
+class Pyramid:
+    """Level layout of one image: level 0 is the largest decode, each next level is half the size."""
+
+    def __init__(self, original_size, level_sizes):
+        self.original_size = original_size
+        self.level_sizes = level_sizes
+
+    def scale(self, level):
+        """Display pixels per original pixel at a level."""
+        return self.level_sizes[level][0] / self.original_size[0]
+
+    def level_for(self, zoom):
+        """Pick the smallest level that still has at least zoom pixels per original pixel."""
+        for level in range(len(self.level_sizes) - 1, -1, -1):
+            if self.scale(level) >= zoom:
+                return level
+        return 0
+
+
+class PyramidBuilder:
+    """Build tile pyramids in a background worker and render views from cached tiles.
+
+    The full image is decoded once per build; afterwards, zooming and panning
+    only composite tiles that are already in the cache. Tiles evicted from
+    the cache are cut again in the background the next time they are
+    needed, without re-inserting the rest of the pyramid. Call pin() with
+    the images on screen so they keep their share of the cache.
+    """
+
+    def __init__(self, cache=None, workers=1, budget=DEFAULT_BUDGET, tile_size=TILE_SIZE):
+        self.cache = cache if cache is not None else TileCache()
+        self.budget = budget
+        self.tile_size = tile_size
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pyramid")
+        self.pyramids = {}  # path -> Pyramid
+        self.pending = {}  # path -> Future
+        self.failed = set()
+        self.lock = threading.Lock()
+
+    def pin(self, paths):
+        self.cache.pin(paths)
+
+    def request(self, path, tiles=None):
+        """Start building the pyramid of path unless it is built or being built.
+
+        With tiles, a list of (level, tx, ty), only those tiles of an
+        already built pyramid are cut again.
+        """
+        with self.lock:
+            if path in self.pending or path in self.failed:
+                return
+            if tiles and path in self.pyramids:
+                self.pending[path] = self.executor.submit(self._rebuild_tiles, path, set(tiles))
+            else:
+                self.pending[path] = self.executor.submit(self._build, path)
+
+    def is_building(self, path):
+        with self.lock:
+            return path in self.pending
+
+    def _decode(self, path):
+        """(original size, oriented RGB level 0), or None if the image cannot be decoded."""
+        try:
+            img = open_embedded_preview(path, LARGEST_PREVIEW) or open_image(path, self.budget)
+            with img:
+                orientation = exif_orientation(img)
+                original_size = oriented_size(img.size, orientation)
+                if img.format == "JPEG" and not self.budget.fits(img.size, "RGB"):
+                    # Decode at the largest DCT scale that fits the budget
+                    scale = math.sqrt(self.budget.max_pixels / (img.size[0] * img.size[1]))
+                    img.draft("RGB", (int(img.size[0] * scale), int(img.size[1] * scale)))
+                if not self.budget.fits(img.size, img.mode):
+                    raise ImageRejected(f"{img.size[0]}x{img.size[1]} is too large to build a pyramid")
+                level_img = apply_orientation(img.convert("RGB"), orientation)
+        except (ImageRejected, *DECODE_ERRORS):
+            with self.lock:
+                self.failed.add(path)
+                self.pending.pop(path, None)
+            return None
+        return original_size, level_img
+
+    def _build(self, path):
+        decoded = self._decode(path)
+        if decoded is None:
+            return None
+        original_size, level_img = decoded
+
+        level_sizes = []
+        level = 0
+        while True:
+            level_sizes.append(level_img.size)
+            self._cut_tiles(path, level, level_img)
+            if level_img.size[0] <= self.tile_size and level_img.size[1] <= self.tile_size:
+                break
+            level_img = level_img.reduce(2)
+            level += 1
+
+        pyramid = Pyramid(original_size, level_sizes)
+        with self.lock:
+            self.pyramids[path] = pyramid
+            self.pending.pop(path, None)
+        return pyramid
+
+    def _rebuild_tiles(self, path, tiles):
+        """Cut only the given (level, tx, ty) tiles of a built pyramid again."""
+        decoded = self._decode(path)
+        if decoded is not None:
+            level_img = decoded[1]
+            for level in range(max(level for level, _, _ in tiles) + 1):
+                if level:
+                    level_img = level_img.reduce(2)
+                self._cut_tiles(path, level, level_img, {(tx, ty) for lv, tx, ty in tiles if lv == level})
+        with self.lock:
+            self.pending.pop(path, None)
+
+    def _cut_tiles(self, path, level, level_img, only=None):
+        """Put the tiles of one level into the cache; only limits it to a set of (tx, ty)."""
+        width, height = level_img.size
+        for ty in range(0, height, self.tile_size):
+            for tx in range(0, width, self.tile_size):
+                if only is not None and (tx // self.tile_size, ty // self.tile_size) not in only:
+                    continue
+                box = (tx, ty, min(tx + self.tile_size, width), min(ty + self.tile_size, height))
+                self.cache.put((path, level, tx // self.tile_size, ty // self.tile_size), level_img.crop(box))
+
+    def render(self, path, zoom, center, viewport):
+        """Composite the visible part of the image at zoom around center.
+
+        zoom is display pixels per original pixel, center is (x, y) as a
+        fraction of the image size. Returns (image, complete); image is None
+        while the pyramid is not built, and complete is False when some
+        tiles were missing and have been requested again.
+        """
+        pyramid = self.pyramids.get(path)
+        if pyramid is None:
+            self.request(path)
+            return None, False
+
+        level = pyramid.level_for(zoom)
+        level_width, level_height = pyramid.level_sizes[level]
+        factor = zoom / pyramid.scale(level)  # Display pixels per level pixel
+        region_width = max(1, math.ceil(viewport[0] / factor))
+        region_height = max(1, math.ceil(viewport[1] / factor))
+        left = int(center[0] * level_width - region_width / 2)
+        top = int(center[1] * level_height - region_height / 2)
+
+        region = Image.new("RGB", (region_width, region_height), BACKGROUND)
+        missing = []
+        first_tx, first_ty = max(0, left // self.tile_size), max(0, top // self.tile_size)
+        last_tx = min((level_width - 1) // self.tile_size, (left + region_width - 1) // self.tile_size)
+        last_ty = min((level_height - 1) // self.tile_size, (top + region_height - 1) // self.tile_size)
+        for ty in range(first_ty, last_ty + 1):
+            for tx in range(first_tx, last_tx + 1):
+                tile = self.cache.get((path, level, tx, ty))
+                if tile is None:
+                    missing.append((level, tx, ty))
+                    continue
+                region.paste(tile, (tx * self.tile_size - left, ty * self.tile_size - top))
+
+        if missing:
+            # Evicted tiles: cut them again in the background and show what we have
+            self.request(path, missing)
+        resample = Image.Resampling.NEAREST if factor >= 1 else Image.Resampling.BILINEAR
+        return region.resize(viewport, resample), not missing
+
+    def original_size(self, path):
+        pyramid = self.pyramids.get(path)
+        return pyramid.original_size if pyramid else None
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,173 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+from imgcompare.decode import DECODE_ERRORS, load_preview
+from imgcompare.policy import Criterion, DEFAULT_CRITERIA, TABLE_FIELDS
+
+# Every copy is measured at the same reduced size, so a bigger re-encode of a
+# picture gains nothing from its pixel count alone
+QUALITY_DECODE_SIZE = (1024, 1024)
+
+# Sum of the IJG standard luminance quantization table (libjpeg quality 50)
+STANDARD_LUMINANCE_SUM = 3688
+
+# Files handed to a worker process per task
+WORKER_CHUNK = 4
+
+CACHE_FIELD = "quality"
+
+QUALITY_FIELDS = ("jpeg_quality", "sharpness", "noise")
+
+# Keep-policy criteria that favour the sharper, less compressed copy over a bigger re-encode
+QUALITY_CRITERIA = DEFAULT_CRITERIA + [
+    Criterion("sharpness", "max", 3.0),
+    Criterion("jpeg_quality", "max", 1.0),
+    Criterion("noise", "min", 0.5),
+]
+
+POLICY_FIELDS = TABLE_FIELDS + QUALITY_FIELDS
+
+
+def jpeg_quality(filepath):
+    """Estimate the libjpeg quality (1..100) a JPEG was saved with, from its header only.
+
+    The luminance quantization table is compared with the IJG standard
+    table it was scaled from. Returns 0 for other formats and unreadable
+    files.
+    """
+    try:
+        with Image.open(filepath) as img:
+            tables = getattr(img, "quantization", None)
+            if img.format != "JPEG" or not tables:
+                return 0
+            luminance = tables[min(tables)]
+    except DECODE_ERRORS:
+        return 0
+    if max(luminance) == 1:
+        return 100
+    scale = 100.0 * sum(luminance) / STANDARD_LUMINANCE_SUM
+    quality = (200.0 - scale) / 2.0 if scale <= 100 else 5000.0 / scale
+    return int(min(max(round(quality), 1), 100))
+
+
+def sharpness_and_noise(gray):
+    """(Laplacian variance, noise sigma) of a 2-D float array.
+
+    Noise uses Immerkaer's estimator: a Laplacian-difference kernel that
+    cancels edges to first order, so it mostly responds to sensor and
+    compression noise.
+    """
+    if gray.shape[0] < 3 or gray.shape[1] < 3:
+        return 0.0, 0.0
+    center = gray[1:-1, 1:-1]
+    laplacian = 4 * center - gray[:-2, 1:-1] - gray[2:, 1:-1] - gray[1:-1, :-2] - gray[1:-1, 2:]
+    corners = gray[:-2, :-2] + gray[:-2, 2:] + gray[2:, :-2] + gray[2:, 2:]
+    # Kernel [[1, -2, 1], [-2, 4, -2], [1, -2, 1]] = corners - 2 * edges + 4 * center
+    mask = corners + 2 * laplacian - 4 * center
+    noise = math.sqrt(math.pi / 2) * np.abs(mask).sum() / (6 * center.size)
+    return float(laplacian.var()), float(noise)
+
+
+def quality_score(filepath):
+    """{"jpeg_quality", "sharpness", "noise"} of one file, or None if it cannot be decoded."""
+    img = load_preview(filepath, QUALITY_DECODE_SIZE)
+    if img is None:
+        return None
+    gray = np.asarray(img.convert("L"), dtype=np.float32)
+    sharpness, noise = sharpness_and_noise(gray)
+    return {"jpeg_quality": jpeg_quality(filepath), "sharpness": round(sharpness, 2), "noise": round(noise, 3)}
+
+
+def _cached_scores(paths, cache):
+    """(scores found in the cache or of missing files, paths still to score, stats)."""
+    scores, missing, stats = {}, [], {}
+    for path in paths:
+        try:
+            st = stats[path] = os.stat(path)
+        except FileNotFoundError:
+            scores[path] = None
+            continue
+        data = cache.get(path, st.st_size, st.st_mtime_ns) if cache is not None else None
+        if data and data.get(CACHE_FIELD):
+            scores[path] = data[CACHE_FIELD]
+        else:
+            missing.append(path)
+    return scores, missing, stats
+
+
+def _store_scores(scores, results, stats, cache, report):
+    for path, score in results:
+        scores[path] = score
+        if score is None:
+            if report is not None:
+                report.add(path, "cannot be decoded for quality scoring")
+        elif cache is not None:
+            st = stats[path]
+            cache.update(path, st.st_size, st.st_mtime_ns, **{CACHE_FIELD: score})
+    if cache is not None:
+        cache.commit()
+
+
+def quality_scores(paths, cache=None, report=None, workers=None, executor=None):
+    """Return {path: quality_score or None}, measuring uncached files in worker processes.
+
+    Pass a long-lived ProcessPoolExecutor as executor to avoid starting
+    processes for every batch (e.g. once per reviewed set).
+    """
+    scores, missing, stats = _cached_scores(paths, cache)
+    if executor is not None and missing:
+        results = list(executor.map(quality_score, missing, chunksize=WORKER_CHUNK))
+    elif len(missing) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(quality_score, missing, chunksize=WORKER_CHUNK))
+    else:
+        results = [quality_score(path) for path in missing]
+    _store_scores(scores, zip(missing, results), stats, cache, report)
+    return scores
+
+
+class PendingScores:
+    """Quality scores being measured in an executor, collected without blocking.
+
+    For GUIs: check done() from a timer and call result() once it is True.
+    """
+
+    def __init__(self, paths, executor, cache=None, report=None):
+        self.scores, missing, self.stats = _cached_scores(paths, cache)
+        self.futures = {path: executor.submit(quality_score, path) for path in missing}
+        self.cache = cache
+        self.report = report
+
+    def done(self):
+        return all(future.done() for future in self.futures.values())
+
+    def cancel(self):
+        for future in self.futures.values():
+            future.cancel()
+
+    def result(self):
+        """{path: quality_score or None}; blocks until every file is scored."""
+        if self.futures:
+            _store_scores(self.scores, ((path, future.result()) for path, future in self.futures.items()),
+                          self.stats, self.cache, self.report)
+            self.futures = {}
+        return self.scores
+
+
+def add_quality(records, cache=None, report=None, workers=None, executor=None):
+    """Merge quality scores into policy records (dicts with a "path"), in one batch."""
+    records = [record for record in records if record]
+    scores = quality_scores([record["path"] for record in records], cache, report, workers, executor)
+    for record in records:
+        record.update(scores.get(record["path"]) or {})
+    return records
+
+
+def describe_score(score):
+    """One-line summary for info panels."""
+    if not score:
+        return "Quality: n/a"
+    jpeg = f"JPEG q{score['jpeg_quality']}, " if score["jpeg_quality"] else ""
+    return f"Quality: {jpeg}sharpness {score['sharpness']:.0f}, noise {score['noise']:.1f}"
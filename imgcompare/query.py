@@ -0,0 +1,265 @@
+import ast
+import os
+from datetime import datetime
+import numpy as np
+from imgcompare.core import image_info
+from imgcompare.shards import file_hash
+
+# Fields of each side of a pair (left.<field>, right.<field>) and where they come from
+PATH_FIELDS = ("name", "folder", "ext")
+STAT_FIELDS = ("size", "mtime")
+INFO_FIELDS = ("width", "height", "pixels", "dpi", "mode", "camera", "frames")
+HASH_FIELDS = ("hash",)
+FIELDS = PATH_FIELDS + STAT_FIELDS + INFO_FIELDS + HASH_FIELDS
+TEXT_FIELDS = ("name", "folder", "ext", "mode", "camera", "hash")
+
+SIDES = ("left", "right")
+
+# Tokens with a fixed meaning in expressions
+CONSTANTS = {"true": True, "false": False, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+
+_COMPARE = {
+    ast.Eq: np.equal, ast.NotEq: np.not_equal, ast.Lt: np.less, ast.LtE: np.less_equal,
+    ast.Gt: np.greater, ast.GtE: np.greater_equal,
+}
+_ARITHMETIC = {
+    ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide, ast.Mod: np.mod,
+}
+
+# Functions whose result is a condition
+BOOLEAN_FUNCTIONS = ("contains",)
+
+
+class QueryError(ValueError):
+    """Raised for expressions that cannot be parsed or use unknown names."""
+
+
+def _ratio(a, b):
+    a, b = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+    high, low = np.maximum(a, b), np.minimum(a, b)
+    return np.divide(high, low, out=np.full(np.broadcast(high, low).shape, np.inf), where=low > 0)
+
+
+def _date(text):
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except (TypeError, ValueError):
+        raise QueryError(f"date() needs an ISO date such as '2023-05-01', not {text!r}") from None
+
+
+def _text(values):
+    return np.asarray(values).astype(str)
+
+
+def _contains(values, text):
+    return np.char.find(np.char.lower(_text(values)), str(text).lower()) >= 0
+
+
+FUNCTIONS = {
+    "abs": np.abs,
+    "min": np.minimum,
+    "max": np.maximum,
+    "ratio": _ratio,  # Larger over smaller, >= 1 (inf when one side is 0)
+    "date": _date,  # ISO date or datetime -> timestamp, for comparing with mtime
+    "lower": lambda values: np.char.lower(_text(values)),
+    "contains": _contains,  # Case-insensitive substring test
+}
+
+
+class Query:
+    """A filter expression over pairs of files, compiled to vectorized numpy predicates.
+
+    Expressions use Python syntax over left.<field> and right.<field>, e.g.
+
+        left.mtime < right.mtime and left.size < right.size
+        (left.width != right.width) and ratio(left.size, right.size) > 1.5
+        left.hash == right.hash or contains(left.camera, "canon")
+
+    Fields: name, folder, ext, size (bytes), mtime (timestamp), width,
+    height, pixels, dpi, mode, camera, frames and hash. The expression is
+    parsed and checked once, including that it is a condition; evaluate()
+    then runs it on whole columns, so it costs a few numpy operations
+    however many pairs there are.
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        try:
+            tree = ast.parse(expression.strip(), mode='eval')
+        except SyntaxError as e:
+            raise QueryError(f"Cannot parse {expression!r}: {e.msg}") from None
+        self.fields = set()
+        self._evaluate = self._compile(tree.body)
+        if not self._is_condition(tree.body):
+            raise QueryError(f"{expression!r} is not a condition; compare fields, e.g. \"left.size < right.size\"")
+        # A run over empty columns of the right types catches type errors, such as adding
+        # text to a number, before any file is read
+        self.evaluate({f"{side}.{field}": np.zeros(0, dtype=str if field in TEXT_FIELDS else np.float64)
+                       for side in SIDES for field in FIELDS}, 0)
+
+    def __repr__(self):
+        return f"Query({self.expression!r})"
+
+    def evaluate(self, columns, count):
+        """Boolean mask over count pairs; columns maps "left.size" etc. to arrays.
+
+        Raises QueryError when the expression does not apply to the values,
+        such as adding text to a number.
+        """
+        try:
+            result = np.asarray(self._evaluate(columns))
+        except QueryError:
+            raise
+        except (TypeError, ValueError) as e:
+            # numpy's "no loop for ufunc" errors are TypeErrors too
+            raise QueryError(f"Cannot evaluate {self.expression!r}: {e}") from None
+        if result.dtype != bool:
+            raise QueryError(f"{self.expression!r} is not a condition")
+        return np.broadcast_to(result, (count,)).copy()
+
+    def _is_condition(self, node):
+        """True if node always yields booleans."""
+        if isinstance(node, (ast.BoolOp, ast.Compare)):
+            return True
+        if isinstance(node, ast.UnaryOp):
+            return isinstance(node.op, ast.Not)
+        if isinstance(node, ast.Call):
+            return node.func.id in BOOLEAN_FUNCTIONS
+        if isinstance(node, ast.Name):
+            return isinstance(CONSTANTS[node.id], bool)
+        return False
+
+    def _compile(self, node):
+        if isinstance(node, ast.BoolOp):
+            parts = [self._compile(value) for value in node.values]
+            combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+
+            def boolean(columns):
+                result = parts[0](columns)
+                for part in parts[1:]:
+                    result = combine(result, part(columns))
+                return result
+            return boolean
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.USub)):
+            operand = self._compile(node.operand)
+            if isinstance(node.op, ast.Not):
+                return lambda columns: np.logical_not(operand(columns))
+            return lambda columns: np.negative(operand(columns))
+        if isinstance(node, ast.Compare):
+            operands = [self._compile(node.left)] + [self._compile(value) for value in node.comparators]
+            operators = [_COMPARE.get(type(op)) for op in node.ops]
+            if None in operators:
+                raise QueryError(f"Unsupported comparison in {self.expression!r}")
+
+            def compare(columns):
+                values = [operand(columns) for operand in operands]
+                result = operators[0](values[0], values[1])
+                for op, a, b in zip(operators[1:], values[1:], values[2:]):
+                    result = np.logical_and(result, op(a, b))
+                return result
+            return compare
+        if isinstance(node, ast.BinOp) and type(node.op) in _ARITHMETIC:
+            op = _ARITHMETIC[type(node.op)]
+            left, right = self._compile(node.left), self._compile(node.right)
+            return lambda columns: op(left(columns), right(columns))
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            function = FUNCTIONS.get(node.func.id)
+            if function is None:
+                raise QueryError(f"Unknown function {node.func.id!r}; use one of {', '.join(FUNCTIONS)}")
+            args = [self._compile(arg) for arg in node.args]
+            return lambda columns: function(*(arg(columns) for arg in args))
+        if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name):
+            side, field = node.value.id, node.attr
+            if side not in SIDES or field not in FIELDS:
+                raise QueryError(f"Unknown field {side}.{field}; fields are left/right.{{{', '.join(FIELDS)}}}")
+            self.fields.add(field)
+            name = f"{side}.{field}"
+            return lambda columns: columns[name]
+        if isinstance(node, ast.Name) and node.id in CONSTANTS:
+            value = CONSTANTS[node.id]
+            return lambda columns: value
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str)):
+            value = node.value
+            return lambda columns: value
+        raise QueryError(f"Unsupported expression {ast.unparse(node)!r} in {self.expression!r}")
+
+
+def _info_values(info):
+    if info is None:
+        return {"width": 0, "height": 0, "pixels": 0, "dpi": 0.0, "mode": "", "camera": "", "frames": 0}
+    dpi = info["dpi"][0] if isinstance(info["dpi"], tuple) and info["dpi"] else info["dpi"] or 0
+    return {"width": info["width"], "height": info["height"], "pixels": info["resolution"],
+            "dpi": float(dpi), "mode": str(info["bit_depth"]), "camera": str(info["camera_maker"]),
+            "frames": info["n_frames"]}
+
+
+def file_columns(paths, fields, report=None, file_io=None, cache=None):
+    """Return {field: array over paths} for the requested fields, reading only what they need."""
+    fields = set(fields)
+    columns = {}
+    if fields & set(PATH_FIELDS):
+        # Text columns are numpy strings, so comparing them is vectorized too
+        columns["name"] = np.array([os.path.basename(path) for path in paths], dtype=str)
+        columns["folder"] = np.array([os.path.dirname(path) for path in paths], dtype=str)
+        columns["ext"] = np.array([os.path.splitext(path)[1].lower() for path in paths], dtype=str)
+    run = file_io.map if file_io is not None else lambda fn, items: [fn(item) for item in items]
+    if fields & set(INFO_FIELDS):
+        infos = run(lambda path: image_info(path, report, file_io), paths)
+        values = [_info_values(info) for info in infos]
+        for field in INFO_FIELDS:
+            dtype = str if field in TEXT_FIELDS else np.float64
+            columns[field] = np.array([value[field] for value in values], dtype=dtype)
+    if fields & set(STAT_FIELDS):
+        stats = list(file_io.stat_many(paths).values()) if file_io is not None else [_stat(path) for path in paths]
+        columns["size"] = np.array([st.st_size if st else 0 for st in stats], dtype=np.float64)
+        columns["mtime"] = np.array([st.st_mtime if st else 0 for st in stats], dtype=np.float64)
+    if "hash" in fields:
+        columns["hash"] = np.array(run(lambda path: cached_file_hash(path, cache), paths), dtype=str)
+    return columns
+
+
+def _stat(path):
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+
+def cached_file_hash(path, cache=None):
+    """Content hash of path (shards.file_hash), kept in the metadata cache as "hash"; "" if unreadable."""
+    st = _stat(path)
+    if st is None:
+        return ""
+    data = cache.get(path, st.st_size, st.st_mtime_ns) if cache is not None else None
+    if data and data.get("hash"):
+        return data["hash"]
+    try:
+        digest = file_hash(path)
+    except OSError:
+        return ""
+    if cache is not None:
+        cache.update(path, st.st_size, st.st_mtime_ns, hash=digest)
+    return digest
+
+
+def pair_columns(pairs, fields, report=None, file_io=None, cache=None):
+    """Columns "left.<field>" and "right.<field>" for (path1, path2) pairs."""
+    paths = sorted({path for pair in pairs for path in pair})
+    row_of = {path: row for row, path in enumerate(paths)}
+    left = np.fromiter((row_of[pair[0]] for pair in pairs), dtype=np.intp, count=len(pairs))
+    right = np.fromiter((row_of[pair[1]] for pair in pairs), dtype=np.intp, count=len(pairs))
+    columns = {}
+    for field, values in file_columns(paths, fields, report, file_io, cache).items():
+        columns[f"left.{field}"] = values[left]
+        columns[f"right.{field}"] = values[right]
+    return columns
+
+
+def filter_pairs(pairs, expression, report=None, file_io=None, cache=None):
+    """Boolean mask over (path1, path2) pairs: True where the expression holds."""
+    query = expression if isinstance(expression, Query) else Query(expression)
+    if not pairs:
+        return np.zeros(0, dtype=bool)
+    columns = pair_columns(pairs, query.fields, report, file_io, cache)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return query.evaluate(columns, len(pairs))
@@ -0,0 +1,245 @@
+import io
+import os
+import struct
+from PIL import Image
+
+# Camera RAW formats built on the TIFF container
+RAW_EXTENSIONS = ('.cr2', '.nef', '.arw', '.dng')
+TIFF_EXTENSIONS = ('.tif', '.tiff')
+
+# TIFF tags needed to locate previews
+TAG_NEW_SUBFILE_TYPE = 254
+TAG_IMAGE_WIDTH = 256
+TAG_IMAGE_LENGTH = 257
+TAG_BITS_PER_SAMPLE = 258
+TAG_COMPRESSION = 259
+TAG_PHOTOMETRIC = 262
+TAG_STRIP_OFFSETS = 273
+TAG_STRIP_BYTE_COUNTS = 279
+TAG_SUB_IFDS = 330
+TAG_JPEG_OFFSET = 513
+TAG_JPEG_LENGTH = 514
+WANTED_TAGS = {TAG_NEW_SUBFILE_TYPE, TAG_IMAGE_WIDTH, TAG_IMAGE_LENGTH, TAG_BITS_PER_SAMPLE,
+               TAG_COMPRESSION, TAG_PHOTOMETRIC, TAG_STRIP_OFFSETS, TAG_STRIP_BYTE_COUNTS,
+               TAG_SUB_IFDS, TAG_JPEG_OFFSET, TAG_JPEG_LENGTH}
+
+# Compression values that mean the strip holds a JPEG stream
+JPEG_COMPRESSION = (6, 7)
+# Photometric values of sensor data (CFA, LinearRaw), which are never previews
+RAW_PHOTOMETRIC = (32803, 34892)
+
+# Sizes of the TIFF field types we read
+TYPE_FORMATS = {1: 'B', 3: 'H', 4: 'I', 9: 'i', 13: 'I'}
+
+# Guard against IFD loops and hostile files
+MAX_IFDS = 64
+MAX_ENTRIES = 1024
+
+
+class Preview:
+    """Location of one embedded preview inside a TIFF-structured file."""
+
+    def __init__(self, offset=None, length=None, width=0, height=0, page=None):
+        self.offset = offset  # Embedded JPEG stream, if any
+        self.length = length
+        self.width = width
+        self.height = height
+        self.page = page  # Index in the main IFD chain, for uncompressed reduced images
+
+    @property
+    def is_jpeg(self):
+        return self.offset is not None
+
+    def __repr__(self):
+        kind = "jpeg" if self.is_jpeg else f"page {self.page}"
+        return f"Preview({kind}, {self.width}x{self.height})"
+
+
+def is_tiff_container(filepath):
+    """Return True if the file has a RAW or TIFF extension."""
+    return filepath.lower().endswith(RAW_EXTENSIONS + TIFF_EXTENSIONS)
+
+
+def read_ifds(f):
+    """Walk the main IFD chain and all SubIFDs, yielding (page, tags) pairs.
+
+    page is the index in the main chain, or None for SubIFDs. Only the
+    small integer tags needed to locate previews are decoded.
+    """
+    header = f.read(8)
+    if len(header) < 8 or header[:2] not in (b'II', b'MM'):
+        return
+    endian = '<' if header[:2] == b'II' else '>'
+    (magic, first_ifd) = struct.unpack(endian + 'HI', header[2:8])
+    if magic != 42:
+        return  # BigTIFF and vendor variants (ORF, RW2) are not handled
+
+    pending = [(first_ifd, 0)]
+    seen = set()
+    while pending and len(seen) < MAX_IFDS:
+        offset, page = pending.pop(0)
+        if not offset or offset in seen:
+            continue
+        seen.add(offset)
+        tags, next_ifd = _read_ifd(f, endian, offset)
+        if tags is None:
+            continue
+        yield page, tags
+        if page is not None:
+            pending.append((next_ifd, page + 1))
+        for sub_offset in tags.get(TAG_SUB_IFDS, ()):
+            pending.append((sub_offset, None))
+
+
+def _read_ifd(f, endian, offset):
+    """Read one IFD, returning ({tag: [values]}, next_ifd_offset)."""
+    f.seek(offset)
+    raw = f.read(2)
+    if len(raw) < 2:
+        return None, 0
+    (count,) = struct.unpack(endian + 'H', raw)
+    if count > MAX_ENTRIES:
+        return None, 0
+    data = f.read(count * 12 + 4)
+    if len(data) < count * 12 + 4:
+        return None, 0
+
+    tags = {}
+    for i in range(count):
+        tag, field_type, n = struct.unpack(endian + 'HHI', data[i * 12:i * 12 + 8])
+        if tag not in WANTED_TAGS or field_type not in TYPE_FORMATS or n > MAX_ENTRIES:
+            continue
+        fmt = TYPE_FORMATS[field_type]
+        size = struct.calcsize(fmt) * n
+        value = data[i * 12 + 8:i * 12 + 12]
+        if size > 4:
+            # Values that do not fit in the entry are stored elsewhere
+            (value_offset,) = struct.unpack(endian + 'I', value)
+            here = f.tell()
+            f.seek(value_offset)
+            value = f.read(size)
+            f.seek(here)
+            if len(value) < size:
+                continue
+        tags[tag] = list(struct.unpack(endian + fmt * n, value[:size]))
+    (next_ifd,) = struct.unpack(endian + 'I', data[count * 12:count * 12 + 4])
+    return tags, next_ifd
+
+
+def find_previews(filepath):
+    """List the embedded previews of a TIFF-structured file, with their dimensions."""
+    previews = []
+    with open(filepath, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        for page, tags in read_ifds(f):
+            width, height = _first(tags, TAG_IMAGE_WIDTH), _first(tags, TAG_IMAGE_LENGTH)
+
+            # Old-style JPEG thumbnail (JPEGInterchangeFormat)
+            if TAG_JPEG_OFFSET in tags and TAG_JPEG_LENGTH in tags:
+                offset, length = _first(tags, TAG_JPEG_OFFSET), _first(tags, TAG_JPEG_LENGTH)
+                if 0 < offset and offset + length <= file_size:
+                    previews.append(_jpeg_preview(f, offset, length))
+                continue
+
+            if _first(tags, TAG_PHOTOMETRIC) in RAW_PHOTOMETRIC or _first(tags, TAG_BITS_PER_SAMPLE, 8) != 8:
+                continue
+            strips = tags.get(TAG_STRIP_OFFSETS, [])
+            counts = tags.get(TAG_STRIP_BYTE_COUNTS, [])
+            if _first(tags, TAG_COMPRESSION) in JPEG_COMPRESSION and len(strips) == 1 and len(counts) == 1:
+                # A single strip holding a whole JPEG (CR2 IFD0, DNG previews)
+                if strips[0] + counts[0] <= file_size:
+                    previews.append(_jpeg_preview(f, strips[0], counts[0]))
+            elif page is not None and page > 0 and _first(tags, TAG_NEW_SUBFILE_TYPE) & 1:
+                # Reduced-resolution page in the main chain that Pillow can seek to
+                previews.append(Preview(width=width, height=height, page=page))
+    return previews
+
+
+def _first(tags, tag, default=0):
+    """Return the first value of a tag, or default if it is missing."""
+    return tags.get(tag, [default])[0]
+
+
+def _jpeg_preview(f, offset, length):
+    """Describe an embedded JPEG stream, reading its dimensions from the SOF marker."""
+    width, height = jpeg_dimensions(f, offset, length)
+    return Preview(offset, length, width, height)
+
+
+def jpeg_dimensions(f, offset, length):
+    """Return (width, height) of a JPEG stream by walking its markers, or (0, 0)."""
+    end = offset + length
+    f.seek(offset)
+    if f.read(2) != b'\xff\xd8':
+        return 0, 0
+    pos = offset + 2
+    while pos + 4 <= end:
+        f.seek(pos)
+        marker = f.read(4)
+        if len(marker) < 4 or marker[0] != 0xFF:
+            break
+        kind = marker[1]
+        (segment_length,) = struct.unpack('>H', marker[2:4])
+        # SOF0-SOF15, except DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= kind <= 0xCF and kind not in (0xC4, 0xC8, 0xCC):
+            sof = f.read(5)
+            if len(sof) == 5:
+                height, width = struct.unpack('>HH', sof[1:5])
+                return width, height
+            break
+        if kind == 0xDA:
+            break
+        pos += 2 + segment_length
+    return 0, 0
+
+
+def choose_preview(previews, size=None):
+    """Pick the smallest preview covering size, or the largest one if none does."""
+    if not previews:
+        return None
+    by_area = sorted(previews, key=lambda p: (p.width * p.height, p.is_jpeg))
+    if size:
+        for preview in by_area:
+            if preview.width >= size[0] or preview.height >= size[1]:
+                return preview
+    return by_area[-1]
+
+
+def extract_jpeg(filepath, size=None):
+    """Return the bytes of the best embedded JPEG preview, or None."""
+    preview = choose_preview([p for p in find_previews(filepath) if p.is_jpeg], size)
+    if preview is None:
+        return None
+    with open(filepath, 'rb') as f:
+        f.seek(preview.offset)
+        return f.read(preview.length)
+
+
+def open_preview(filepath, size=None, preview=None):
+    """Open the best (or the given) embedded preview as a lazily decoded PIL image.
+
+    Works at JPEG-thumbnail speed: the sensor data is never read. Returns
+    None if the file has no preview.
+    """
+    if preview is None:
+        preview = choose_preview(find_previews(filepath), size)
+    if preview is None:
+        return None
+    if preview.is_jpeg:
+        with open(filepath, 'rb') as f:
+            f.seek(preview.offset)
+            return Image.open(io.BytesIO(f.read(preview.length)))
+    img = Image.open(filepath)
+    img.seek(preview.page)
+    return img
+
+
+def raw_dimensions(filepath):
+    """Return the largest (width, height) recorded in any IFD, i.e. the full image size."""
+    best = (0, 0)
+    with open(filepath, 'rb') as f:
+        for _, tags in read_ifds(f):
+            width, height = _first(tags, TAG_IMAGE_WIDTH), _first(tags, TAG_IMAGE_LENGTH)
+            if width * height > best[0] * best[1]:
+                best = (width, height)
+    return best
@@ -0,0 +1,205 @@
+import csv
+import json
+import os
+import sqlite3
+
+# Per-file columns written to every report format
+REPORT_FIELDS = ("path", "size", "mtime", "width", "height")
+
+# Decisions recorded for a file
+DECISIONS = ("keep", "delete", "link", "move", "skip", "copy", "rename")
+
+# Rows written per SQLite transaction
+COMMIT_ROWS = 1000
+
+
+def _value(record, name):
+    if isinstance(record, dict):
+        value = record.get(name)
+    else:
+        value = getattr(record, name, None)
+    if name in ("width", "height") and value is None:
+        img_size = record.get("img_size") if isinstance(record, dict) else getattr(record, "img_size", None)
+        if img_size:
+            value = img_size[0 if name == "width" else 1]
+    return value
+
+
+def file_row(record, decision=None):
+    """Flatten a record (a path, dict or index.FileRecord) into the report columns."""
+    if isinstance(record, str):
+        record = {"path": record}
+    row = {name: _value(record, name) for name in REPORT_FIELDS}
+    if row["size"] is None or row["mtime"] is None:
+        try:
+            st = os.stat(row["path"])
+            row["size"] = st.st_size if row["size"] is None else row["size"]
+            row["mtime"] = st.st_mtime if row["mtime"] is None else row["mtime"]
+        except OSError:
+            pass
+    row["decision"] = decision
+    return row
+
+
+class ReportWriter:
+    """Base class of streaming duplicate reports.
+
+    Groups are written as they are found and nothing is kept in memory,
+    so a report over millions of files costs as much memory as one group.
+    Use as a context manager, or call close() when done.
+    """
+
+    def __init__(self, report_path):
+        self.report_path = report_path
+        self.groups = 0
+
+    def write_group(self, records, decisions=None, key=None):
+        """Write one duplicate group; decisions is a list matching records (or None)."""
+        decisions = decisions or [None] * len(records)
+        rows = [file_row(record, decision) for record, decision in zip(records, decisions)]
+        self.groups += 1
+        self._write(self.groups, key, rows)
+        return self.groups
+
+    def write_decision(self, group_id, path, decision):
+        """Record a decision made after the group was written (e.g. by the reviewer)."""
+        self._write_decision(group_id, path, decision)
+
+    def _write(self, group_id, key, rows):
+        raise NotImplementedError
+
+    def _write_decision(self, group_id, path, decision):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class JSONLReport(ReportWriter):
+    """One JSON object per line: a group with its files, or a later decision."""
+
+    def __init__(self, report_path):
+        super().__init__(report_path)
+        # Continue numbering after groups already in the file
+        self.groups = self._last_group(report_path)
+        self.f = open(report_path, 'a', encoding='utf-8')
+
+    @staticmethod
+    def _last_group(report_path):
+        last = 0
+        if os.path.exists(report_path):
+            with open(report_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        last = max(last, int(json.loads(line).get("group") or 0))
+                    except (ValueError, TypeError, AttributeError):
+                        continue  # A line cut off by a killed session
+        return last
+
+    def _write(self, group_id, key, rows):
+        self.f.write(json.dumps({"group": group_id, "key": key, "files": rows}) + "\n")
+        self.f.flush()
+
+    def _write_decision(self, group_id, path, decision):
+        self.f.write(json.dumps({"group": group_id, "path": path, "decision": decision}) + "\n")
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+class CSVReport(ReportWriter):
+    """One CSV row per file; later decisions are appended as extra rows for the same path."""
+
+    def __init__(self, report_path):
+        super().__init__(report_path)
+        new_file = not os.path.exists(report_path) or os.path.getsize(report_path) == 0
+        # Continue numbering after groups already in the file
+        self.groups = 0 if new_file else self._last_group(report_path)
+        self.f = open(report_path, 'a', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.f)
+        if new_file:
+            self.writer.writerow(("group", "key") + REPORT_FIELDS + ("decision",))
+
+    @staticmethod
+    def _last_group(report_path):
+        last = 0
+        with open(report_path, newline='', encoding='utf-8') as f:
+            for row in csv.reader(f):
+                if row and row[0].isdigit():
+                    last = max(last, int(row[0]))
+        return last
+
+    def _write(self, group_id, key, rows):
+        for row in rows:
+            self.writer.writerow([group_id, key] + [row[name] for name in REPORT_FIELDS] + [row["decision"]])
+        self.f.flush()
+
+    def _write_decision(self, group_id, path, decision):
+        self.writer.writerow([group_id, None, path] + [None] * (len(REPORT_FIELDS) - 1) + [decision])
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+class SQLiteReport(ReportWriter):
+    """Queryable report: tables groups(id, key) and files(group_id, path, ..., decision)."""
+
+    def __init__(self, report_path):
+        super().__init__(report_path)
+        self.conn = sqlite3.connect(report_path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS groups (id INTEGER PRIMARY KEY, key TEXT)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS files (group_id INTEGER, path TEXT, size INTEGER, "
+                          "mtime REAL, width INTEGER, height INTEGER, decision TEXT)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS files_group ON files (group_id)")
+        # Continue numbering after groups already in the file
+        self.groups = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM groups").fetchone()[0]
+        self.pending_rows = 0
+
+    def _write(self, group_id, key, rows):
+        self.conn.execute("INSERT INTO groups VALUES (?, ?)", (group_id, key))
+        self.conn.executemany("INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                              [(group_id,) + tuple(row[name] for name in REPORT_FIELDS) + (row["decision"],)
+                               for row in rows])
+        self._count(len(rows))
+
+    def _write_decision(self, group_id, path, decision):
+        self.conn.execute("UPDATE files SET decision = ? WHERE group_id = ? AND path = ?", (decision, group_id, path))
+        self._count(1)
+
+    def _count(self, rows):
+        self.pending_rows += rows
+        if self.pending_rows >= COMMIT_ROWS:
+            self.conn.commit()
+            self.pending_rows = 0
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+REPORT_FORMATS = {".jsonl": JSONLReport, ".csv": CSVReport, ".db": SQLiteReport, ".sqlite": SQLiteReport}
+
+
+def open_report(report_path):
+    """Open a report writer chosen by file extension (.jsonl, .csv, .db or .sqlite)."""
+    ext = os.path.splitext(report_path)[1].lower()
+    if ext not in REPORT_FORMATS:
+        raise ValueError(f"Unknown report format {ext!r}; use one of {', '.join(REPORT_FORMATS)}")
+    return REPORT_FORMATS[ext](report_path)
+
+
+def write_policy_decisions(report, table, keep):
+    """Stream a keep-policy decision (policy.decide) into report, one group at a time."""
+    starts = list(table.group_starts) + [len(table)]
+    for start, end in zip(starts, starts[1:]):
+        records = [{"path": str(table.paths[row]), "size": int(table["size"][row]), "mtime": float(table["mtime"][row])}
+                   for row in range(start, end)]
+        report.write_group(records, ["keep" if keep[row] else "delete" for row in range(start, end)])
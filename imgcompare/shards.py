@@ -0,0 +1,274 @@
+import argparse
+import hashlib
+import os
+import socket
+import sqlite3
+import sys
+from contextlib import nullcontext
+from datetime import datetime
+from imgcompare.decode import read_header
+from imgcompare.fsid import extent_key, storage_id
+from imgcompare.report import open_report
+from imgcompare.throttle import add_throttle_arguments, throttle_from_args
+
+SHARD_VERSION = 2
+
+# Rows written per transaction while scanning
+BATCH_ROWS = 1000
+
+HASH_CHUNK = 1024 * 1024
+
+SCHEMA = ("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+          "CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, name TEXT, size INTEGER, "
+          "mtime_ns INTEGER, width INTEGER, height INTEGER, hash TEXT, shard TEXT, dev INTEGER, ino INTEGER)")
+
+# Columns added after version 1, appended to older shards when they are opened
+ADDED_COLUMNS = (("dev", "INTEGER"), ("ino", "INTEGER"))
+
+INSERT_FILE = "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+# What duplicate_groups can group by; "storage" groups hardlinks of one file. st_dev
+# and st_ino only identify a file on the machine and mount that scanned it, so the
+# shard label is part of the key: merged shards never group files of different scans
+GROUP_KEYS = {"hash": "hash", "name": "name", "storage": "shard || ':' || dev || ':' || ino"}
+
+
+def file_hash(path, throttle=None):
+    """Hex BLAKE2b digest of the file contents, read within throttle's bandwidth limit if given."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        while chunk := f.read(HASH_CHUNK):
+            if throttle is not None:
+                throttle.read(len(chunk))
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def open_shard(shard_path):
+    conn = sqlite3.connect(shard_path)
+    for statement in SCHEMA:
+        conn.execute(statement)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(files)")}
+    for name, sql_type in ADDED_COLUMNS:
+        if name not in columns:
+            conn.execute(f"ALTER TABLE files ADD COLUMN {name} {sql_type}")
+    return conn
+
+
+def walk_files(root, extensions=None):
+    """Yield (path, stat) of every file below root, skipping hidden entries."""
+    stack = [root]
+    while stack:
+        folder = stack.pop()
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file() and (extensions is None or entry.name.lower().endswith(extensions)):
+                        yield os.path.normpath(entry.path), entry.stat()
+        except (FileNotFoundError, PermissionError):
+            continue
+
+
+def write_shard(shard_path, roots, extensions=None, hashes=True, cache=None, report=None, label=None,
+                throttle=None):
+    """Scan roots into a self-contained shard file and return the number of files recorded.
+
+    A shard holds path, size, mtime, image size and content hash of every
+    file, plus the host and roots it was made from. Shards of different
+    mounts, processes or hosts can be written independently and combined
+    with merge_shards. Rescanning into an existing shard only re-reads
+    files whose size or mtime changed; a MetadataCache, if given, is
+    consulted the same way. Hardlinks and reflink clones of a file already
+    hashed reuse its hash without being read. A throttle.Throttle bounds
+    the header reads and hashing of the scan.
+    """
+    extensions = tuple(ext.lower() for ext in extensions) if extensions else None
+    label = label or f"{socket.gethostname()}:{os.getpid()}"
+    conn = open_shard(shard_path)
+    conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", [
+        ("version", str(SHARD_VERSION)),
+        ("label", label),
+        ("roots", os.pathsep.join(os.path.abspath(root) for root in roots)),
+        ("created", datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+    ])
+    known = {path: (size, mtime_ns, dev, ino, digest) for path, size, mtime_ns, dev, ino, digest
+             in conn.execute("SELECT path, size, mtime_ns, dev, ino, hash FROM files")}
+
+    count = 0
+    batch = []
+    storage = {}  # (st_dev, st_ino) or (size, physical extents) -> hash of the files hashed so far
+    identities = []  # Unchanged rows of version 1 shards, which lack dev and ino
+    for root in roots:
+        for path, st in walk_files(os.path.abspath(root), extensions):
+            count += 1
+            row = known.pop(path, None)
+            if row is not None and row[:2] == (st.st_size, st.st_mtime_ns):
+                if row[2] is None:
+                    identities.append((st.st_dev, st.st_ino, path))
+                if row[4]:
+                    storage[storage_id(st)] = row[4]
+                continue
+            batch.append(scan_file(path, st, hashes, cache, report, label, throttle, storage))
+            if len(batch) >= BATCH_ROWS:
+                conn.executemany(INSERT_FILE, batch)
+                conn.commit()
+                batch.clear()
+    if batch:
+        conn.executemany(INSERT_FILE, batch)
+    conn.executemany("UPDATE files SET dev = ?, ino = ? WHERE path = ?", identities)
+    # Files that disappeared since the last scan of this shard
+    conn.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in known])
+    conn.commit()
+    conn.close()
+    if cache is not None:
+        cache.commit()
+    return count
+
+
+def scan_file(path, st, hashes=True, cache=None, report=None, label=None, throttle=None, storage=None):
+    """Build one shard row for path, reusing cached header and hash data when fresh.
+
+    storage maps (st_dev, st_ino) and extent layouts (fsid.extent_key) to
+    hashes of files seen before; a hardlink or reflink clone of one of
+    them takes its hash instead of being read, and new hashes are added.
+    """
+    data = cache.get(path, st.st_size, st.st_mtime_ns) if cache is not None else None
+    data = data or {}
+    if "width" not in data:
+        with throttle.operation() if throttle is not None else nullcontext():
+            width, height = read_header(path, report=report) or (0, 0)
+        data.update(width=width, height=height)
+    if hashes and "hash" not in data:
+        keys = [storage_id(st)]
+        if storage is not None and keys[0] not in storage:
+            extents = extent_key(path)
+            keys.append((st.st_size, extents) if extents is not None else None)
+        known = [storage[key] for key in keys if storage is not None and key in storage]
+        if known:
+            data["hash"] = known[0]
+        else:
+            try:
+                data["hash"] = file_hash(path, throttle)
+            except OSError:
+                data["hash"] = None
+        if storage is not None and data["hash"]:
+            storage.update((key, data["hash"]) for key in keys if key is not None)
+    if cache is not None:
+        cache.put(path, st.st_size, st.st_mtime_ns, data)
+    return (path, os.path.basename(path), st.st_size, st.st_mtime_ns,
+            data["width"], data["height"], data.get("hash"), label, st.st_dev, st.st_ino)
+
+
+def merge_shards(shard_paths, merged_path):
+    """Combine shards into one; when a path appears in several, the newest mtime wins."""
+    conn = open_shard(merged_path)
+    for shard_path in shard_paths:
+        # Brings older shards up to the current columns, so rows line up
+        open_shard(shard_path).close()
+        conn.execute("ATTACH DATABASE ? AS shard", (shard_path,))
+        conn.execute("INSERT OR REPLACE INTO files SELECT s.* FROM shard.files AS s "
+                     "LEFT JOIN files AS m ON m.path = s.path "
+                     "WHERE m.path IS NULL OR s.mtime_ns >= m.mtime_ns")
+        conn.commit()
+        conn.execute("DETACH DATABASE shard")
+    conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", [
+        ("version", str(SHARD_VERSION)),
+        ("merged_from", os.pathsep.join(os.path.abspath(path) for path in shard_paths)),
+        ("created", datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+    ])
+    conn.commit()
+    conn.close()
+
+
+def duplicate_groups(shard_path, key="hash"):
+    """Yield groups of paths sharing a content hash ("hash"), a file name ("name")
+    or their inode within one shard ("storage", i.e. hardlinks of one file).
+
+    Groups are read one at a time from the shard, so memory does not grow
+    with the size of the archive.
+    """
+    if key not in GROUP_KEYS:
+        raise ValueError(f"key must be one of {', '.join(map(repr, GROUP_KEYS))}, not {key!r}")
+    column = GROUP_KEYS[key]
+    conn = open_shard(shard_path)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS files_{key} ON files ({column})")
+    rows = conn.execute(f"SELECT {column}, path FROM files WHERE {column} IN "
+                        f"(SELECT {column} FROM files WHERE {column} IS NOT NULL GROUP BY {column} "
+                        f"HAVING COUNT(*) > 1) ORDER BY {column}, path")
+    group, current = [], None
+    for value, path in rows:
+        if value != current and group:
+            yield group
+            group = []
+        current = value
+        group.append(path)
+    if group:
+        yield group
+    conn.close()
+
+
+def reclaimable_bytes(shard_path):
+    """(reclaimable, already shared) bytes over the groups of files with the same hash.
+
+    Keeping one file of each group frees the size of every other distinct
+    inode (per shard); the other paths are hardlinks, whose bytes are
+    already shared.
+    Read from the shard alone, without touching the files.
+    """
+    conn = open_shard(shard_path)
+    storage = f"COALESCE({GROUP_KEYS['storage']}, path)"
+    reclaimable, shared = conn.execute(
+        f"SELECT SUM((copies - 1) * size), SUM((paths - copies) * size) FROM "
+        f"(SELECT MAX(size) AS size, COUNT(*) AS paths, COUNT(DISTINCT {storage}) AS copies "
+        f"FROM files WHERE hash IS NOT NULL GROUP BY hash HAVING COUNT(*) > 1)").fetchone()
+    conn.close()
+    return reclaimable or 0, shared or 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m imgcompare.shards",
+                                     description="Write, merge and query index shards.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    scan = commands.add_parser("scan", help="scan folders into a shard")
+    scan.add_argument("shard")
+    scan.add_argument("roots", nargs="+")
+    scan.add_argument("--no-hash", action="store_true", help="record stat and header data only")
+    scan.add_argument("--label", help="name of this shard in merged results (default host:pid)")
+    add_throttle_arguments(scan)
+    merge = commands.add_parser("merge", help="merge shards into one")
+    merge.add_argument("merged")
+    merge.add_argument("shards", nargs="+")
+    groups = commands.add_parser("groups", help="print duplicate groups, one per line")
+    groups.add_argument("shard")
+    groups.add_argument("--key", choices=tuple(GROUP_KEYS), default="hash")
+    groups.add_argument("--report", help="write the groups to a .jsonl, .csv or .db report instead of printing them")
+    args = parser.parse_args(argv)
+
+    if args.command == "scan":
+        throttle = throttle_from_args(args)
+        count = write_shard(args.shard, args.roots, hashes=not args.no_hash, label=args.label, throttle=throttle)
+        print(f"{count} files in {args.shard}")
+        if throttle is not None:
+            print(throttle.summary())
+    elif args.command == "merge":
+        merge_shards(args.shards, args.merged)
+    elif args.report:
+        with open_report(args.report) as report:
+            for group in duplicate_groups(args.shard, args.key):
+                report.write_group(group)
+        print(f"{report.groups} groups in {args.report}")
+    else:
+        for group in duplicate_groups(args.shard, args.key):
+            print("\t".join(group))
+    if args.command == "groups" and args.key == "hash":
+        reclaimable, shared = reclaimable_bytes(args.shard)
+        print(f"{reclaimable / 1024 ** 2:.1f} MB reclaimable, {shared / 1024 ** 2:.1f} MB already shared by hardlinks",
+              file=sys.stderr)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import base64
+import os
+import numpy as np
+from PIL import Image
+from imgcompare.decode import load_preview
+
+# Size decoded to compute a signature (JPEGs get there through DCT scaling)
+SIGNATURE_DECODE_SIZE = (64, 64)
+
+# Colour histogram levels per channel (4 x 4 x 4 = 64 bins)
+HIST_LEVELS = 4
+HIST_BINS = HIST_LEVELS ** 3
+
+# Layout of a signature vector: histogram, then mean and standard deviation per channel
+MEAN_SLICE = slice(HIST_BINS, HIST_BINS + 3)
+STD_SLICE = slice(HIST_BINS + 3, HIST_BINS + 6)
+SIGNATURE_LENGTH = HIST_BINS + 6
+
+# Pairs further apart than any of these cannot be the same picture. They are loose
+# enough for recompression, resizing, rotation and mild colour edits.
+HIST_THRESHOLD = 0.5  # L1 distance of normalized histograms (0..2)
+MEAN_THRESHOLD = 24.0  # Largest channel mean difference (0..255)
+STD_THRESHOLD = 24.0  # Largest channel standard deviation difference
+
+CACHE_FIELD = "signature"
+
+
+def compute_signature(filepath, report=None):
+    """Coarse colour histogram plus per-channel mean/std of an 8x8 thumbnail, or None if unreadable."""
+    img = load_preview(filepath, SIGNATURE_DECODE_SIZE, report=report)
+    if img is None:
+        return None
+    img = img.convert("RGB")
+    pixels = np.asarray(img, dtype=np.uint8).reshape(-1, 3)
+    levels = (pixels // (256 // HIST_LEVELS)).astype(np.intp)
+    bins = (levels[:, 0] * HIST_LEVELS + levels[:, 1]) * HIST_LEVELS + levels[:, 2]
+    hist = np.bincount(bins, minlength=HIST_BINS).astype(np.float32)
+    hist /= max(hist.sum(), 1)
+    small = np.asarray(img.resize((8, 8), Image.Resampling.BOX), dtype=np.float32).reshape(-1, 3)
+    return np.concatenate([hist, small.mean(axis=0), small.std(axis=0)]).astype(np.float32)
+
+
+def encode_signature(signature):
+    return base64.b64encode(signature.astype(np.float32).tobytes()).decode('ascii')
+
+
+def decode_signature(text):
+    return np.frombuffer(base64.b64decode(text), dtype=np.float32)
+
+
+def cached_signature(filepath, cache=None, report=None):
+    """Signature of filepath from the metadata cache, computing and storing it when missing or stale."""
+    try:
+        st = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    if cache is not None:
+        data = cache.get(filepath, st.st_size, st.st_mtime_ns)
+        if data and data.get(CACHE_FIELD):
+            return decode_signature(data[CACHE_FIELD])
+    signature = compute_signature(filepath, report)
+    if signature is not None and cache is not None:
+        cache.update(filepath, st.st_size, st.st_mtime_ns, **{CACHE_FIELD: encode_signature(signature)})
+    return signature
+
+
+def load_signatures(paths, cache=None, report=None, file_io=None):
+    """Return (signatures, valid): an (n, SIGNATURE_LENGTH) array and a mask of readable files.
+
+    Signatures are computed concurrently through file_io (fsio.ConcurrentIO)
+    when given.
+    """
+    read = lambda path: cached_signature(path, cache, report)
+    results = file_io.map(read, paths) if file_io is not None else [read(path) for path in paths]
+    signatures = np.zeros((len(results), SIGNATURE_LENGTH), dtype=np.float32)
+    valid = np.zeros(len(results), dtype=bool)
+    for row, signature in enumerate(results):
+        if signature is not None and len(signature) == SIGNATURE_LENGTH:
+            signatures[row] = signature
+            valid[row] = True
+    if cache is not None:
+        cache.commit()
+    return signatures, valid
+
+
+def compare_signatures(signatures, left, right):
+    """Vectorized test of row pairs (left[k], right[k]); True where the two may be the same picture."""
+    a, b = signatures[left], signatures[right]
+    hist = np.abs(a[:, :HIST_BINS] - b[:, :HIST_BINS]).sum(axis=1)
+    mean = np.abs(a[:, MEAN_SLICE] - b[:, MEAN_SLICE]).max(axis=1)
+    std = np.abs(a[:, STD_SLICE] - b[:, STD_SLICE]).max(axis=1)
+    return (hist <= HIST_THRESHOLD) & (mean <= MEAN_THRESHOLD) & (std <= STD_THRESHOLD)
+
+
+def prefilter_pairs(pairs, cache=None, report=None, file_io=None):
+    """Return a boolean mask over (path1, path2) pairs: False for pairs that clearly differ.
+
+    Pairs with an unreadable side are kept, since the prefilter cannot rule them out.
+    """
+    if not pairs:
+        return np.zeros(0, dtype=bool)
+    paths = sorted({path for pair in pairs for path in pair})
+    row_of = {path: row for row, path in enumerate(paths)}
+    left = np.fromiter((row_of[pair[0]] for pair in pairs), dtype=np.intp, count=len(pairs))
+    right = np.fromiter((row_of[pair[1]] for pair in pairs), dtype=np.intp, count=len(pairs))
+    signatures, valid = load_signatures(paths, cache, report, file_io)
+    return compare_signatures(signatures, left, right) | ~(valid[left] & valid[right])
@@ -0,0 +1,162 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds of full-rate traffic a bucket may save up and spend at once
+BURST_SECONDS = 0.5
+
+# Adaptive mode: latency is smoothed over recent operations and compared with the
+# best level seen. Above BACKOFF_FACTOR times that level the rates are halved;
+# once it settles below RECOVER_FACTOR they grow back by RECOVER_STEP. Rises
+# smaller than MIN_LATENCY_RISE seconds are noise (page cache hits vs misses).
+LATENCY_SMOOTHING = 0.1
+BACKOFF_FACTOR = 2.0
+RECOVER_FACTOR = 1.3
+MIN_LATENCY_RISE = 0.002
+RECOVER_STEP = 0.1
+ADJUST_INTERVAL = 1.0
+MIN_SCALE = 0.05
+
+# Operations per second adaptive mode starts from when no limit is given
+ADAPTIVE_OPS = 500
+
+RATE_SUFFIXES = {"k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+
+
+class TokenBucket:
+    """Thread-safe token bucket: take() blocks until the amount fits the rate.
+
+    Callers reserve tokens even when the bucket is short and then sleep
+    off the debt outside the lock, so waiting threads are served in order.
+    """
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.tokens = self.rate * BURST_SECONDS
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self, amount=1):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.tokens + (now - self.updated) * self.rate, self.rate * BURST_SECONDS)
+            self.updated = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class Throttle:
+    """Bound the read bandwidth and operations per second of a scan.
+
+    Every stat, open or header read counts as one operation; file contents
+    read for hashing count against the bandwidth. With adaptive set, the
+    observed latency of operations steers both limits: when the storage
+    slows down (other workloads, a busy NAS) the scan backs off, and it
+    speeds up again once latency returns to normal.
+    """
+
+    def __init__(self, bytes_per_second=None, ops_per_second=None, adaptive=False):
+        if adaptive and ops_per_second is None:
+            ops_per_second = ADAPTIVE_OPS
+        self.bytes_per_second = bytes_per_second
+        self.ops_per_second = ops_per_second
+        self.adaptive = adaptive
+        self.bandwidth = TokenBucket(bytes_per_second) if bytes_per_second else None
+        self.iops = TokenBucket(ops_per_second) if ops_per_second else None
+        self.scale = 1.0
+        self.latency = None  # Smoothed seconds per operation
+        self.best_latency = None
+        self.adjusted = time.monotonic()
+        self.ops = 0
+        self.bytes = 0
+        self.waited = 0.0  # Seconds spent waiting, summed over threads
+        self.local = threading.local()  # .paused: seconds this thread spent waiting on the buckets
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def operation(self):
+        """Wait for an operation slot, then time the block it guards.
+
+        Time the block spends waiting on this throttle (e.g. read() inside a
+        hash) is not storage latency and is left out of what is observed.
+        """
+        if self.iops is not None:
+            self._waited(self.iops.take())
+        start, paused = time.monotonic(), self._paused()
+        try:
+            yield
+        finally:
+            self.observe(max(time.monotonic() - start - (self._paused() - paused), 0.0))
+
+    def read(self, nbytes):
+        """Account for nbytes of file contents, waiting while over the bandwidth limit."""
+        with self.lock:
+            self.bytes += nbytes
+        if self.bandwidth is not None:
+            self._waited(self.bandwidth.take(nbytes))
+
+    def _paused(self):
+        return getattr(self.local, "paused", 0.0)
+
+    def _waited(self, seconds):
+        if seconds:
+            self.local.paused = self._paused() + seconds
+            with self.lock:
+                self.waited += seconds
+
+    def observe(self, seconds):
+        with self.lock:
+            self.ops += 1
+            if self.latency is None:
+                self.latency = seconds
+            else:
+                self.latency += LATENCY_SMOOTHING * (seconds - self.latency)
+            if self.best_latency is None or self.latency < self.best_latency:
+                self.best_latency = self.latency
+            if self.adaptive and time.monotonic() - self.adjusted >= ADJUST_INTERVAL:
+                self._adjust()
+
+    def _adjust(self):
+        scale = self.scale
+        rise = self.latency - self.best_latency
+        if self.latency > self.best_latency * BACKOFF_FACTOR and rise > MIN_LATENCY_RISE:
+            scale = max(scale / 2, MIN_SCALE)
+        elif self.latency < self.best_latency * RECOVER_FACTOR or rise <= MIN_LATENCY_RISE:
+            scale = min(scale + RECOVER_STEP, 1.0)
+        if scale != self.scale:
+            self.scale = scale
+            if self.bandwidth is not None:
+                self.bandwidth.rate = self.bytes_per_second * scale
+            if self.iops is not None:
+                self.iops.rate = self.ops_per_second * scale
+        self.adjusted = time.monotonic()
+
+    def summary(self):
+        latency = f"{self.latency * 1000:.1f} ms" if self.latency is not None else "n/a"
+        return (f"{self.ops} operations, {self.bytes / 1024 ** 2:.1f} MB read, {self.waited:.1f} s throttled, "
+                f"latency {latency}, rate at {self.scale:.0%}")
+
+
+def parse_rate(text):
+    """Parse a rate such as "500", "20M" or "1.5g" (binary multiples) into a number."""
+    text = text.strip().lower().rstrip("b/s")
+    multiplier = RATE_SUFFIXES.get(text[-1:], 1)
+    if multiplier != 1:
+        text = text[:-1]
+    return float(text) * multiplier
+
+
+def add_throttle_arguments(parser):
+    parser.add_argument("--max-bandwidth", type=parse_rate, help="read at most this many bytes/s (e.g. 20M)")
+    parser.add_argument("--max-iops", type=parse_rate, help="at most this many file operations/s")
+    parser.add_argument("--adaptive", action="store_true", help="back off when storage latency rises")
+
+
+def throttle_from_args(args):
+    """Throttle for the options added by add_throttle_arguments, or None when unlimited."""
+    if not (args.max_bandwidth or args.max_iops or args.adaptive):
+        return None
+    return Throttle(args.max_bandwidth, args.max_iops, args.adaptive)
@@ -0,0 +1,71 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from PIL import Image
+from imgcompare.decode import DECODE_ERRORS, DEFAULT_BUDGET, load_preview
+
+# Edge length of cached thumbnails
+THUMBNAIL_SIZE = (128, 128)
+
+# Thumbnails kept in memory on top of the ones on disk
+MEMORY_ITEMS = 2048
+
+
+class ThumbnailCache:
+    """Small JPEG thumbnails stored on disk, keyed by path, size and mtime.
+
+    A thumbnail is decoded from the original only once; after that it is
+    read back from the cache directory, which is much cheaper than even a
+    reduced decode of the original.
+    """
+
+    def __init__(self, cache_dir, size=THUMBNAIL_SIZE, budget=DEFAULT_BUDGET, report=None):
+        self.cache_dir = cache_dir
+        self.size = size
+        self.budget = budget
+        self.report = report
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, path, st):
+        text = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{self.size[0]}x{self.size[1]}"
+        return hashlib.sha1(text.encode('utf-8', 'surrogateescape')).hexdigest()
+
+    def get(self, path):
+        """Return the thumbnail of path as a loaded PIL image, or None if unreadable."""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        key = self.key(path, st)
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                return self.memory[key]
+
+        thumb_path = os.path.join(self.cache_dir, key[:2], key + ".jpg")
+        thumbnail = None
+        if os.path.exists(thumb_path):
+            try:
+                with Image.open(thumb_path) as img:
+                    img.load()
+                    thumbnail = img
+            except DECODE_ERRORS:
+                thumbnail = None
+        if thumbnail is None:
+            thumbnail = load_preview(path, self.size, self.budget, self.report)
+            if thumbnail is None:
+                return None
+            thumbnail = thumbnail.convert("RGB")
+            os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+            tmp_path = f"{thumb_path}.{threading.get_ident()}.tmp"
+            thumbnail.save(tmp_path, "JPEG", quality=85)
+            os.replace(tmp_path, thumb_path)
+
+        with self.lock:
+            self.memory[key] = thumbnail
+            while len(self.memory) > MEMORY_ITEMS:
+                self.memory.popitem(last=False)
+        return thumbnail
@@ -0,0 +1,236 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+# inotify event masks (from <sys/inotify.h>)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_CREATE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE | IN_DELETE_SELF
+              | IN_MOVE_SELF)
+
+EVENT_HEADER = struct.Struct("iIII")
+
+# How long to wait for more events before applying a batch, and the longest a batch
+# may keep collecting while events keep arriving
+SETTLE_SECONDS = 0.2
+MAX_BATCH_SECONDS = 2.0
+# Directory mtime polling interval for the fallback watcher
+POLL_SECONDS = 2.0
+
+
+class InotifyWatcher:
+    """Report file changes in a set of folders using Linux inotify.
+
+    Yields batches of ("add", path), ("remove", path), ("rename", old, new)
+    and ("rescan",) events. MOVED_FROM/MOVED_TO pairs with the same cookie
+    become a single rename. Files appear on CLOSE_WRITE once written, or on
+    CREATE when they are hardlinks, which are never written.
+    """
+
+    def __init__(self, folders):
+        libc_name = ctypes.util.find_library("c")
+        if not sys.platform.startswith("linux") or not libc_name:
+            raise OSError("inotify is only available on Linux")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.folders = {}
+        for folder in folders:
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+            if wd < 0:
+                self.close()
+                raise OSError(ctypes.get_errno(), f"Cannot watch {folder}")
+            self.folders[wd] = folder
+
+    def read_events(self, timeout):
+        """Wait up to timeout seconds and return the next batch of events."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        raw = b""
+        # Collect what arrives while a burst of changes settles, but hand over a batch
+        # at least every MAX_BATCH_SECONDS while a busy folder keeps changing
+        deadline = time.monotonic() + MAX_BATCH_SECONDS
+        while ready and time.monotonic() < deadline:
+            try:
+                raw += os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                pass
+            ready, _, _ = select.select([self.fd], [], [], SETTLE_SECONDS)
+        return self._parse(raw)
+
+    def _parse(self, raw):
+        events = []
+        moved_from = {}
+        pos = 0
+        while pos + EVENT_HEADER.size <= len(raw):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(raw, pos)
+            name = os.fsdecode(raw[pos + EVENT_HEADER.size:pos + EVENT_HEADER.size + length].rstrip(b"\0"))
+            pos += EVENT_HEADER.size + length
+
+            if mask & IN_Q_OVERFLOW or mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                return [("rescan",)]
+            if mask & IN_ISDIR or mask & IN_IGNORED or wd not in self.folders:
+                continue
+            path = os.path.join(self.folders[wd], name)
+            if mask & IN_MOVED_FROM:
+                moved_from[cookie] = path
+            elif mask & IN_MOVED_TO:
+                old_path = moved_from.pop(cookie, None)
+                events.append(("rename", old_path, path) if old_path else ("add", path))
+            elif mask & IN_CLOSE_WRITE:
+                events.append(("add", path))
+            elif mask & IN_CREATE and self._is_hardlink(path):
+                events.append(("add", path))
+            elif mask & IN_DELETE:
+                events.append(("remove", path))
+        # Moved out of the watched folders
+        events.extend(("remove", path) for path in moved_from.values())
+        return events
+
+    @staticmethod
+    def _is_hardlink(path):
+        # A new link to existing data is complete at once; other new files are
+        # still being written and are added on CLOSE_WRITE
+        try:
+            st = os.lstat(path)
+        except OSError:
+            return False
+        return st.st_nlink > 1 and not os.path.islink(path)
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingWatcher:
+    """Fallback watcher that lists a folder again whenever its mtime changes.
+
+    Renames are recognised by matching removed and added files with the
+    same size and mtime. In-place rewrites do not change the directory
+    mtime, so they are only picked up on the next rename or add.
+    """
+
+    def __init__(self, folders, index, interval=POLL_SECONDS):
+        self.index = index
+        self.interval = interval
+        self.mtimes = {folder: self._mtime(folder) for folder in folders}
+
+    def read_events(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            changed = [folder for folder in self.mtimes if self._mtime(folder) != self.mtimes[folder]]
+            if changed or time.monotonic() >= deadline:
+                break
+            time.sleep(min(self.interval, max(0.0, deadline - time.monotonic())))
+        events = []
+        for folder in changed:
+            self.mtimes[folder] = self._mtime(folder)
+            events.extend(self._diff(folder))
+        return events
+
+    def _diff(self, folder):
+        known = dict(self.index.files.get(folder, {}))
+        try:
+            with os.scandir(folder) as entries:
+                current = {entry.name: entry.stat() for entry in entries if entry.is_file()}
+        except FileNotFoundError:
+            return [("rescan",)]
+
+        removed = {name: known[name] for name in known if name not in current}
+        added = [name for name in current if name not in known]
+        events = []
+        by_stat = {(record.size, record.mtime_ns): name for name, record in removed.items()}
+        for name in added:
+            st = current[name]
+            old_name = by_stat.pop((st.st_size, st.st_mtime_ns), None)
+            if old_name is not None:
+                del removed[old_name]
+                events.append(("rename", os.path.join(folder, old_name), os.path.join(folder, name)))
+            else:
+                events.append(("add", os.path.join(folder, name)))
+        events.extend(("remove", os.path.join(folder, name)) for name in removed)
+        return events
+
+    def _mtime(self, folder):
+        try:
+            return os.stat(folder).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def close(self):
+        pass
+
+
+def make_watcher(index, polling=False):
+    """Return an inotify watcher for the index folders, or the polling fallback."""
+    if not polling:
+        try:
+            return InotifyWatcher(index.folders)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(index.folders, index)
+
+
+def apply_events(index, events):
+    """Apply a batch of watcher events to the index; returns the number applied."""
+    for event in events:
+        kind = event[0]
+        if kind == "rescan":
+            index.scan()
+            return len(events)
+        if kind == "add" and index.wants(event[1]):
+            index.add(event[1])
+        elif kind == "remove":
+            index.remove(event[1])
+        elif kind == "rename":
+            index.rename(event[1], event[2])
+    if index.cache is not None:
+        index.cache.commit()
+    return len(events)
+
+
+class WatchThread(threading.Thread):
+    """Keep a FolderIndex up to date in the background.
+
+    on_change is called from this thread after each applied batch, so GUI
+    callers should hand the work over to their own event loop.
+    """
+
+    def __init__(self, index, on_change=None, polling=False, timeout=1.0):
+        super().__init__(daemon=True)
+        self.index = index
+        self.on_change = on_change
+        self.timeout = timeout
+        self.watcher = make_watcher(index, polling)
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.is_set():
+                events = self.watcher.read_events(self.timeout)
+                if events and apply_events(self.index, events) and self.on_change:
+                    self.on_change(events)
+        finally:
+            self.watcher.close()
+
+    def stop(self):
+        self.stopped.set()